@@ -0,0 +1,328 @@
+"""Throughput benchmarks for the mapping and labeling pipeline.
+
+Covers schema compilation (mapping/map.py), both SQLMapper.map_sql_query
+variants, convert_jsonlines_to_csv and the labeling step, on the bundled
+leetcode/beers/literature data plus synthetic wide schemas and deeply nested
+queries. Each benchmark reports latency percentiles, rows/sec and peak
+traced memory.
+
+    python benchmarks/run_benchmarks.py                  # print results
+    python benchmarks/run_benchmarks.py --save base.json # record a baseline
+    python benchmarks/run_benchmarks.py --compare base.json
+
+``--compare`` exits non-zero when a benchmark's p50 latency grew (or its
+rows/sec dropped) by more than ``--tolerance`` relative to the baseline.
+"""
+import argparse
+import importlib.util
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+SCHEMA_SIZES = [10, 100, 500, 2000]
+NESTING_DEPTHS = [2, 8, 16, 32]
+
+
+def _load_module(name: str, relative_path: str):
+    """Import a script by path; the two sql_mapper.py files share a name."""
+    spec = importlib.util.spec_from_file_location(name, ROOT / relative_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+schema_map = _load_module("schema_map", "mapping/map.py")
+bird_mapper = _load_module("bird_sql_mapper", "datasets/bird/sql_mapper.py")
+leetcode_mapper = _load_module("leetcode_sql_mapper", "datasets/leetcode/sql_mapper.py")
+convert_to_csv = _load_module("convert_to_csv", "datasets/leetcode/convert_to_csv.py")
+get_labeled = _load_module("get_labeled", "datasets/leetcode/get_labeled.py")
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def measure(fn: Callable[[Any], Any], items: List[Any], rows_per_item: int = 1,
+            repeat: int = 1) -> Dict[str, float]:
+    """Time ``fn`` on every item, then trace peak memory in a second pass.
+
+    Memory is traced separately because tracemalloc slows down the calls it
+    watches. Latencies are per call to ``fn``; rows/sec counts
+    ``rows_per_item`` rows per call.
+    """
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            t0 = time.perf_counter()
+            fn(item)
+            latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    for item in items:
+        fn(item)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    rows = len(latencies) * rows_per_item
+    return {
+        "calls": len(latencies),
+        "rows": rows,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p90_ms": _percentile(latencies, 90) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        "rows_per_sec": rows / elapsed if elapsed else 0.0,
+        "peak_mem_mb": peak / (1024 * 1024),
+    }
+
+
+# --- Fixtures -------------------------------------------------------------
+
+def synthetic_schema(n_tables: int, n_columns: int = 6) -> str:
+    """CREATE TABLE DDL with ``n_tables`` tables, shared and per-table columns."""
+    statements = []
+    for t in range(n_tables):
+        columns = ["    ID INT PRIMARY KEY"]
+        columns += [f"    T{t}_COL{c} VARCHAR" for c in range(n_columns - 2)]
+        columns.append("    PARENT_ID INT")
+        if t:
+            columns.append(f"    FOREIGN KEY (PARENT_ID) REFERENCES TABLE_{t - 1}(ID)")
+        statements.append(f"CREATE TABLE TABLE_{t} (\n" + ",\n".join(columns) + "\n);")
+    return "\n\n".join(statements)
+
+
+def nested_query(depth: int, n_tables: int = 10) -> str:
+    """A query nesting ``depth`` IN-subqueries, each with a join and a filter."""
+    query = f"SELECT ID FROM TABLE_{depth % n_tables} WHERE T{depth % n_tables}_COL0 IS NOT NULL"
+    for d in range(depth - 1, -1, -1):
+        t = d % n_tables
+        u = (d + 1) % n_tables
+        query = (
+            f"SELECT a.ID, b.T{u}_COL1 FROM TABLE_{t} AS a JOIN TABLE_{u} AS b ON a.PARENT_ID = b.ID "
+            f"WHERE a.T{t}_COL0 > '{d}' AND a.ID IN ({query})"
+        )
+    return query
+
+
+def split_mapping(mapping_dict: Dict[str, str]) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Split extract_and_map_schema's mapping into (tables, columns)."""
+    tables = {k: v for k, v in mapping_dict.items() if v.startswith('t')}
+    columns = {k: v for k, v in mapping_dict.items() if v.startswith('c')}
+    return tables, columns
+
+
+def leetcode_schemas() -> List[str]:
+    with open(ROOT / "datasets/leetcode/schema_info.json", 'r') as f:
+        return [entry["original_schema"] for entry in json.load(f).values()]
+
+
+def beers_pairs() -> Tuple[Dict[str, str], Dict[str, str], List[str]]:
+    df = pd.read_csv(ROOT / "datasets/beers/beers.csv")
+    _, mapping_dict = schema_map.extract_and_map_schema(df['schema'].iloc[0])
+    tables, columns = split_mapping(mapping_dict)
+    queries = [q for q in pd.concat([df['q1'], df['q2']]).dropna()]
+    return tables, columns, queries
+
+
+def literature_pairs() -> Tuple[Dict[str, str], Dict[str, str], List[str]]:
+    """Literature queries come without DDL; derive a mapping from their names."""
+    df = pd.read_csv(ROOT / "datasets/literature/literature.csv")
+    queries = [q for q in pd.concat([df['q1'], df['q2']]).dropna()]
+    extractor = bird_mapper.SQLMapper({}, {})
+    tables, columns = set(), set()
+    for query in queries:
+        t, c = extractor.extract_tables_and_columns(query)
+        tables |= t
+        columns |= c
+    table_mapping = {name: f"t{i + 1}" for i, name in enumerate(sorted(tables))}
+    column_mapping = {name: f"c{i + 1}" for i, name in enumerate(sorted(columns))}
+    return table_mapping, column_mapping, queries
+
+
+def solver_jsonl(path: Path, n_rows: int) -> None:
+    """Write a solver .out file by cycling the literature pairs and states."""
+    df = pd.read_csv(ROOT / "datasets/literature/literature.csv")
+    records = df.to_dict('records')
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(n_rows):
+            record = records[i % len(records)]
+            states = json.loads(record['states'])
+            f.write(json.dumps({
+                "file": f"benchmark/literature/raw_data/{record['file']}.csv",
+                "index": i,
+                "schema": {"R": {"A": "INT"}},
+                "constraint": [],
+                "states": states,
+                "times": [0.01 * (b + 1) for b in range(len(states))],
+                "counterexample": None,
+                "err": record['err'] if isinstance(record['err'], str) else None,
+                "pair": [record['q1'], record['q2']],
+            }) + "\n")
+
+
+# --- Benchmarks -----------------------------------------------------------
+
+def bench_schema_mapping(quick: bool) -> Dict[str, Dict]:
+    results = {}
+    schemas = leetcode_schemas()
+    # A fresh cache per call measures compilation, not cache hits
+    results["schema/leetcode"] = measure(
+        lambda s: schema_map.extract_and_map_schema(s, cache=schema_map.SchemaCache()), schemas, repeat=3)
+    cache = schema_map.SchemaCache()
+    results["schema/leetcode-cached"] = measure(
+        lambda s: schema_map.extract_and_map_schema(s, cache=cache), schemas, repeat=3)
+    for n_tables in SCHEMA_SIZES[:2] if quick else SCHEMA_SIZES:
+        schema = synthetic_schema(n_tables)
+        results[f"schema/synthetic-{n_tables}"] = measure(
+            lambda s: schema_map.extract_and_map_schema(s, cache=schema_map.SchemaCache()),
+            [schema], rows_per_item=n_tables)
+    return results
+
+
+def bench_query_mapping(quick: bool) -> Dict[str, Dict]:
+    results = {}
+    variants = [("bird", bird_mapper.SQLMapper), ("leetcode", leetcode_mapper.SQLMapper)]
+    datasets = [("beers", beers_pairs()), ("literature", literature_pairs())]
+    for dataset, (tables, columns, queries) in datasets:
+        for variant, mapper_cls in variants:
+            mapper = mapper_cls(tables, columns)
+            results[f"map_query/{variant}/{dataset}"] = measure(
+                lambda q: mapper.map_sql_query(q, pretty=False), queries)
+
+    # Scaling with the width of the mapping and with query nesting
+    for n_tables in SCHEMA_SIZES[:2] if quick else SCHEMA_SIZES:
+        _, mapping_dict = schema_map.extract_and_map_schema(synthetic_schema(n_tables))
+        tables, columns = split_mapping(mapping_dict)
+        queries = [nested_query(depth) for depth in NESTING_DEPTHS[:2]]
+        for variant, mapper_cls in variants:
+            results[f"mapper_init/{variant}/synthetic-{n_tables}"] = measure(
+                lambda _: mapper_cls(tables, columns), [None], repeat=3)
+            mapper = mapper_cls(tables, columns)
+            results[f"map_query/{variant}/synthetic-{n_tables}"] = measure(
+                lambda q: mapper.map_sql_query(q, pretty=False), queries, repeat=3)
+    _, mapping_dict = schema_map.extract_and_map_schema(synthetic_schema(10))
+    tables, columns = split_mapping(mapping_dict)
+    for depth in NESTING_DEPTHS[:2] if quick else NESTING_DEPTHS:
+        for variant, mapper_cls in variants:
+            mapper = mapper_cls(tables, columns)
+            results[f"map_query/{variant}/nested-{depth}"] = measure(
+                lambda q: mapper.map_sql_query(q, pretty=False), [nested_query(depth)], repeat=5)
+    return results
+
+
+def bench_convert(quick: bool) -> Dict[str, Dict]:
+    n_rows = 2000 if quick else 50000
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = Path(tmp) / "bench.out"
+        solver_jsonl(input_file, n_rows)
+        output_file = Path(tmp) / "bench.csv"
+        return {
+            "convert/jsonl-to-csv": measure(
+                lambda _: convert_to_csv.convert_jsonlines_to_csv(str(input_file), str(output_file)),
+                [None], rows_per_item=n_rows),
+        }
+
+
+def bench_labeling(quick: bool) -> Dict[str, Dict]:
+    df = pd.read_csv(ROOT / "datasets/literature/literature.csv")
+    n_copies = 50 if quick else 2000
+    big = pd.concat([df] * n_copies, ignore_index=True)
+    return {
+        "label/literature": measure(lambda frame: get_labeled.label_frame(frame.copy()), [df], rows_per_item=len(df),
+                                    repeat=5),
+        f"label/literature-x{n_copies}": measure(lambda frame: get_labeled.label_frame(frame.copy()), [big],
+                                                 rows_per_item=len(big)),
+    }
+
+
+BENCHMARKS = {
+    "schema": bench_schema_mapping,
+    "query": bench_query_mapping,
+    "convert": bench_convert,
+    "label": bench_labeling,
+}
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Return a message per benchmark that regressed past ``tolerance``."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if previous["p50_ms"] > 0 and current["p50_ms"] > previous["p50_ms"] * tolerance:
+            regressions.append(f"{name}: p50 {previous['p50_ms']:.3f}ms -> {current['p50_ms']:.3f}ms")
+        elif current["rows_per_sec"] * tolerance < previous["rows_per_sec"]:
+            regressions.append(
+                f"{name}: rows/sec {previous['rows_per_sec']:.0f} -> {current['rows_per_sec']:.0f}")
+    return regressions
+
+
+def print_results(results: Dict[str, Dict]) -> None:
+    header = f"{'benchmark':<44} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} {'rows/s':>12} {'peak MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(f"{name:<44} {r['p50_ms']:>10.3f} {r['p90_ms']:>10.3f} {r['p99_ms']:>10.3f} "
+              f"{r['rows_per_sec']:>12.0f} {r['peak_mem_mb']:>9.2f}")
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", choices=sorted(BENCHMARKS), action="append",
+                        help="run only these benchmark groups")
+    parser.add_argument("--quick", action="store_true", help="smaller fixtures for a fast run")
+    parser.add_argument("--save", help="write results as a JSON baseline")
+    parser.add_argument("--compare", help="baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="allowed slowdown factor before a regression is reported")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for group in args.only or BENCHMARKS:
+        results.update(BENCHMARKS[group](args.quick))
+    print_results(results)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "quick": args.quick,
+                "benchmarks": results,
+            }, f, indent=2)
+        print(f"\nBaseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)["benchmarks"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.compare}:")
+            for message in regressions:
+                print(f"  {message}")
+            return 1
+        print(f"\nNo regressions against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""Compare the student and teacher results stored in the beers ``outputs`` column.
+
+Each cell is a Python-repr dict ``{'student_result': [[...], ...],
+'teacher_result': [[...], ...]}`` whose values may include ``Decimal('...')``
+and ``None``. Cells are scanned with one regular-expression tokenizer pass;
+every row is hashed from its tokens as it is read, so no Python objects are
+built for the rows. Each result then reduces to an ordered hash, an
+order-independent multiset (bag) hash and a set hash, and set/bag/ordered
+equality for the whole file is decided by comparing hash arrays.
+
+    python datasets/beers/compare_outputs.py datasets/beers/beers.csv --mode bag
+"""
+import argparse
+import hashlib
+import re
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+MODES = ("set", "bag", "ordered")
+SIDES = ("student_result", "teacher_result")
+
+_TOKEN = re.compile(r"""
+    (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+  | Decimal\(\s*(?P<decimal>'[^']*'|"[^"]*")\s*\)
+  | (?P<number>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+  | (?P<open>[\[({]|[A-Za-z_][\w.]*\()
+  | (?P<close>[\])}])
+  | (?P<name>[A-Za-z_]\w*)
+  | (?P<sep>[,:])
+  | (?P<space>\s+)
+""", re.VERBOSE)
+
+_MASK = (1 << 64) - 1
+
+
+def _number(text: str) -> str:
+    """Canonical text of a number so that 0.75, 0.7500 and Decimal('0.75') agree."""
+    try:
+        value = Decimal(text).normalize()
+    except InvalidOperation:
+        return text
+    return "0" if value.is_zero() else str(value)
+
+
+def _row_hash(parts: List[bytes]) -> int:
+    return int.from_bytes(hashlib.blake2b(b"\x1f".join(parts), digest_size=8).digest(), "little")
+
+
+def _mix(h: int) -> int:
+    """Spread a row hash before summing, so the multiset sum is not linear in the raw hashes."""
+    h = (h ^ (h >> 31)) * 0x7FB5D329728EA185 & _MASK
+    h = (h ^ (h >> 27)) * 0x81DADEF4BC2DD44D & _MASK
+    return h ^ (h >> 33)
+
+
+def iter_rows(payload: str) -> Iterator[Tuple[str, int, int, int]]:
+    """Yield ``(side, row hash, start, end)`` for every row of every result in ``payload``.
+
+    ``start:end`` is the row's span in ``payload``, for reporting.
+    """
+    depth = 0
+    side: Optional[str] = None
+    pending_key: Optional[str] = None
+    parts: List[bytes] = []
+    row_start = 0
+    for match in _TOKEN.finditer(payload):
+        kind = match.lastgroup
+        if kind == "space" or kind is None:
+            continue
+        text = match.group(kind)
+        if kind == "open":
+            depth += 1
+            if depth == 3:
+                parts, row_start = [], match.start()
+                continue
+        elif kind == "close":
+            depth -= 1
+            if depth == 2 and side is not None:
+                yield side, _row_hash(parts), row_start, match.end()
+                continue
+            if depth == 1:
+                side = None
+        elif depth == 1 and kind == "string":
+            pending_key = text[1:-1]
+            continue
+        elif depth == 1 and kind == "sep" and text == ":":
+            side, pending_key = pending_key, None
+            continue
+        if depth >= 3:
+            if kind == "decimal" or kind == "number":
+                parts.append(b"n" + _number(text.strip("'\"")).encode())
+            elif kind != "sep" or text != ",":
+                parts.append(text.encode())
+        elif depth == 2 and kind in ("string", "number", "decimal", "name"):
+            # A result made of scalars: each scalar is its own one-column row
+            value = _number(text.strip("'\"")) if kind in ("number", "decimal") else text
+            yield side, _row_hash([value.encode()]), match.start(), match.end()
+
+
+def summarize(payload: str) -> Dict[str, Tuple[int, int, int, int]]:
+    """Per side: ``(rows, ordered hash, bag hash, set hash)``."""
+    state = {side: [0, 0, 0, set()] for side in SIDES}
+    for side, h, _, _ in iter_rows(payload):
+        entry = state.setdefault(side, [0, 0, 0, set()])
+        entry[0] += 1
+        entry[1] = (entry[1] * 0x100000001B3 + h + 1) & _MASK
+        entry[2] = (entry[2] + _mix(h)) & _MASK
+        entry[3].add(h)
+    return {
+        side: (rows, ordered, bag, sum(_mix(h) for h in distinct) & _MASK)
+        for side, (rows, ordered, bag, distinct) in state.items()
+    }
+
+
+def compare_outputs(outputs: pd.Series) -> pd.DataFrame:
+    """Set, bag and ordered equality of student vs teacher results for every cell.
+
+    Missing cells compare as equal empty results.
+    """
+    n = len(outputs)
+    hashes = {side: np.zeros((n, 4), dtype=np.uint64) for side in SIDES}
+    for i, payload in enumerate(outputs.fillna('').astype(str)):
+        for side, values in summarize(payload).items():
+            if side in hashes:
+                hashes[side][i] = values
+    student, teacher = hashes["student_result"], hashes["teacher_result"]
+    same_rows = student[:, 0] == teacher[:, 0]
+    return pd.DataFrame({
+        "student_rows": student[:, 0].astype(np.int64),
+        "teacher_rows": teacher[:, 0].astype(np.int64),
+        "ordered_equal": same_rows & (student[:, 1] == teacher[:, 1]),
+        "bag_equal": same_rows & (student[:, 2] == teacher[:, 2]),
+        "set_equal": student[:, 3] == teacher[:, 3],
+    }, index=outputs.index)
+
+
+def derive_ground_truth(outputs: pd.Series, mode: str = "bag") -> pd.Series:
+    """``Y`` where student and teacher results are equal under ``mode``, else ``N``."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode '{mode}', expected one of {MODES}")
+    equal = compare_outputs(outputs)[f"{mode}_equal"].to_numpy()
+    return pd.Series(np.where(equal, "Y", "N"), index=outputs.index, dtype=object)
+
+
+def check_ground_truth(df: pd.DataFrame, mode: str = "bag") -> Dict:
+    """Compare ``ground_truth`` with the label derived from ``outputs``."""
+    derived = derive_ground_truth(df["outputs"], mode)
+    disagree = derived != df["ground_truth"]
+    return {
+        "mode": mode,
+        "compared": len(df),
+        "agree": int((~disagree).sum()),
+        "disagree_index": df.index[disagree].tolist(),
+    }
+
+
+def first_difference(payload: str, mode: str = "bag") -> Optional[Dict]:
+    """The first row that makes the two results differ under ``mode``, or None if equal.
+
+    Returns ``side`` (the result holding the row), its ``position`` there and
+    the row's ``text``; for ``ordered`` a missing row is reported with
+    ``text`` None.
+    """
+    rows: Dict[str, List[Tuple[int, int, int]]] = {side: [] for side in SIDES}
+    for side, h, start, end in iter_rows(payload):
+        rows.setdefault(side, []).append((h, start, end))
+    student, teacher = rows["student_result"], rows["teacher_result"]
+
+    def found(side, position, entry):
+        return {"side": side, "position": position, "text": payload[entry[1]:entry[2]] if entry else None}
+
+    if mode == "ordered":
+        for position in range(max(len(student), len(teacher))):
+            s = student[position] if position < len(student) else None
+            t = teacher[position] if position < len(teacher) else None
+            if s is None or t is None or s[0] != t[0]:
+                return found("student_result", position, s) if s else found("teacher_result", position, t)
+        return None
+
+    def excess(left, right):
+        if mode == "set":
+            available = {h for h, _, _ in right}
+            for position, entry in enumerate(left):
+                if entry[0] not in available:
+                    return position, entry
+            return None
+        available: Dict[int, int] = {}
+        for h, _, _ in right:
+            available[h] = available.get(h, 0) + 1
+        for position, entry in enumerate(left):
+            if available.get(entry[0], 0) == 0:
+                return position, entry
+            available[entry[0]] -= 1
+        return None
+
+    for side, left, right in (("student_result", student, teacher), ("teacher_result", teacher, student)):
+        hit = excess(left, right)
+        if hit is not None:
+            return found(side, *hit)
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare student/teacher results in a beers CSV")
+    parser.add_argument("csv_path")
+    parser.add_argument("--mode", choices=MODES, default="bag")
+    parser.add_argument("--output", help="write the CSV with outputs_label and first_difference columns")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv_path)
+    comparison = compare_outputs(df["outputs"])
+    for mode in MODES:
+        print(f"{mode} equal: {int(comparison[f'{mode}_equal'].sum())}/{len(df)}")
+    if "ground_truth" in df.columns:
+        report = check_ground_truth(df, args.mode)
+        print(f"ground_truth agrees with {args.mode} comparison on {report['agree']}/{report['compared']} rows")
+        for index in report["disagree_index"][:20]:
+            print(f"  row {index}: ground_truth={df.at[index, 'ground_truth']}")
+    if args.output:
+        df["outputs_label"] = np.where(comparison[f"{args.mode}_equal"], "Y", "N")
+        df["first_difference"] = [
+            None if equal else str(first_difference(payload, args.mode))
+            for payload, equal in zip(df["outputs"].fillna('').astype(str), comparison[f"{args.mode}_equal"])
+        ]
+        df.to_csv(args.output, index=False)
+        print(f"Results saved to {args.output}")
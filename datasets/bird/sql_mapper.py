@@ -1,132 +1,154 @@
-import json
+import sys
 import pandas as pd
-import sqlglot
 from sqlglot import parse_one
-from sqlglot.expressions import Table, Column, Identifier
-from typing import Dict, Set, Tuple, Optional, List
+from sqlglot.expressions import Expression, Table, Column, Identifier
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Set, Tuple, Optional, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from mapping import pipeline
+from mapping.instrumentation import PipelineMetrics, timed
 
 
 class SQLMapper:
-    def __init__(self, table_mapping: Dict[str, str], column_mapping: Dict[str, str]):
+    def __init__(self, table_mapping: Dict[str, str], column_mapping: Dict[str, str],
+                 metrics: Optional[PipelineMetrics] = None):
         self.table_mapping = {k.upper(): v for k, v in table_mapping.items()}
         self.column_mapping = {k.upper(): v for k, v in column_mapping.items()}
+        self.metrics = metrics
+        # Exception behind the last None returned by map_sql_query
+        self.last_error: Optional[Exception] = None
     
-    def extract_tables_and_columns(self, sql_query: str) -> Tuple[Set[str], Set[str]]:
+    def extract_tables_and_columns(self, sql_query: str,
+                                   parsed: Optional[Expression] = None) -> Tuple[Set[str], Set[str]]:
+        """Collect upper-cased table and column names.
+
+        Pass an already ``parsed`` tree to skip parsing ``sql_query`` again.
+        """
         try:
-            parsed = parse_one(sql_query, dialect="sqlite")
+            if parsed is None:
+                parsed = parse_one(sql_query, dialect="sqlite")
             
             tables = set()
             columns = set()
             
-            for table in parsed.find_all(Table):
-                tables.add(table.name.upper())
-            
-            for column in parsed.find_all(Column):
-                columns.add(column.name.upper())
+            for node in parsed.find_all(Table, Column):
+                if isinstance(node, Table):
+                    tables.add(node.name.upper())
+                else:
+                    columns.add(node.name.upper())
             
             return tables, columns
             
         except Exception:
             return set(), set()
     
-    def map_sql_query(self, sql_query: str, pretty: bool = True) -> Optional[str]:
-        try:
-            parsed = parse_one(sql_query, dialect="sqlite")
-            
-            def transform_table(node):
-                if isinstance(node, Table):
-                    original_name = node.name.upper()
-                    if original_name in self.table_mapping:
-                        node.set("this", Identifier(this=self.table_mapping[original_name]))
-                return node
-            
-            def transform_column(node):
-                if isinstance(node, Column):
-                    # Handle table qualification (e.g., table.column)
-                    if node.table:
-                        original_table_name = node.table.upper()
-                        if original_table_name in self.table_mapping:
-                            node.set("table", Identifier(this=self.table_mapping[original_table_name]))
-                    
-                    # Handle column name mapping
-                    original_name = node.name.upper()
-                    if original_name in self.column_mapping:
-                        node.set("this", Identifier(this=self.column_mapping[original_name]))
-                return node
+    def rewrite_in_place(self, parsed: Expression) -> Tuple[Set[str], Set[str]]:
+        """Rename tables, qualifiers and columns of ``parsed`` in a single walk.
+
+        The tree is modified in place (no copy). Returns the original table
+        and column names seen, as ``extract_tables_and_columns`` would.
+        """
+        tables = set()
+        columns = set()
+        
+        for node in parsed.find_all(Table, Column):
+            original_name = node.name.upper()
+            if isinstance(node, Table):
+                tables.add(original_name)
+                if original_name in self.table_mapping:
+                    node.set("this", Identifier(this=self.table_mapping[original_name]))
+                continue
             
-            transformed = parsed.transform(transform_table)
-            transformed = transformed.transform(transform_column)
+            columns.add(original_name)
+            # Handle table qualification (e.g., table.column)
+            if node.table:
+                original_table_name = node.table.upper()
+                if original_table_name in self.table_mapping:
+                    node.set("table", Identifier(this=self.table_mapping[original_table_name]))
             
-            return transformed.sql(dialect="sqlite", pretty=pretty)
+            # Handle column name mapping
+            if original_name in self.column_mapping:
+                node.set("this", Identifier(this=self.column_mapping[original_name]))
+        
+        return tables, columns
+    
+    def map_and_extract(self, sql_query: str, pretty: bool = True) -> Tuple[Optional[str], Set[str], Set[str]]:
+        """Parse once, then return the mapped query with its original tables and columns."""
+        self.last_error = None
+        try:
+            with timed(self.metrics, "parse"):
+                parsed = parse_one(sql_query, dialect="sqlite")
+            with timed(self.metrics, "rewrite"):
+                tables, columns = self.rewrite_in_place(parsed)
+            with timed(self.metrics, "emit"):
+                return parsed.sql(dialect="sqlite", pretty=pretty), tables, columns
             
-        except Exception:
-            return None
+        except Exception as e:
+            self.last_error = e
+            return None, set(), set()
     
-def load_mapping_from_schemas_json(file_path: str, database_name: str) -> Tuple[Dict[str, str], Dict[str, str]]:
-    try:
-        with open(file_path, 'r') as f:
-            data = json.load(f)
+    def map_sql_query(self, sql_query: str, pretty: bool = True) -> Optional[str]:
+        self.last_error = None
+        try:
+            with timed(self.metrics, "parse"):
+                parsed = parse_one(sql_query, dialect="sqlite")
+            with timed(self.metrics, "rewrite"):
+                self.rewrite_in_place(parsed)
+            with timed(self.metrics, "emit"):
+                return parsed.sql(dialect="sqlite", pretty=pretty)
             
-        if database_name not in data:
-            raise ValueError(f"Database '{database_name}' not found in schemas file")
-        
-        mapping = data[database_name]["mapping"]
-        return mapping["tables"], mapping["columns"]
-        
-    except Exception:
-        return {}, {}
+        except Exception as e:
+            # Callers get None; the exception is kept for failure metrics
+            self.last_error = e
+            return None
 
+    def map_many(self, queries: Iterable[str], pretty: bool = True,
+                 failures: Optional[List[Tuple[int, Exception]]] = None) -> Iterator[Optional[str]]:
+        """Map a batch of queries, yielding one result per input, in order.
 
-def process_bird_csv(csv_path: str, schemas_path: str, output_path: str = None):
-    """Process all q1 and q2 queries in bird.csv using the SQL mapper."""
-    
-    # Load the CSV file
-    df = pd.read_csv(csv_path)
-    
-    # Load all schemas data once
-    with open(schemas_path, 'r') as f:
-        schemas_data = json.load(f)
-    
-    # Add new columns for mapped queries if they don't exist
-    if 'q1_mapped' not in df.columns:
-        df['q1_mapped'] = None
-    if 'q2_mapped' not in df.columns:
-        df['q2_mapped'] = None
-    
-    for idx, row in df.iterrows():
-        dbid = row['dbid']
-        q1 = row['q1'] if pd.notna(row['q1']) else None
-        q2 = row['q2'] if pd.notna(row['q2']) else None
-            
-        # Get mappings for this database
-        if dbid in schemas_data:
-            table_mapping = schemas_data[dbid]["mapping"]["tables"]
-            column_mapping = schemas_data[dbid]["mapping"]["columns"]
-            mapper = SQLMapper(table_mapping, column_mapping)
-        else:
-            # If no mapping found, create empty mapper
-            mapper = SQLMapper({}, {})
-        
-        # Process q1
-        if q1:
-            q1_mapped = mapper.map_sql_query(q1, pretty=False)
-            df.at[idx, 'q1_mapped'] = q1_mapped
-        
-        # Process q2
-        if q2:
-            q2_mapped = mapper.map_sql_query(q2, pretty=False)
-            df.at[idx, 'q2_mapped'] = q2_mapped
-        
-        # Print progress every 1000 rows
-        if (idx + 1) % 1000 == 0:
-            print(f"Processed {idx + 1} rows...")
-    
-    # Save to output file if specified
-    if output_path:
-        df.to_csv(output_path, index=False)
-        print(f"Results saved to {output_path}")
-    
-    return df
+        Queries repeated within the batch are mapped once. Failed queries
+        yield None; if ``failures`` is given, ``(index, error)`` is appended
+        to it for each of them.
+        """
+        seen: Dict[str, Tuple[Optional[str], Optional[Exception]]] = {}
+        for i, sql_query in enumerate(queries):
+            result = seen.get(sql_query)
+            if result is None:
+                mapped = self.map_sql_query(sql_query, pretty=pretty)
+                result = seen[sql_query] = (mapped, self.last_error)
+            if result[0] is None and failures is not None:
+                failures.append((i, result[1]))
+            yield result[0]
+
+
+# Kept importable from here, as before the pipeline moved to mapping/
+load_mapping_from_schemas_json = pipeline.load_mapping_from_schemas_json
+
+
+class MapperRegistry(pipeline.MapperRegistry):
+    mapper_class = SQLMapper
+
+
+def process_bird_csv(csv_path: str, schemas_path: str, output_path: str = None,
+                     registry: Optional[MapperRegistry] = None, **options) -> pd.DataFrame:
+    """Process all q1 and q2 queries in bird.csv using the SQL mapper.
+
+    Pass a ``registry`` to reuse mappers and memoized queries across runs;
+    ``options`` are those of ``mapping.pipeline.process_csv``.
+    """
+    registry = registry or MapperRegistry.from_schemas(schemas_path)
+    return pipeline.process_csv(csv_path, registry, output_path, **options)
+
+
+def stream_bird_csv(csv_path: str, schemas_path: str, output_path: str, chunksize: int = 5000,
+                    registry: Optional[MapperRegistry] = None, **options) -> Dict[str, int]:
+    """Map bird.csv in fixed-size chunks with bounded memory and resumable checkpoints.
+
+    ``options`` are those of ``mapping.pipeline.stream_csv``.
+    """
+    registry = registry or MapperRegistry.from_schemas(schemas_path)
+    return pipeline.stream_csv(csv_path, registry, output_path, chunksize, **options)
 
 
 if __name__ == "__main__":
@@ -134,9 +156,10 @@ if __name__ == "__main__":
     csv_path = "/Users/xinyi/Desktop/ce_bench/datasets/bird/bird.csv"
     schemas_path = "/Users/xinyi/Desktop/ce_bench/datasets/bird/schemas.json"
     output_path = "/Users/xinyi/Desktop/ce_bench/datasets/bird/bird.csv"
+    metrics_path = "/Users/xinyi/Desktop/ce_bench/datasets/bird/bird_metrics.json"
     
     print("Starting to process bird.csv...")
-    results = process_bird_csv(csv_path, schemas_path, output_path)
+    results = process_bird_csv(csv_path, schemas_path, output_path, metrics_path=metrics_path)
     print(f"Processing complete! Processed {len(results)} rows.")
     
     # Show some statistics
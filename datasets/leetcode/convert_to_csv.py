@@ -1,70 +1,371 @@
 import json
 import csv
+import io
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from mapping.streaming import ChunkedCSVWriter
+
+try:
+    # Faster JSON decoding when orjson is installed; the output is identical
+    import orjson
+    _fast_loads = orjson.loads
+except ImportError:
+    _fast_loads = json.loads
+
+
+def _loads(line):
+    try:
+        return _fast_loads(line)
+    except ValueError:
+        # orjson rejects NaN/Infinity and integers beyond 64 bits
+        return json.loads(line)
+
+# Define CSV headers - updated for .out file structure
+CSV_FIELDNAMES = ['dbid', 'index', 'schema', 'constraint', 'states', 'times', 'counterexample', 'err', 'q1', 'q2']
+
 def extract_db_id(file_path):
     """Extract database ID from file path like 'benchmark/leetcode/raw_data/175.csv' -> '175'"""
     # Get the filename without extension
     filename = Path(file_path).stem
     return filename
 
-def convert_jsonlines_to_csv(input_file, output_file):
-    """Convert jsonlines file to CSV with required format"""
+def _csv_row(data):
+    """One solver result (a parsed .out line) as a CSV row."""
+    # Extract dbid from file path
+    dbid = extract_db_id(data['file'])
+    
+    # Extract q1 and q2 from pair array
+    pair = data['pair']
+    q1 = pair[0] if len(pair) > 0 else ""
+    q2 = pair[1] if len(pair) > 1 else ""
     
-    with open(input_file, 'r', encoding='utf-8') as f_in:
-        with open(output_file, 'w', newline='', encoding='utf-8') as f_out:
-            # Define CSV headers - updated for .out file structure
-            fieldnames = ['dbid', 'index', 'schema', 'constraint', 'states', 'times', 'counterexample', 'err', 'q1', 'q2']
-            writer = csv.DictWriter(f_out, fieldnames=fieldnames)
-            writer.writeheader()
+    # Create CSV row
+    return {
+        'dbid': dbid,
+        'index': data['index'],
+        'schema': json.dumps(data['schema']),  # Keep as JSON string
+        'constraint': json.dumps(data['constraint']),  # Keep as JSON string
+        'states': json.dumps(data['states']),  # Keep as JSON string
+        'times': json.dumps(data['times']),  # Keep as JSON string
+        'counterexample': data.get('counterexample', ''),  # Use get() in case it's null
+        'err': data.get('err', ''),  # Use get() in case it's null
+        'q1': q1,
+        'q2': q2
+    }
+
+def convert_jsonlines_to_csv(input_file, output_file, chunksize=1000):
+    """Convert jsonlines file to CSV with required format
+
+    Rows are written through ChunkedCSVWriter: every ``chunksize`` lines are
+    checkpointed, so an interrupted conversion resumes where it stopped, and
+    the finished CSV replaces ``output_file`` atomically. A checkpoint made
+    from a different or since-edited ``input_file`` is discarded.
+    """
+    with open(input_file, 'r', encoding='utf-8') as f_in, \
+            ChunkedCSVWriter(output_file, CSV_FIELDNAMES, source_path=input_file) as writer:
+        rows = []
+        lines_done = 0
+        for line in f_in:
+            lines_done += 1
+            # Skip lines already converted before an interruption
+            if lines_done <= writer.rows_done:
+                continue
+            
+            # Parse JSON line
+            rows.append(_csv_row(_loads(line.strip())))
             
-            for line in f_in:
-                # Parse JSON line
-                data = json.loads(line.strip())
-                
-                # Extract dbid from file path
-                dbid = extract_db_id(data['file'])
-                
-                # Extract q1 and q2 from pair array
-                pair = data['pair']
-                q1 = pair[0] if len(pair) > 0 else ""
-                q2 = pair[1] if len(pair) > 1 else ""
-                
-                # Create CSV row
-                row = {
-                    'dbid': dbid,
-                    'index': data['index'],
-                    'schema': json.dumps(data['schema']),  # Keep as JSON string
-                    'constraint': json.dumps(data['constraint']),  # Keep as JSON string
-                    'states': json.dumps(data['states']),  # Keep as JSON string
-                    'times': json.dumps(data['times']),  # Keep as JSON string
-                    'counterexample': data.get('counterexample', ''),  # Use get() in case it's null
-                    'err': data.get('err', ''),  # Use get() in case it's null
-                    'q1': q1,
-                    'q2': q2
-                }
-                
-                writer.writerow(row)
+            if len(rows) >= chunksize:
+                writer.write_rows(rows)
+                writer.checkpoint(lines_done)
+                rows = []
+        
+        writer.write_rows(rows)
+        writer.commit()
+
+# Bytes of one shard handed to a worker at a time
+_INGEST_RANGE_BYTES = 32 << 20
+
+
+def _line_ranges(path, start, range_bytes):
+    """Split ``path`` from ``start`` into byte ranges that end on line boundaries.
+
+    A trailing line without a newline (still being written) is left out.
+    """
+    ranges = []
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        while start < size:
+            f.seek(min(start + range_bytes, size) - 1)
+            f.readline()
+            end = f.tell()
+            if end == size:
+                f.seek(start)
+                last_newline = f.read(size - start).rfind(b'\n')
+                end = start + last_newline + 1 if last_newline >= 0 else start
+                if end > start:
+                    ranges.append((start, end))
+                break
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _ingest_range(path, start, end):
+    """Parse lines ``start:end`` of one shard into CSV text; returns ``(text, lines)``."""
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=CSV_FIELDNAMES)
+    lines = 0
+    with open(path, 'rb') as f:
+        f.seek(start)
+        for line in f.read(end - start).splitlines():
+            if line.strip():
+                writer.writerow(_csv_row(_loads(line)))
+                lines += 1
+    return out.getvalue(), lines
+
+
+def _load_ingest_state(state_path):
+    try:
+        with open(state_path, 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return state if state.get("fieldnames") == CSV_FIELDNAMES else None
+
+
+def _save_ingest_state(state_path, state):
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp_path, state_path)
+
+
+def ingest_jsonlines(shards, output_file, workers=1, range_bytes=_INGEST_RANGE_BYTES):
+    """Append new lines of many solver .out shards to one CSV
+
+    ``<output_file>.ingest.json`` records, per shard, the byte offset already
+    ingested, and the size of the output it produced. A re-run reads each
+    shard only from its offset and appends the new rows to ``output_file``;
+    rows already there are never rewritten. A shard's trailing line without
+    a newline is left for the next run, so shards may still be growing. If a
+    run dies, the next one truncates the output back to the last recorded
+    size and re-reads from the recorded offsets. Byte ranges of the shards
+    are parsed on ``workers`` processes and appended in shard order. Returns
+    the number of new rows per shard.
+
+    An existing ``output_file`` without ingest state, one that is smaller
+    than recorded, and a shard that shrank or was replaced (new inode) since
+    the last run all raise ValueError: the output cannot be extended safely
+    and must be rebuilt by removing it and its state file.
+    """
+    state_path = f"{output_file}.ingest.json"
+    state = _load_ingest_state(state_path) if os.path.exists(output_file) else None
+    if state is None:
+        if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
+            raise ValueError(f"{output_file} exists but was not written by ingest "
+                             f"(no valid {state_path}); refusing to overwrite it")
+        state = {"fieldnames": CSV_FIELDNAMES, "bytes_written": 0, "shards": {}}
+    elif os.path.getsize(output_file) < state["bytes_written"]:
+        raise ValueError(f"{output_file} is smaller than recorded in {state_path}; "
+                         f"it was changed outside ingest, remove both to rebuild")
+    
+    tasks = []
+    for shard in shards:
+        key = os.path.abspath(shard)
+        stat = os.stat(shard)
+        entry = state["shards"].setdefault(key, {"offset": 0, "lines": 0, "inode": stat.st_ino})
+        if stat.st_size < entry["offset"] or entry.get("inode", stat.st_ino) != stat.st_ino:
+            raise ValueError(f"{shard} shrank or was replaced since the last ingest; its rows in "
+                             f"{output_file} are stale, remove it and {state_path} to rebuild")
+        entry["inode"] = stat.st_ino
+        for start, end in _line_ranges(shard, entry["offset"], range_bytes):
+            tasks.append((key, start, end))
+    
+    added = {os.path.abspath(shard): 0 for shard in shards}
+    with open(output_file, 'a+', newline='', encoding='utf-8') as f_out:
+        # Drop anything appended after the last recorded state
+        f_out.truncate(state["bytes_written"])
+        f_out.seek(state["bytes_written"])
+        if state["bytes_written"] == 0:
+            csv.writer(f_out).writerow(CSV_FIELDNAMES)
+        
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(tasks) > 1 else None
+        try:
+            results = (executor.map(_ingest_range, *zip(*tasks)) if executor is not None and tasks
+                       else (_ingest_range(*task) for task in tasks))
+            for (key, start, end), (text, lines) in zip(tasks, results):
+                f_out.write(text)
+                f_out.flush()
+                os.fsync(f_out.fileno())
+                entry = state["shards"][key]
+                entry["offset"] = end
+                entry["lines"] += lines
+                state["bytes_written"] = f_out.tell()
+                _save_ingest_state(state_path, state)
+                added[key] += lines
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        if not tasks:
+            f_out.flush()
+            state["bytes_written"] = f_out.tell()
+            _save_ingest_state(state_path, state)
+    return {shard: added[os.path.abspath(shard)] for shard in shards}
+
+# Columns whose cells hold JSON lists in the CSV output
+_JSON_LIST_COLUMNS = ['states', 'times']
+
+# Nullable text columns; the CSV writes None as an empty cell
+_OPTIONAL_TEXT_COLUMNS = ['counterexample', 'err']
+
+
+def _normalize_results(df):
+    """Give CSV and Parquet results the same cell types and missing values."""
+    import pandas as pd
+    if 'times' in df.columns:
+        # Parquet hands back a null time as NaN, the CSV's JSON as None
+        df['times'] = [[None if t is None or t != t else float(t) for t in cell] for cell in df['times']]
+    for column in _OPTIONAL_TEXT_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.Series([cell if isinstance(cell, str) and cell else None for cell in df[column]],
+                                   index=df.index, dtype=object)
+    if 'dbid' in df.columns:
+        df['dbid'] = df['dbid'].astype(str)
+    return df
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet output requires pyarrow (pip install pyarrow)") from e
+    return pa, pq
+
+
+def _results_arrow_schema(pa):
+    return pa.schema([
+        ('dbid', pa.dictionary(pa.int32(), pa.string())),
+        ('index', pa.int64()),
+        ('schema', pa.string()),  # JSON string, nested per database
+        ('constraint', pa.string()),  # JSON string
+        ('states', pa.list_(pa.string())),
+        ('times', pa.list_(pa.float64())),
+        ('counterexample', pa.string()),
+        ('err', pa.string()),
+        ('q1', pa.string()),
+        ('q2', pa.string()),
+    ])
+
+
+def convert_jsonlines_to_parquet(input_file, output_file, row_group_size=10000):
+    """Convert jsonlines file to a typed Parquet file
+
+    Unlike the CSV, ``states`` is stored as list<string>, ``times`` as
+    list<double> and ``dbid`` dictionary-encoded, so readers neither re-parse
+    JSON nor load columns they do not ask for. Rows are written one row group
+    at a time, and the file replaces ``output_file`` atomically at the end.
+    """
+    pa, pq = _require_pyarrow()
+    schema = _results_arrow_schema(pa)
+    partial_path = f"{output_file}.partial"
+    
+    def flush(columns, writer):
+        batch = pa.RecordBatch.from_pydict(
+            {**columns, 'dbid': pa.array(columns['dbid'], pa.string()).dictionary_encode()},
+            schema=schema,
+        )
+        writer.write_batch(batch)
+        for values in columns.values():
+            values.clear()
+    
+    columns = {name: [] for name in schema.names}
+    with open(input_file, 'r', encoding='utf-8') as f_in, pq.ParquetWriter(partial_path, schema) as writer:
+        for line in f_in:
+            data = json.loads(line.strip())
+            pair = data['pair']
+            columns['dbid'].append(extract_db_id(data['file']))
+            columns['index'].append(data['index'])
+            columns['schema'].append(json.dumps(data['schema']))
+            columns['constraint'].append(json.dumps(data['constraint']))
+            columns['states'].append(data['states'])
+            columns['times'].append([None if t is None else float(t) for t in data['times']])
+            columns['counterexample'].append(data.get('counterexample'))
+            columns['err'].append(data.get('err'))
+            columns['q1'].append(pair[0] if len(pair) > 0 else "")
+            columns['q2'].append(pair[1] if len(pair) > 1 else "")
+            if len(columns['index']) >= row_group_size:
+                flush(columns, writer)
+        if columns['index']:
+            flush(columns, writer)
+    os.replace(partial_path, output_file)
+
+
+def load_results(path, columns=None, filters=None):
+    """Load converted solver results as a DataFrame.
+
+    Parquet files only read the requested ``columns`` and can push
+    ``filters`` (pyarrow syntax, e.g. ``[('dbid', 'in', ['175', '182'])]``)
+    down to the row groups. CSV output is still accepted. Either way
+    ``states``/``times`` cells are Python lists (``times`` of floats),
+    ``dbid`` holds str and an empty ``counterexample``/``err`` is None, so
+    both formats load to equal frames.
+    """
+    if str(path).endswith('.parquet'):
+        _, pq = _require_pyarrow()
+        table = pq.read_table(path, columns=columns, filters=filters)
+        df = table.to_pandas()
+        for column in _JSON_LIST_COLUMNS:
+            if column in df.columns:
+                df[column] = [[] if cell is None else cell.tolist() for cell in df[column]]
+        return _normalize_results(df)
+    
+    if filters is not None:
+        raise ValueError("filters are only supported for Parquet results")
+    import pandas as pd
+    # Text such as "NULL" or "nan" in a query stays text; only the columns below are nullable
+    df = pd.read_csv(path, usecols=columns, dtype={'dbid': str}, keep_default_na=False)
+    for column in _JSON_LIST_COLUMNS:
+        if column in df.columns:
+            df[column] = [json.loads(cell) if cell else [] for cell in df[column]]
+    return _normalize_results(df)
+
 
 if __name__ == "__main__":
-    input_file = "leetcode.out"
-    output_file = "leetcode.csv"
+    if len(sys.argv) > 1 and sys.argv[1] == "ingest":
+        # python convert_to_csv.py ingest output.csv shard1.out [shard2.out ...]
+        output_file, shards = sys.argv[2], sys.argv[3:]
+        added = ingest_jsonlines(shards, output_file, workers=os.cpu_count() or 1)
+        for shard, lines in added.items():
+            print(f"{shard}: {lines} new rows")
+        print(f"Appended {sum(added.values())} rows to {output_file}")
+    else:
+        input_file = sys.argv[1] if len(sys.argv) > 1 else "leetcode.out"
+        output_file = sys.argv[2] if len(sys.argv) > 2 else "leetcode.csv"
     
-    convert_jsonlines_to_csv(input_file, output_file)
-    print(f"Successfully converted {input_file} to {output_file}")
+        if output_file.endswith('.parquet'):
+            convert_jsonlines_to_parquet(input_file, output_file)
+            print(f"Successfully converted {input_file} to {output_file}")
+            print(load_results(output_file).head(3))
+        else:
+            convert_jsonlines_to_csv(input_file, output_file)
+            print(f"Successfully converted {input_file} to {output_file}")
     
-    # Show first few rows as verification
-    print("\nFirst 3 rows of the converted CSV:")
-    with open(output_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for i, row in enumerate(reader):
-            if i >= 3:
-                break
-            print(f"Row {i+1}:")
-            for key, value in row.items():
-                if key in ['q1', 'q2']:
-                    print(f"  {key}: {value[:100]}..." if len(value) > 100 else f"  {key}: {value}")
-                else:
-                    print(f"  {key}: {value}")
-            print()
\ No newline at end of file
+            # Show first few rows as verification
+            print("\nFirst 3 rows of the converted CSV:")
+            with open(output_file, 'r', encoding='utf-8') as f:
+                reader = csv.DictReader(f)
+                for i, row in enumerate(reader):
+                    if i >= 3:
+                        break
+                    print(f"Row {i+1}:")
+                    for key, value in row.items():
+                        if key in ['q1', 'q2']:
+                            print(f"  {key}: {value[:100]}..." if len(value) > 100 else f"  {key}: {value}")
+                        else:
+                            print(f"  {key}: {value}")
+                    print()
\ No newline at end of file
@@ -1,48 +1,123 @@
-import csv
 import ast
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
 import pandas as pd
 
-# Read the CSV file
-df = pd.read_csv('leetcode_full_with_states.csv')
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from mapping.labels import REFERENCE_VALUES, label_from_states
+
+# Reference label columns, translated to Y/N by REFERENCE_VALUES
+REFERENCE_COLUMNS = ["verieql_label", "ground_truth"]
 
-# Add a new 'correct' column
-df['correct'] = None
 
-# Process each row to determine correctness
-for i, row in df.iterrows():
+def _parse_one_states(states_str) -> List[str]:
+    """Parse a single states cell, accepting JSON or a Python list literal."""
+    if states_str is None or (isinstance(states_str, float) and pd.isna(states_str)):
+        return []
+    text = str(states_str).strip()
+    if not text or text in ('None', 'nan'):
+        return []
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
     try:
-        states_str = row.get('states', '[]')
-        
-        # Parse the states string back to a list
-        try:
-            if states_str and str(states_str).strip() and str(states_str) != 'None' and str(states_str) != 'nan':
-                states = ast.literal_eval(str(states_str))
-            else:
-                states = []
-        except (ValueError, SyntaxError):
-            states = []
-        
-        # Determine correctness based on states
-        if states and states[-1] == "TMO":
-            correct = "Y"
-        elif states and any(state in ["NEQ", "SYN", "NSE", "NIE"] for state in states):
-            correct = "N"
-        elif states and all(state == "EQU" for state in states):
-            correct = "Y"
-        else:
-            correct = None  # Uncertain cases
-        
-        df.at[i, 'correct'] = correct
-
-    except Exception as e:
-        print(f"Error processing row {i}: {e}")
-        df.at[i, 'correct'] = None
-
-# Save the updated DataFrame back to the CSV file
-df.to_csv('leetcode_full_with_states.csv', index=False)
-print(f"Updated leetcode_full_with_states.csv with 'correct' column")
-
-# Print some statistics
-correct_counts = df['correct'].value_counts()
-print(f"Label statistics:")
-print(correct_counts)
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return []
+
+
+def parse_states(states: pd.Series) -> pd.Series:
+    """Parse a whole ``states`` column of JSON lists in one ``json.loads`` call.
+
+    The cells are written by ``convert_to_csv.py`` with ``json.dumps``, so
+    they are joined into one JSON array and decoded at once. Missing cells
+    become empty lists; if any cell is not valid JSON the column falls back
+    to parsing cell by cell.
+    """
+    cells = states.fillna('[]').astype(str).str.strip()
+    cells = cells.mask(cells.isin(['', 'None', 'nan']), '[]')
+    try:
+        parsed = json.loads('[' + ','.join(cells.tolist()) + ']')
+    except ValueError:
+        parsed = None
+    if parsed is None or len(parsed) != len(cells):
+        parsed = [_parse_one_states(cell) for cell in states.tolist()]
+    return pd.Series(parsed, index=states.index, dtype=object)
+
+
+def label_states(states: pd.Series) -> pd.Series:
+    """Compute the Y/N/None label for every row of a parsed states column.
+
+    The rules are ``mapping.labels.label_from_states``. Cells that did not
+    parse to a list (e.g. a JSON scalar) are labeled None.
+    """
+    return pd.Series([label_from_states(s) if isinstance(s, (list, tuple)) else None for s in states.tolist()],
+                     index=pd.RangeIndex(len(states)), dtype=object)
+
+
+def label_frame(df: pd.DataFrame, states_column: str = 'states', label_column: str = 'correct') -> pd.DataFrame:
+    """Add ``label_column`` to ``df`` from its states column.
+
+    Datasets without a states column (e.g. beers) get an all-None label.
+    """
+    if states_column in df.columns:
+        labels = label_states(parse_states(df[states_column]))
+        df[label_column] = pd.Series(labels.to_numpy(), index=df.index, dtype=object)
+    else:
+        df[label_column] = None
+    return df
+
+
+def agreement_report(df: pd.DataFrame, label_column: str = 'correct',
+                     reference_columns: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """Compare computed labels with the reference label columns present in ``df``.
+
+    Reference values EQU/NEQ are read as Y/N. For each reference column the
+    report gives how many rows both sides labeled, how many agree, the
+    agreement rate, and a label x reference confusion table.
+    """
+    report = {}
+    computed = df[label_column]
+    for column in reference_columns or REFERENCE_COLUMNS:
+        if column not in df.columns:
+            continue
+        reference = df[column].map(REFERENCE_VALUES)
+        both = computed.notna() & reference.notna()
+        agree = int((computed[both] == reference[both]).sum())
+        compared = int(both.sum())
+        confusion = pd.crosstab(computed.fillna('None'), reference.fillna('None'),
+                                rownames=[label_column], colnames=[column])
+        report[column] = {
+            "compared": compared,
+            "agree": agree,
+            "disagree": compared - agree,
+            "agreement": agree / compared if compared else None,
+            "confusion": confusion.to_dict(),
+        }
+    return report
+
+
+if __name__ == "__main__":
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else 'leetcode_full_with_states.csv'
+
+    # Read the CSV file and add the 'correct' column
+    df = pd.read_csv(csv_path)
+    label_frame(df)
+
+    # Save the updated DataFrame back to the CSV file
+    df.to_csv(csv_path, index=False)
+    print(f"Updated {csv_path} with 'correct' column")
+
+    # Print some statistics
+    correct_counts = df['correct'].value_counts()
+    print(f"Label statistics:")
+    print(correct_counts)
+
+    for column, stats in agreement_report(df).items():
+        print(f"\nAgreement with {column}: {stats['agree']}/{stats['compared']} rows")
+        if stats['agreement'] is not None:
+            print(f"  rate: {stats['agreement']:.2%}")
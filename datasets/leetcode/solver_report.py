@@ -0,0 +1,270 @@
+"""Solver timing and state analytics over converted results.
+
+The ``times`` and ``states`` columns written by ``convert_to_csv.py`` hold
+one list per pair (one entry per bound). They are loaded here as ragged
+arrays, ``offsets`` plus flat ``values``, so every statistic is a NumPy
+operation over all pairs at once:
+
+- latency percentiles of the total solver time per dbid and per dataset,
+- timeout (TMO) and NEQ rates,
+- time to the first NEQ (solver time summed up to the first NEQ bound),
+- per-bound growth curves (time per bound and its growth over the previous).
+
+    python solver_report.py leetcode.csv literature.parquet --json report.json
+"""
+import argparse
+import itertools
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+PERCENTILES = (50, 90, 99)
+
+
+class Ragged:
+    """A list of variable-length rows stored as ``offsets`` (n + 1) and flat ``values``."""
+
+    def __init__(self, offsets: np.ndarray, values: np.ndarray):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @classmethod
+    def from_lists(cls, lists: Sequence[Optional[list]], dtype) -> "Ragged":
+        lengths = np.fromiter((len(x) if x else 0 for x in lists), dtype=np.int64, count=len(lists))
+        offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        flat = list(itertools.chain.from_iterable(x for x in lists if x))
+        return cls(offsets, np.array(flat, dtype=dtype) if flat else np.zeros(0, dtype=dtype))
+
+    @classmethod
+    def concatenate(cls, parts: List["Ragged"]) -> "Ragged":
+        offsets = [np.zeros(1, dtype=np.int64)]
+        base = 0
+        for part in parts:
+            offsets.append(part.offsets[1:] + base)
+            base += len(part.values)
+        return cls(np.concatenate(offsets), np.concatenate([p.values for p in parts]))
+
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def row_ids(self) -> np.ndarray:
+        """Row number of every value."""
+        return np.repeat(np.arange(len(self)), self.lengths())
+
+    def positions(self) -> np.ndarray:
+        """Position of every value within its row (the bound index)."""
+        return np.arange(len(self.values)) - np.repeat(self.offsets[:-1], self.lengths())
+
+    def row_sums(self) -> np.ndarray:
+        values = np.nan_to_num(self.values.astype(np.float64))
+        # bincount returns integers when there are no values at all
+        return np.bincount(self.row_ids(), weights=values, minlength=len(self)).astype(np.float64)
+
+    def first_position(self, mask: np.ndarray) -> np.ndarray:
+        """Per row, the position of the first value where ``mask`` holds, or -1."""
+        first = np.full(len(self), -1, dtype=np.int64)
+        rows = self.row_ids()[mask]
+        hit_rows, first_hit = np.unique(rows, return_index=True)
+        first[hit_rows] = self.positions()[mask][first_hit]
+        return first
+
+
+class SolverResults:
+    """Flat arrays for many converted result files.
+
+    ``dbid`` and ``dataset`` are integer codes into ``dbid_names`` and
+    ``dataset_names``; ``states`` values are codes into ``state_names``.
+    """
+
+    def __init__(self, dbid: np.ndarray, dbid_names: np.ndarray, dataset: np.ndarray, dataset_names: List[str],
+                 times: Ragged, states: Ragged, state_names: List[str]):
+        self.dbid = dbid
+        self.dbid_names = dbid_names
+        self.dataset = dataset
+        self.dataset_names = dataset_names
+        self.times = times
+        self.states = states
+        self.state_names = state_names
+
+    def __len__(self) -> int:
+        return len(self.dbid)
+
+    def state_mask(self, *names: str) -> np.ndarray:
+        codes = [self.state_names.index(n) for n in names if n in self.state_names]
+        return np.isin(self.states.values, codes)
+
+
+def _parse_json_column(cells: pd.Series) -> List[list]:
+    """Decode a column of JSON lists with one ``json.loads`` call."""
+    text = cells.fillna('[]').astype(str)
+    try:
+        return json.loads('[' + ','.join(text.tolist()) + ']')
+    except ValueError:
+        return [json.loads(cell) if cell.startswith('[') else [] for cell in text]
+
+
+def _load_one(path: str):
+    """``(dbids, times Ragged, state lists or Ragged-with-names)`` for one file."""
+    if str(path).endswith('.parquet'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, columns=['dbid', 'states', 'times'])
+        dbids = table.column('dbid').cast(pa.string()).to_numpy(zero_copy_only=False)
+        times_list = table.column('times').combine_chunks()
+        states_list = table.column('states').combine_chunks()
+        times = Ragged(times_list.offsets.to_numpy(), times_list.values.to_numpy(zero_copy_only=False))
+        encoded = states_list.values.dictionary_encode()
+        names = [str(s) for s in encoded.dictionary.to_pylist()]
+        states = Ragged(states_list.offsets.to_numpy(), encoded.indices.to_numpy(zero_copy_only=False))
+        return dbids.astype(object), times, (states, names)
+    df = pd.read_csv(path, usecols=['dbid', 'states', 'times'], dtype={'dbid': str})
+    times = Ragged.from_lists(_parse_json_column(df['times']), np.float64)
+    return df['dbid'].to_numpy(dtype=object), times, _parse_json_column(df['states'])
+
+
+def _state_code(state_names: List[str], name: str) -> int:
+    if name not in state_names:
+        state_names.append(name)
+    return state_names.index(name)
+
+
+def load_solver_results(paths: Sequence[str]) -> SolverResults:
+    """Load CSV or Parquet results (``convert_to_csv.py`` output); each file is one dataset."""
+    dbids, times_parts, state_parts, datasets = [], [], [], []
+    state_names: List[str] = []
+    for number, path in enumerate(paths):
+        file_dbids, times, states = _load_one(path)
+        if isinstance(states, tuple):
+            ragged, names = states
+            remap = np.array([_state_code(state_names, n) for n in names], dtype=np.int16)
+            states = Ragged(ragged.offsets, remap[ragged.values] if len(remap) else ragged.values.astype(np.int16))
+        else:
+            states = Ragged.from_lists([[_state_code(state_names, s) for s in row] if row else []
+                                        for row in states], np.int16)
+        dbids.append(file_dbids)
+        times_parts.append(times)
+        state_parts.append(states)
+        datasets.append(np.full(len(file_dbids), number, dtype=np.int32))
+    # Missing dbids (NaN from CSV, None from Parquet) form one group named None
+    dbid_codes, dbid_names = pd.factorize(np.concatenate(dbids), use_na_sentinel=False)
+    dbid_names = np.asarray(dbid_names, dtype=object)
+    dbid_names[pd.isna(dbid_names)] = None
+    return SolverResults(dbid_codes, dbid_names, np.concatenate(datasets),
+                         [Path(p).stem for p in paths], Ragged.concatenate(times_parts),
+                         Ragged.concatenate(state_parts), state_names)
+
+
+def grouped_percentiles(groups: np.ndarray, values: np.ndarray, n_groups: int,
+                        percentiles: Sequence[float] = PERCENTILES) -> np.ndarray:
+    """Linear-interpolated percentiles of ``values`` per group; NaN values and empty groups give NaN."""
+    keep = ~np.isnan(values)
+    groups, values = groups[keep], values[keep]
+    order = np.lexsort((values, groups))
+    groups, values = groups[order], values[order]
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    result = np.full((n_groups, len(percentiles)), np.nan)
+    has = counts > 0
+    for j, p in enumerate(percentiles):
+        rank = (counts[has] - 1) * (p / 100.0)
+        low = np.floor(rank).astype(np.int64)
+        high = np.minimum(low + 1, counts[has] - 1)
+        frac = rank - low
+        result[has, j] = values[starts[has] + low] * (1 - frac) + values[starts[has] + high] * frac
+    return result
+
+
+def _group_table(groups: np.ndarray, names, label: str,
+                 total: np.ndarray, timed_out: np.ndarray, neq: np.ndarray,
+                 time_to_neq: np.ndarray) -> pd.DataFrame:
+    n_groups = len(names)
+    pairs = np.bincount(groups, minlength=n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        table = pd.DataFrame({
+            label: list(names),
+            'pairs': pairs,
+            'tmo_rate': np.bincount(groups, weights=timed_out, minlength=n_groups) / pairs,
+            'neq_rate': np.bincount(groups, weights=neq, minlength=n_groups) / pairs,
+        })
+    latency = grouped_percentiles(groups, total, n_groups)
+    for j, p in enumerate(PERCENTILES):
+        table[f'time_p{p}'] = latency[:, j]
+    table['time_to_first_neq_p50'] = grouped_percentiles(groups, time_to_neq, n_groups, (50,))[:, 0]
+    return table
+
+
+def solver_report(results: SolverResults) -> Dict[str, pd.DataFrame]:
+    """Per-dbid, per-dataset and per-bound tables for ``results``."""
+    times, states = results.times, results.states
+    total = times.row_sums()
+    total[times.lengths() == 0] = np.nan
+
+    state_rows = states.row_ids()
+    timed_out = np.bincount(state_rows[results.state_mask('TMO')], minlength=len(results)) > 0
+    first_neq = states.first_position(results.state_mask('NEQ'))
+    neq = first_neq >= 0
+
+    # Solver time up to and including the bound where NEQ was first reported
+    cumulative = np.cumsum(np.nan_to_num(times.values))
+    before_row = np.concatenate([[0.0], cumulative])[times.offsets[:-1]]
+    lengths = times.lengths()
+    reachable = neq & (first_neq < lengths)
+    time_to_neq = np.full(len(results), np.nan)
+    time_to_neq[reachable] = cumulative[times.offsets[:-1][reachable] + first_neq[reachable]] - before_row[reachable]
+
+    per_dbid = _group_table(results.dbid, results.dbid_names, 'dbid', total, timed_out, neq, time_to_neq)
+    per_dataset = _group_table(results.dataset, results.dataset_names, 'dataset',
+                               total, timed_out, neq, time_to_neq)
+
+    bounds = times.positions()
+    n_bounds = int(bounds.max()) + 1 if len(bounds) else 0
+    bound_values = times.values.astype(np.float64)
+    counted = ~np.isnan(bound_values)
+    pairs = np.bincount(bounds[counted], minlength=n_bounds)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(bounds[counted], weights=bound_values[counted], minlength=n_bounds) / pairs
+        per_bound = pd.DataFrame({'bound': np.arange(1, n_bounds + 1), 'pairs': pairs, 'time_mean': mean})
+        per_bound_pct = grouped_percentiles(bounds, bound_values, n_bounds)
+        for j, p in enumerate(PERCENTILES):
+            per_bound[f'time_p{p}'] = per_bound_pct[:, j]
+        per_bound['growth'] = per_bound['time_mean'] / per_bound['time_mean'].shift(1)
+
+    overall = {
+        'pairs': len(results),
+        'tmo_rate': float(timed_out.mean()) if len(results) else None,
+        'neq_rate': float(neq.mean()) if len(results) else None,
+    }
+    return {'overall': overall, 'per_dataset': per_dataset, 'per_dbid': per_dbid, 'per_bound': per_bound}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solver timing and state report")
+    parser.add_argument("paths", nargs="+", help="converted results (.csv or .parquet), one dataset each")
+    parser.add_argument("--json", help="also write the report as JSON")
+    parser.add_argument("--top", type=int, default=20, help="dbids shown, slowest p90 first")
+    args = parser.parse_args()
+
+    report = solver_report(load_solver_results(args.paths))
+    overall = report['overall']
+    if overall['pairs']:
+        print(f"{overall['pairs']} pairs, TMO rate {overall['tmo_rate']:.2%}, NEQ rate {overall['neq_rate']:.2%}")
+    else:
+        print("0 pairs")
+    print("\nPer dataset:")
+    print(report['per_dataset'].to_string(index=False))
+    print(f"\nPer dbid (top {args.top} by p90):")
+    print(report['per_dbid'].sort_values('time_p90', ascending=False).head(args.top).to_string(index=False))
+    print("\nPer bound:")
+    print(report['per_bound'].to_string(index=False))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({key: value if isinstance(value, dict) else json.loads(value.to_json(orient='records'))
+                       for key, value in report.items()}, f, indent=2)
+        print(f"Report saved to {args.json}")
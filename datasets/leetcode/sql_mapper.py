@@ -1,13 +1,101 @@
-import json
+import sys
 import pandas as pd
 import re
-from typing import Dict, Set, Tuple, Optional, List
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Tuple, Optional, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from mapping import pipeline
+from mapping.instrumentation import PipelineMetrics, timed
+
+
+_WORD_NAME = re.compile(r'\w+')
+_IDENTIFIER_TOKEN = re.compile(r'`(\w+)`|"(\w+)"|(\w+)')
+_QUOTES = ('', '`', '"')
+
+
+class IdentifierRenamer:
+    """Rename table/column identifiers in a single scan of a query.
+
+    The mapping is compiled once into a lookup keyed by (identifier, quote).
+    Entries are resolved in the order given (tables before columns, longest
+    name first), so the output matches the old per-name ``re.sub`` loop,
+    including renames that chain into a later entry, names shared by a table
+    and a column, and quotes dropped by an identity mapping.
+    """
+
+    def __init__(self, ordered_mapping: List[Tuple[str, str]]):
+        self.ordered_mapping = ordered_mapping
+        self._resolved: Dict[Tuple[str, str], str] = {}
+        self._patterns: List[Tuple[re.Pattern, str]] = []
+
+        simple = all(
+            _WORD_NAME.fullmatch(original) and _WORD_NAME.fullmatch(mapped)
+            for original, mapped in ordered_mapping
+        )
+        if simple:
+            # holders[(current value, quote)] lists the tokens of the query
+            # that currently read as that value; each entry moves them on.
+            holders: Dict[Tuple[str, str], List[Tuple[str, str]]] = {}
+            for original, _ in ordered_mapping:
+                for quote in _QUOTES:
+                    holders.setdefault((original, quote), [(original, quote)])
+            for original, mapped in ordered_mapping:
+                for quote in _QUOTES:
+                    tokens = holders.pop((original, quote), [])
+                    if not tokens:
+                        continue
+                    # The bare pattern renames inside quotes and keeps them;
+                    # the quoted pattern then only matches (and strips the
+                    # quotes) when the new name equals the old one.
+                    if quote and mapped.upper() == original:
+                        quote = ''
+                    for token in tokens:
+                        self._resolved[token] = f"{quote}{mapped}{quote}"
+                    holders.setdefault((mapped.upper(), quote), []).extend(tokens)
+        else:
+            # Names with non-word characters keep the old sequential
+            # semantics, but with each pattern compiled only once.
+            for original, mapped in ordered_mapping:
+                for pattern in (
+                    rf'\b{re.escape(original)}\b',
+                    rf'`{re.escape(original)}`',
+                    rf'"{re.escape(original)}"',
+                ):
+                    self._patterns.append((re.compile(pattern, flags=re.IGNORECASE), mapped))
+
+    def _replace_token(self, match: re.Match) -> str:
+        backtick, double_quote, bare = match.groups()
+        if backtick is not None:
+            key = (backtick.upper(), '`')
+        elif double_quote is not None:
+            key = (double_quote.upper(), '"')
+        else:
+            key = (bare.upper(), '')
+        return self._resolved.get(key, match.group(0))
+
+    def rename(self, sql_query: str) -> str:
+        if self._patterns:
+            for pattern, mapped in self._patterns:
+                sql_query = pattern.sub(mapped, sql_query)
+            return sql_query
+        if not self._resolved:
+            return sql_query
+        return _IDENTIFIER_TOKEN.sub(self._replace_token, sql_query)
 
 
 class SQLMapper:
-    def __init__(self, table_mapping: Dict[str, str], column_mapping: Dict[str, str]):
+    def __init__(self, table_mapping: Dict[str, str], column_mapping: Dict[str, str],
+                 metrics: Optional[PipelineMetrics] = None):
         self.table_mapping = {k.upper(): v for k, v in table_mapping.items()}
         self.column_mapping = {k.upper(): v for k, v in column_mapping.items()}
+        self.metrics = metrics
+        # Exception behind the last None returned by map_sql_query
+        self.last_error: Optional[Exception] = None
+        # Sort by length descending to avoid partial matches
+        sorted_tables = sorted(self.table_mapping.items(), key=lambda x: len(x[0]), reverse=True)
+        sorted_columns = sorted(self.column_mapping.items(), key=lambda x: len(x[0]), reverse=True)
+        self.renamer = IdentifierRenamer(sorted_tables + sorted_columns)
     
     def map_sql_query(self, sql_query: str, pretty: bool = True) -> Optional[str]:
         # Always use fallback mapping for reliability
@@ -15,106 +103,61 @@ class SQLMapper:
     
     def _fallback_mapping(self, sql_query: str) -> Optional[str]:
         """Fallback method for simple string replacement when sqlglot fails."""
+        self.last_error = None
         try:
-            import re
-            # Simple string-based mapping as fallback
-            mapped_query = sql_query
-            
-            # Replace table names - sort by length descending to avoid partial matches
-            sorted_tables = sorted(self.table_mapping.items(), key=lambda x: len(x[0]), reverse=True)
-            for original_table, mapped_table in sorted_tables:
-                # Replace table names in various contexts with word boundaries
-                patterns = [
-                    rf'\b{re.escape(original_table)}\b',
-                    rf'`{re.escape(original_table)}`',
-                    rf'"{re.escape(original_table)}"',
-                ]
-                for pattern in patterns:
-                    mapped_query = re.sub(pattern, mapped_table, mapped_query, flags=re.IGNORECASE)
-            
-            # Replace column names - sort by length descending to avoid partial matches
-            sorted_columns = sorted(self.column_mapping.items(), key=lambda x: len(x[0]), reverse=True)
-            for original_column, mapped_column in sorted_columns:
-                # Replace column names in various contexts with word boundaries
-                patterns = [
-                    rf'\b{re.escape(original_column)}\b',
-                    rf'`{re.escape(original_column)}`',
-                    rf'"{re.escape(original_column)}"',
-                ]
-                for pattern in patterns:
-                    mapped_query = re.sub(pattern, mapped_column, mapped_query, flags=re.IGNORECASE)
-            
-            return mapped_query
-            
-        except Exception:
+            with timed(self.metrics, "rewrite"):
+                return self.renamer.rename(sql_query)
+        except Exception as e:
+            # Callers get None; the exception is kept for failure metrics
+            self.last_error = e
             return None
-    
-def load_mapping_from_schemas_json(file_path: str, database_name: str) -> Tuple[Dict[str, str], Dict[str, str]]:
-    try:
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-            
-        if database_name not in data:
-            raise ValueError(f"Database '{database_name}' not found in schemas file")
-        
-        mapping = data[database_name]["mapping"]
-        return mapping["tables"], mapping["columns"]
-        
-    except Exception:
-        return {}, {}
-
-
-def process_bird_csv(csv_path: str, schemas_path: str, output_path: str = None):
-    """Process all q1 and q2 queries in bird.csv using the SQL mapper."""
-    
-    # Load the CSV file
-    df = pd.read_csv(csv_path)
-    
-    # Load all schemas data once
-    with open(schemas_path, 'r') as f:
-        schemas_data = json.load(f)
-    
-    # Add new columns for mapped queries if they don't exist
-    if 'q1_mapped' not in df.columns:
-        df['q1_mapped'] = None
-    if 'q2_mapped' not in df.columns:
-        df['q2_mapped'] = None
-    
-    for idx, row in df.iterrows():
-        dbid = row['dbid']
-        q1 = row['q1'] if pd.notna(row['q1']) else None
-        q2 = row['q2'] if pd.notna(row['q2']) else None
-            
-        # Get mappings for this database
-        dbid_str = str(dbid)  # Convert to string for lookup
-        if dbid_str in schemas_data:
-            table_mapping = schemas_data[dbid_str]["mapping"]["tables"]
-            column_mapping = schemas_data[dbid_str]["mapping"]["columns"]
-            mapper = SQLMapper(table_mapping, column_mapping)
-        else:
-            # If no mapping found, create empty mapper
-            mapper = SQLMapper({}, {})
-        
-        # Process q1
-        if q1:
-            q1_mapped = mapper.map_sql_query(q1, pretty=False)
-            df.at[idx, 'q1_mapped'] = q1_mapped
-        
-        # Process q2
-        if q2:
-            q2_mapped = mapper.map_sql_query(q2, pretty=False)
-            df.at[idx, 'q2_mapped'] = q2_mapped
-        
-        # Print progress every 1000 rows
-        if (idx + 1) % 1000 == 0:
-            print(f"Processed {idx + 1} rows...")
-    
-    # Save to output file if specified
-    if output_path:
-        df.to_csv(output_path, index=False)
-        print(f"Results saved to {output_path}")
-    
-    return df
+
+    def map_many(self, queries: Iterable[str], pretty: bool = True,
+                 failures: Optional[List[Tuple[int, Exception]]] = None) -> Iterator[Optional[str]]:
+        """Map a batch of queries, yielding one result per input, in order.
+
+        Queries repeated within the batch are mapped once. Failed queries
+        yield None; if ``failures`` is given, ``(index, error)`` is appended
+        to it for each of them.
+        """
+        seen: Dict[str, Tuple[Optional[str], Optional[Exception]]] = {}
+        for i, sql_query in enumerate(queries):
+            result = seen.get(sql_query)
+            if result is None:
+                mapped = self.map_sql_query(sql_query, pretty=pretty)
+                result = seen[sql_query] = (mapped, self.last_error)
+            if result[0] is None and failures is not None:
+                failures.append((i, result[1]))
+            yield result[0]
+
+
+# Kept importable from here, as before the pipeline moved to mapping/
+load_mapping_from_schemas_json = pipeline.load_mapping_from_schemas_json
+
+
+class MapperRegistry(pipeline.MapperRegistry):
+    mapper_class = SQLMapper
+
+
+def process_bird_csv(csv_path: str, schemas_path: str, output_path: str = None,
+                     registry: Optional[MapperRegistry] = None, **options) -> pd.DataFrame:
+    """Process all q1 and q2 queries in leetcode_full.csv using the SQL mapper.
+
+    Pass a ``registry`` to reuse mappers and memoized queries across runs;
+    ``options`` are those of ``mapping.pipeline.process_csv``.
+    """
+    registry = registry or MapperRegistry.from_schemas(schemas_path)
+    return pipeline.process_csv(csv_path, registry, output_path, **options)
+
+
+def stream_bird_csv(csv_path: str, schemas_path: str, output_path: str, chunksize: int = 5000,
+                    registry: Optional[MapperRegistry] = None, **options) -> Dict[str, int]:
+    """Map leetcode_full.csv in fixed-size chunks with bounded memory and resumable checkpoints.
+
+    ``options`` are those of ``mapping.pipeline.stream_csv``.
+    """
+    registry = registry or MapperRegistry.from_schemas(schemas_path)
+    return pipeline.stream_csv(csv_path, registry, output_path, chunksize, **options)
 
 
 if __name__ == "__main__":
@@ -122,9 +165,10 @@ if __name__ == "__main__":
     csv_path = "/Users/xinyi/Desktop/ce_bench/datasets/leetcode/leetcode_full.csv"
     schemas_path = "/Users/xinyi/Desktop/ce_bench/datasets/leetcode/schemas.json"
     output_path = "/Users/xinyi/Desktop/ce_bench/datasets/leetcode/leetcode_full.csv"
+    metrics_path = "/Users/xinyi/Desktop/ce_bench/datasets/leetcode/leetcode_full_metrics.json"
 
     print("Starting to process leetcode_full.csv...")
-    results = process_bird_csv(csv_path, schemas_path, output_path)
+    results = process_bird_csv(csv_path, schemas_path, output_path, metrics_path=metrics_path)
     print(f"Processing complete! Processed {len(results)} rows.")
     
     # Show some statistics
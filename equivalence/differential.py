@@ -0,0 +1,566 @@
+"""Differential testing of q1/q2 pairs on random SQLite databases.
+
+For every schema, one in-memory SQLite connection is opened and its tables
+are created once. Random databases that respect the DDL (primary keys,
+NOT NULL, UNIQUE, CHECK ... IN lists and foreign keys, including ones added
+by ALTER TABLE) are then loaded one at a time, and every still-undecided
+pair of that schema is run against each database. The first database on
+which q1 and q2 return different bags of rows (different lists when both
+queries have an ORDER BY) is the pair's counterexample, written as INSERT
+statements. Only read-only queries are run, so no pair can change the
+database the others see.
+
+    python equivalence/differential.py beers.csv --output beers_diff.csv
+    python equivalence/differential.py leetcode.csv --schemas schema_info.json --workers 8
+
+A pair that never differs is ``UNK`` (not proven equivalent); a pair whose
+queries cannot run in SQLite (or would write to it) is ``ERR``.
+"""
+import argparse
+import json
+import random
+import sqlite3
+import sys
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+import sqlglot
+from sqlglot import exp
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# States written to diff_state (EQU only comes from a fingerprint index)
+EQUIVALENT = "EQU"
+NOT_EQUIVALENT = "NEQ"
+UNKNOWN = "UNK"
+ERROR = "ERR"
+
+# Small value domains make joins, duplicates and NULL corner cases likely
+_INT_VALUES = [0, 1, 2, 3, -1]
+_REAL_VALUES = [0.0, 1.5, 2.0, -1.0]
+_TEXT_VALUES = ["a", "b", "c", "A", ""]
+_DATE_VALUES = ["2020-01-01", "2020-01-02", "2021-06-15", "2019-12-31"]
+_NULL_PROBABILITY = 0.15
+
+# SQLite VM instructions a single query may run before it is interrupted
+_STEP_LIMIT = 5_000_000
+
+# Authorizer actions a read-only query may compile to
+_READ_ACTIONS = frozenset([sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION,
+                           sqlite3.SQLITE_RECURSIVE])
+
+
+class TableSpec:
+    """Columns and constraints of one table, read back from SQLite."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.columns: List[str] = []
+        self.types: Dict[str, str] = {}
+        self.not_null: Dict[str, bool] = {}
+        self.primary_key: List[str] = []
+        # (columns, parent table, parent columns)
+        self.foreign_keys: List[Tuple[List[str], str, List[str]]] = []
+        # Allowed values from CHECK (col IN (...)) constraints
+        self.allowed: Dict[str, List[Any]] = {}
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def sql_literal(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, bytes):
+        return "X'" + value.hex() + "'"
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _statement_extras(statement: exp.Expression, tables: Dict[str, TableSpec]) -> None:
+    """Record FKs from ALTER TABLE and CHECK ... IN lists that SQLite cannot report."""
+    if isinstance(statement, exp.Alter):
+        spec = tables.get(statement.this.name.upper())
+        if spec is None:
+            return
+        for fk in statement.find_all(exp.ForeignKey):
+            reference = fk.args.get("reference")
+            if reference is None or not isinstance(reference.this, exp.Schema):
+                continue
+            columns = [e.name for e in fk.expressions]
+            parent = reference.this.this.name
+            parent_columns = [e.name for e in reference.this.expressions] or columns
+            spec.foreign_keys.append((columns, parent, parent_columns))
+    elif isinstance(statement, exp.Create):
+        spec = tables.get(statement.this.name.upper()) if statement.this else None
+        if spec is None:
+            return
+        for check in statement.find_all(exp.CheckColumnConstraint):
+            for in_expr in check.find_all(exp.In):
+                values = in_expr.expressions
+                if isinstance(in_expr.this, exp.Column) and values and all(isinstance(v, exp.Literal) for v in values):
+                    spec.allowed[in_expr.this.name.upper()] = [
+                        v.this if v.is_string else float(v.this) if '.' in v.this else int(v.this)
+                        for v in values
+                    ]
+
+
+def create_schema(conn: sqlite3.Connection, ddl: str) -> List[TableSpec]:
+    """Create the tables of ``ddl`` and return them parents-first.
+
+    Statements SQLite rejects (such as ALTER TABLE ... ADD FOREIGN KEY) are
+    skipped after their constraints have been recorded.
+    """
+    try:
+        statements = sqlglot.parse(ddl, read="sqlite")
+    except Exception:
+        statements = []
+    if statements and all(s is not None for s in statements):
+        for statement in statements:
+            try:
+                conn.execute(statement.sql(dialect="sqlite"))
+            except sqlite3.Error:
+                pass
+    else:
+        conn.executescript(ddl)
+
+    tables: Dict[str, TableSpec] = {}
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"):
+        spec = TableSpec(name)
+        pk_positions = []
+        for _, column, col_type, not_null, _, pk in conn.execute(f"PRAGMA table_info({quote_identifier(name)})"):
+            spec.columns.append(column)
+            spec.types[column] = (col_type or "").upper()
+            spec.not_null[column] = bool(not_null)
+            if pk:
+                pk_positions.append((pk, column))
+        spec.primary_key = [column for _, column in sorted(pk_positions)]
+        fks: Dict[int, Tuple[List[str], str, List[str]]] = {}
+        for fk_id, _, parent, column, parent_column, *_ in conn.execute(
+                f"PRAGMA foreign_key_list({quote_identifier(name)})"):
+            columns, _, parent_columns = fks.setdefault(fk_id, ([], parent, []))
+            columns.append(column)
+            parent_columns.append(parent_column)
+        spec.foreign_keys.extend(fks.values())
+        tables[name.upper()] = spec
+
+    for statement in statements:
+        if statement is not None:
+            _statement_extras(statement, tables)
+    for spec in tables.values():
+        spec.allowed = {c: spec.allowed[c.upper()] for c in spec.columns if c.upper() in spec.allowed}
+    return _parents_first(tables)
+
+
+def _parents_first(tables: Dict[str, TableSpec]) -> List[TableSpec]:
+    ordered: List[TableSpec] = []
+    state: Dict[str, int] = {}
+
+    def visit(key: str) -> None:
+        if state.get(key):
+            return  # done, or a cycle
+        state[key] = 1
+        for _, parent, _ in tables[key].foreign_keys:
+            if parent.upper() in tables and parent.upper() != key:
+                visit(parent.upper())
+        state[key] = 2
+        ordered.append(tables[key])
+
+    for key in tables:
+        visit(key)
+    return ordered
+
+
+def _value_pool(col_type: str) -> List[Any]:
+    if any(t in col_type for t in ("INT", "BOOL")):
+        return _INT_VALUES
+    if any(t in col_type for t in ("REAL", "FLOA", "DOUB", "DEC", "NUM")):
+        return _REAL_VALUES + _INT_VALUES
+    if "DATE" in col_type or "TIME" in col_type:
+        return _DATE_VALUES
+    return _TEXT_VALUES
+
+
+class SchemaSession:
+    """One in-memory SQLite database for a schema, reused for every pair."""
+
+    def __init__(self, ddl: str, step_limit: int = _STEP_LIMIT):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.isolation_level = None  # explicit transactions only
+        self.tables = create_schema(self.conn, ddl)
+        self._steps = 0
+        self.step_limit = step_limit
+        # Interrupt runaway queries; the handler runs every 1000 VM steps
+        self.conn.set_progress_handler(self._on_progress, 1000)
+        self._prepared: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+
+    def _on_progress(self) -> int:
+        self._steps += 1000
+        return 1 if self._steps > self.step_limit else 0
+
+    def reset_steps(self) -> None:
+        """Give the next statement batch a full step budget."""
+        self._steps = 0
+
+    def _replace_contents(self, insert) -> None:
+        """Empty every table and run ``insert()`` in one transaction, rolled back on error."""
+        self.reset_steps()
+        self.conn.execute("BEGIN")
+        try:
+            for spec in self.tables:
+                self.conn.execute(f"DELETE FROM {quote_identifier(spec.name)}")
+            insert()
+        except sqlite3.Error:
+            self.reset_steps()
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def random_database(self, rng: random.Random, max_rows: int) -> None:
+        """Replace the contents of every table with fresh random rows."""
+        def insert() -> None:
+            for spec in self.tables:
+                rows = [self._random_row(spec, rng) for _ in range(rng.randint(0, max_rows))]
+                if rows:
+                    placeholders = ", ".join("?" for _ in spec.columns)
+                    # OR IGNORE drops rows that break PK, UNIQUE, NOT NULL or CHECK
+                    self.reset_steps()
+                    self.conn.executemany(
+                        f"INSERT OR IGNORE INTO {quote_identifier(spec.name)} VALUES ({placeholders})", rows)
+        self._replace_contents(insert)
+
+    def _random_row(self, spec: TableSpec, rng: random.Random) -> List[Any]:
+        row = {}
+        for columns, parent, parent_columns in spec.foreign_keys:
+            parent_rows = self._parent_keys(parent, parent_columns)
+            nullable = not any(spec.not_null.get(c) for c in columns)
+            if parent_rows and not (nullable and rng.random() < _NULL_PROBABILITY):
+                row.update(zip(columns, rng.choice(parent_rows)))
+            elif nullable:
+                row.update((c, None) for c in columns)
+        for column in spec.columns:
+            if column in row:
+                continue
+            nullable = not spec.not_null[column] and column not in spec.primary_key
+            if nullable and rng.random() < _NULL_PROBABILITY:
+                row[column] = None
+            else:
+                row[column] = rng.choice(spec.allowed.get(column) or _value_pool(spec.types[column]))
+        return [row.get(column) for column in spec.columns]
+
+    def _parent_keys(self, parent: str, parent_columns: List[str]) -> List[Tuple]:
+        columns = ", ".join(quote_identifier(c) for c in parent_columns)
+        self.reset_steps()
+        try:
+            return self.conn.execute(f"SELECT DISTINCT {columns} FROM {quote_identifier(parent)}").fetchall()
+        except sqlite3.Error:
+            return []
+
+    def prepare(self, query: str) -> Tuple[Optional[str], Optional[str]]:
+        """Return ``(sql, error)``: the query as SQLite runs it, or why it cannot.
+
+        Statements that would write (DELETE, UPDATE, DDL, PRAGMA ...) are
+        rejected, since every pair of the schema shares this database.
+        """
+        if query in self._prepared:
+            return self._prepared[query]
+        candidates = [query]
+        try:
+            candidates.append(sqlglot.transpile(query, read="mysql", write="sqlite")[0])
+        except Exception:
+            pass
+        result: Tuple[Optional[str], Optional[str]] = (None, "empty query")
+        denied = []
+
+        def read_only(action, *_):
+            if action in _READ_ACTIONS:
+                return sqlite3.SQLITE_OK
+            denied.append(action)
+            return sqlite3.SQLITE_DENY
+
+        self.conn.set_authorizer(read_only)
+        try:
+            for candidate in candidates:
+                self.reset_steps()
+                denied.clear()
+                try:
+                    self.conn.execute(f"EXPLAIN {candidate}")
+                    result = (candidate, None)
+                    break
+                except sqlite3.Error as e:
+                    if result[0] is None:
+                        result = (None, "not a read-only query" if denied else f"{type(e).__name__}: {e}")
+        finally:
+            self.conn.set_authorizer(None)
+        self._prepared[query] = result
+        return result
+
+    def run(self, sql: str) -> Tuple[Optional[List[Tuple]], Optional[str]]:
+        self.reset_steps()
+        try:
+            return self.conn.execute(sql).fetchall(), None
+        except sqlite3.Error as e:
+            return None, f"{type(e).__name__}: {e}"
+
+    def dump(self) -> str:
+        """The current database as INSERT statements (empty tables omitted)."""
+        lines = []
+        self.reset_steps()
+        for spec in self.tables:
+            for row in self.conn.execute(f"SELECT * FROM {quote_identifier(spec.name)}"):
+                values = ", ".join(sql_literal(v) for v in row)
+                lines.append(f"INSERT INTO {quote_identifier(spec.name)} VALUES ({values});")
+        return "\n".join(lines)
+
+    def load(self, inserts: str) -> None:
+        """Replace the contents of every table with a dumped database."""
+        def insert() -> None:
+            # Split on complete statements, not on ";\n", which may sit inside a string value
+            statement = ""
+            for line in inserts.splitlines(keepends=True):
+                statement += line
+                if sqlite3.complete_statement(statement):
+                    self.reset_steps()
+                    self.conn.execute(statement)
+                    statement = ""
+            if statement.strip():
+                self.reset_steps()
+                self.conn.execute(statement)
+        self._replace_contents(insert)
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def _normalize_row(row: Tuple) -> Tuple:
+    return tuple(round(v, 9) if isinstance(v, float) else v for v in row)
+
+
+def _normalize(rows: List[Tuple]) -> Counter:
+    return Counter(_normalize_row(row) for row in rows)
+
+
+def is_ordered(sql: str) -> bool:
+    """True if the query's result order is defined by a top-level ORDER BY."""
+    try:
+        parsed = sqlglot.parse_one(sql, read="sqlite")
+    except Exception:
+        return False
+    return isinstance(parsed, exp.Query) and parsed.args.get("order") is not None
+
+
+def results_differ(rows1: Optional[List[Tuple]], rows2: Optional[List[Tuple]], ordered: bool = False) -> bool:
+    """Compare two result sets as bags, or as lists when ``ordered``."""
+    if ordered:
+        return [_normalize_row(row) for row in rows1] != [_normalize_row(row) for row in rows2]
+    return _normalize(rows1) != _normalize(rows2)
+
+
+def find_counterexamples(ddl: str, pairs: Sequence[Tuple[Hashable, str, str]], trials: int = 200,
+                         max_rows: int = 6, seed: int = 0, minimize: bool = False) -> Dict[Hashable, Dict[str, Any]]:
+    """Search random databases of one schema for results that tell q1 from q2.
+
+    ``pairs`` holds ``(key, q1, q2)``. Each random database is loaded once
+    and all still-open pairs run against it, so the cost of building data
+    is shared by every pair of the schema. When both queries of a pair have
+    an ORDER BY their rows are compared in order. Returns per key ``state``
+    (NEQ/UNK/ERR), ``counterexample`` (INSERT statements or None), ``err``
+    (for UNK, the pair's last runtime or data error) and the number of
+    ``trials`` run. With ``minimize`` each counterexample
+    is shrunk by ``equivalence.minimize`` before it is returned.
+    """
+    results: Dict[Hashable, Dict[str, Any]] = {}
+    try:
+        session = SchemaSession(ddl)
+    except sqlite3.Error as e:
+        error = f"schema: {type(e).__name__}: {e}"
+        return {key: {"state": ERROR, "counterexample": None, "err": error, "trials": 0} for key, _, _ in pairs}
+
+    pending: Dict[Hashable, Tuple[str, str, bool]] = {}
+    pair_queries = {key: (q1, q2) for key, q1, q2 in pairs}
+    for key, q1, q2 in pairs:
+        sql1, err1 = session.prepare(q1)
+        sql2, err2 = session.prepare(q2)
+        if err1 or err2:
+            error = "; ".join(f"{name}: {err}" for name, err in (("q1", err1), ("q2", err2)) if err)
+            results[key] = {"state": ERROR, "counterexample": None, "err": error, "trials": 0}
+        else:
+            pending[key] = (sql1, sql2, is_ordered(sql1) and is_ordered(sql2))
+
+    rng = random.Random(f"{seed}:{ddl}")
+    errors: Dict[Hashable, str] = {}
+    for trial in range(trials):
+        if not pending:
+            break
+        # Start with tiny databases; they make the most readable counterexamples
+        try:
+            session.random_database(rng, 1 + trial * max_rows // max(trials // 2, 1) if trial < trials // 2
+                                    else max_rows)
+        except sqlite3.Error as e:
+            # This database could not be built; pairs not separated by others end UNK
+            errors.update((key, f"data: {type(e).__name__}: {e}") for key in pending)
+            continue
+        for key, (sql1, sql2, ordered) in list(pending.items()):
+            rows1, err1 = session.run(sql1)
+            rows2, err2 = session.run(sql2)
+            if err1 or err2:
+                # Runtime error (or step limit) on this database only; try others
+                errors[key] = "; ".join(f"{name}: {err}" for name, err in (("q1", err1), ("q2", err2)) if err)
+                continue
+            if results_differ(rows1, rows2, ordered):
+                counterexample, error = session.dump(), None
+                if minimize:
+                    from equivalence.minimize import minimize_counterexample
+                    try:
+                        counterexample = minimize_counterexample(ddl, *pair_queries[key], counterexample)
+                    except (sqlite3.Error, ValueError) as e:
+                        # The unminimized database still separates the pair
+                        error = f"minimize: {type(e).__name__}: {e}"
+                results[key] = {"state": NOT_EQUIVALENT, "counterexample": counterexample, "err": error,
+                                "trials": trial + 1}
+                del pending[key]
+
+    for key in pending:
+        results[key] = {"state": UNKNOWN, "counterexample": None, "err": errors.get(key), "trials": trials}
+    session.close()
+    return results
+
+
+def load_schema_ddl(path: str) -> Dict[str, str]:
+    """dbid -> DDL from ``schema_info.json`` (or a schemas.json carrying original_schema)."""
+    with open(path, 'r') as f:
+        data = json.load(f)
+    return {str(dbid): entry["original_schema"] for dbid, entry in data.items() if "original_schema" in entry}
+
+
+def _is_ddl(value: Any) -> bool:
+    return isinstance(value, str) and "CREATE TABLE" in value.upper()
+
+
+def _run_group(ddl: str, pairs: List[Tuple[Hashable, str, str]], trials: int, max_rows: int, seed: int,
+               minimize: bool):
+    return find_counterexamples(ddl, pairs, trials=trials, max_rows=max_rows, seed=seed, minimize=minimize)
+
+
+def run_differential(df: pd.DataFrame, ddl_by_dbid: Optional[Dict[str, str]] = None, workers: int = 1,
+                     trials: int = 200, max_rows: int = 6, seed: int = 0, minimize: bool = False, index=None, dialect: Optional[str] = None) -> pd.DataFrame:
+    """Differentially test every q1/q2 row of ``df``.
+
+    DDL comes from the row's ``schema`` column when it holds CREATE TABLE
+    statements, otherwise from ``ddl_by_dbid[str(dbid)]``. Rows are grouped
+    by schema; each group runs in one worker on one connection, so its
+    random databases are built once for all of its pairs. Returns a frame aligned with ``df`` holding
+    diff_state, diff_counterexample, diff_err and diff_trials.
+
+    With a ``FingerprintIndex`` (``equivalence.fingerprint``), pairs it has
+    already settled are not tested again and new NEQ results are added to it.
+    """
+    if index is not None:
+        from equivalence.fingerprint import fingerprint
+        from mapping.map import ddl_hash
+        fingerprints: Dict[str, str] = {}
+        schema_hashes: Dict[str, str] = {}
+        keys: Dict[int, Tuple[str, str, str]] = {}
+    ddl_by_dbid = ddl_by_dbid or {}
+    groups: Dict[str, List[Tuple[Hashable, str, str]]] = defaultdict(list)
+    missing = []
+    settled: Dict[int, Dict[str, Any]] = {}
+    has_schema = 'schema' in df.columns
+    has_dbid = 'dbid' in df.columns
+    for pos, row in enumerate(df.itertuples(index=False)):
+        row = row._asdict()
+        ddl = row['schema'] if has_schema and _is_ddl(row['schema']) else None
+        if ddl is None and has_dbid:
+            ddl = ddl_by_dbid.get(str(row['dbid']))
+        q1, q2 = row.get('q1'), row.get('q2')
+        if ddl is None or not isinstance(q1, str) or not isinstance(q2, str):
+            missing.append(pos)
+            continue
+        if index is not None:
+            if ddl not in schema_hashes:
+                schema_hashes[ddl] = ddl_hash(ddl)
+            for q in (q1, q2):
+                if q not in fingerprints:
+                    fingerprints[q] = fingerprint(q, dialect)
+            keys[pos] = (schema_hashes[ddl], fingerprints[q1], fingerprints[q2])
+            entry = index.settled(*keys[pos])
+            if entry is not None:
+                state = EQUIVALENT if entry["label"] == "Y" else NOT_EQUIVALENT
+                settled[pos] = {"state": state, "counterexample": entry["counterexample"], "err": None, "trials": 0}
+                continue
+        groups[ddl].append((pos, q1, q2))
+
+    results: Dict[int, Dict[str, Any]] = {
+        pos: {"state": ERROR, "counterexample": None, "err": "no DDL or missing query", "trials": 0}
+        for pos in missing
+    }
+    if index is not None and settled:
+        print(f"{len(settled)} pairs already settled in {index.path}")
+    results.update(settled)
+    tasks = list(groups.items())
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_run_group, ddl, pairs, trials, max_rows, seed, minimize) for ddl, pairs in tasks]
+            for future in as_completed(futures):
+                results.update(future.result())
+                print(f"Tested {len(results)}/{len(df)} pairs...")
+    else:
+        for ddl, pairs in tasks:
+            results.update(_run_group(ddl, pairs, trials, max_rows, seed, minimize))
+            print(f"Tested {len(results)}/{len(df)} pairs...")
+
+    if index is not None:
+        index.put_many(
+            keys[pos] + ("N", None, result["counterexample"], "differential")
+            for pos, result in results.items()
+            if pos in keys and pos not in settled and result["state"] == NOT_EQUIVALENT
+        )
+
+    ordered = [results[pos] for pos in range(len(df))]
+    return pd.DataFrame({
+        "diff_state": [r["state"] for r in ordered],
+        "diff_counterexample": [r["counterexample"] for r in ordered],
+        "diff_err": [r["err"] for r in ordered],
+        "diff_trials": [r["trials"] for r in ordered],
+    }, index=df.index)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Find counterexamples for q1/q2 pairs on random SQLite databases")
+    parser.add_argument("csv_path")
+    parser.add_argument("--schemas", help="schema_info.json with original_schema per dbid")
+    parser.add_argument("--output", help="where to write the CSV with diff_* columns (default: print summary only)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--trials", type=int, default=200)
+    parser.add_argument("--max-rows", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--minimize", action="store_true", help="shrink each counterexample before saving it")
+    parser.add_argument("--index", help="fingerprint index (SQLite file) of settled pairs to skip and extend")
+    parser.add_argument("--dialect", default=None, help="sqlglot dialect used for fingerprints")
+    args = parser.parse_args(argv)
+
+    df = pd.read_csv(args.csv_path)
+    ddl_by_dbid = load_schema_ddl(args.schemas) if args.schemas else None
+    index = None
+    if args.index:
+        from equivalence.fingerprint import FingerprintIndex
+        index = FingerprintIndex(args.index)
+    diff = run_differential(df, ddl_by_dbid, workers=args.workers, trials=args.trials,
+                            max_rows=args.max_rows, seed=args.seed, minimize=args.minimize,
+                            index=index, dialect=args.dialect)
+    if index is not None:
+        index.close()
+    print(diff["diff_state"].value_counts().to_string())
+    if args.output:
+        pd.concat([df, diff], axis=1).to_csv(args.output, index=False)
+        print(f"Results saved to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
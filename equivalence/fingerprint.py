@@ -0,0 +1,255 @@
+"""Canonical query fingerprints and a persistent index of settled pairs.
+
+``fingerprint`` hashes a canonical form of a query: identifiers lower-cased,
+table aliases renamed to ``_t1, _t2, ...`` in order of appearance (resolved
+per SELECT scope), result column aliases nothing refers to dropped, and whitespace and keyword
+case fixed by regenerating the SQL with sqlglot. Trivially rewritten copies
+of a query then share one fingerprint.
+
+``FingerprintIndex`` is a SQLite file keyed by (schema hash, q1 fingerprint,
+q2 fingerprint) that stores the states and label a pair was given. A pair is
+settled once it has a Y/N label; later runs, on the same or another dataset
+with the same schema, look it up instead of testing it again.
+
+    python equivalence/fingerprint.py record beers.csv --index pairs.sqlite --label-column ground_truth
+    python equivalence/fingerprint.py pending beers-dummy.csv --index pairs.sqlite --output todo.csv
+"""
+import argparse
+import hashlib
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+import sqlglot
+from sqlglot import exp
+from sqlglot.optimizer.scope import traverse_scope
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from equivalence.differential import load_schema_ddl
+from mapping.map import ddl_hash
+
+# Labels that settle a pair
+SETTLED_LABELS = ("Y", "N")
+
+
+def _output_selects(node: exp.Expression) -> List[exp.Select]:
+    """The SELECTs whose projections are the query's result columns."""
+    if isinstance(node, exp.Subquery):
+        return _output_selects(node.this)
+    if isinstance(node, exp.SetOperation):
+        return _output_selects(node.left) + _output_selects(node.right)
+    return [node] if isinstance(node, exp.Select) else []
+
+
+def canonicalize(sql: str, dialect: Optional[str] = None) -> str:
+    """Canonical SQL text of ``sql``; unparsable queries only get whitespace collapsed."""
+    try:
+        tree = sqlglot.parse_one(sql, read=dialect)
+        scopes = traverse_scope(tree) if tree is not None else []
+    except Exception:
+        tree = None
+    if tree is None:
+        return " ".join(str(sql).split()).rstrip(";").strip()
+
+    for identifier in tree.find_all(exp.Identifier):
+        identifier.set("this", identifier.name.lower())
+        identifier.set("quoted", False)
+
+    # Each FROM/JOIN alias gets its own name; column qualifiers are resolved
+    # through the scope they appear in, so reused or correlated aliases stay apart
+    position = {id(node): i for i, node in enumerate(tree.walk())}
+    definitions = []
+    for scope in scopes:
+        for name, (node, _) in scope.selected_sources.items():
+            if isinstance(node.parent, exp.Subquery):
+                node = node.parent  # derived tables are keyed by their inner query
+            alias = node.args.get("alias")
+            if isinstance(alias, exp.TableAlias) and alias.name == name:
+                definitions.append((position.get(id(alias), 0), scope, name, alias))
+    renamed: Dict[Tuple[int, str], str] = {}
+    for number, (_, scope, name, alias) in enumerate(sorted(definitions, key=lambda d: d[0]), 1):
+        renamed[(id(scope), name)] = f"_t{number}"
+        alias.set("this", exp.to_identifier(f"_t{number}"))
+    scope_of = {id(scope.expression): scope for scope in scopes}
+    for column in tree.find_all(exp.Column):
+        if not column.table:
+            continue
+        node = column.parent
+        while node is not None and id(node) not in scope_of:
+            node = node.parent
+        scope = scope_of.get(id(node)) if node is not None else None
+        while scope is not None and column.table not in scope.selected_sources:
+            scope = scope.parent
+        if scope is not None and (id(scope), column.table) in renamed:
+            column.set("table", exp.to_identifier(renamed[(id(scope), column.table)]))
+
+    # Result column names do not change the rows a query returns. Aliases
+    # inside subqueries, derived tables and CTEs are kept: outer references,
+    # USING, NATURAL JOIN and * all see them.
+    referenced = {column.name for column in tree.find_all(exp.Column)}
+    for select in _output_selects(tree):
+        for alias in list(select.expressions):
+            if isinstance(alias, exp.Alias) and alias.alias not in referenced:
+                alias.replace(alias.this)
+
+    return tree.sql()
+
+
+def fingerprint(sql: str, dialect: Optional[str] = None) -> str:
+    return hashlib.sha256(canonicalize(sql, dialect).encode('utf-8')).hexdigest()
+
+
+def pair_key(schema: str, q1: str, q2: str, dialect: Optional[str] = None) -> Tuple[str, str, str]:
+    """``(schema hash, q1 fingerprint, q2 fingerprint)`` for one pair."""
+    return ddl_hash(schema), fingerprint(q1, dialect), fingerprint(q2, dialect)
+
+
+class FingerprintIndex:
+    """Persistent (schema hash, q1 fp, q2 fp) -> states/label store.
+
+    Pairs are stored as given and found in either order, since equivalence
+    is symmetric.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pairs ("
+            " schema_hash TEXT NOT NULL, q1_fp TEXT NOT NULL, q2_fp TEXT NOT NULL,"
+            " label TEXT, states TEXT, counterexample TEXT, source TEXT,"
+            " PRIMARY KEY (schema_hash, q1_fp, q2_fp))"
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def __enter__(self) -> "FingerprintIndex":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def get(self, schema_hash: str, q1_fp: str, q2_fp: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT label, states, counterexample, source FROM pairs"
+            " WHERE schema_hash = ? AND ((q1_fp = ? AND q2_fp = ?) OR (q1_fp = ? AND q2_fp = ?))"
+            " ORDER BY label IS NULL LIMIT 1",
+            (schema_hash, q1_fp, q2_fp, q2_fp, q1_fp),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(zip(("label", "states", "counterexample", "source"), row))
+
+    def settled(self, schema_hash: str, q1_fp: str, q2_fp: str) -> Optional[Dict[str, Any]]:
+        """The stored entry if it carries a Y/N label, else None."""
+        entry = self.get(schema_hash, q1_fp, q2_fp)
+        return entry if entry is not None and entry["label"] in SETTLED_LABELS else None
+
+    def put(self, schema_hash: str, q1_fp: str, q2_fp: str, label: Optional[str] = None,
+            states: Optional[str] = None, counterexample: Optional[str] = None,
+            source: Optional[str] = None) -> None:
+        """Insert or update a pair; an existing label is never replaced by None."""
+        self.put_many([(schema_hash, q1_fp, q2_fp, label, states, counterexample, source)])
+
+    def put_many(self, rows: Iterable[Tuple]) -> None:
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO pairs VALUES (?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (schema_hash, q1_fp, q2_fp) DO UPDATE SET"
+                " label = COALESCE(excluded.label, label),"
+                " states = COALESCE(excluded.states, states),"
+                " counterexample = COALESCE(excluded.counterexample, counterexample),"
+                " source = COALESCE(source, excluded.source)",
+                rows,
+            )
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM pairs").fetchone()[0]
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def frame_keys(df: pd.DataFrame, schemas: Optional[pd.Series] = None,
+               dialect: Optional[str] = None) -> pd.DataFrame:
+    """schema_hash / q1_fp / q2_fp for every row of ``df``.
+
+    ``schemas`` holds the schema text per row (default: the ``schema``
+    column). Hashes are computed once per distinct schema and query text.
+    """
+    schemas = (df['schema'] if schemas is None else schemas).fillna('').astype(str)
+    schema_hashes = {text: ddl_hash(text) for text in schemas.unique()}
+    queries = pd.unique(pd.concat([df['q1'], df['q2']]).fillna('').astype(str))
+    fps = {text: fingerprint(text, dialect) for text in queries}
+    return pd.DataFrame({
+        'schema_hash': schemas.map(schema_hashes),
+        'q1_fp': df['q1'].fillna('').astype(str).map(fps),
+        'q2_fp': df['q2'].fillna('').astype(str).map(fps),
+    }, index=df.index)
+
+
+def record_frame(index: FingerprintIndex, df: pd.DataFrame, keys: pd.DataFrame, label_column: Optional[str] = None,
+                 states_column: Optional[str] = None, counterexample_column: Optional[str] = None,
+                 source: Optional[str] = None) -> int:
+    """Store every row of ``df`` in ``index``; labels are read as Y/N (EQU/NEQ accepted)."""
+    labels = {"Y": "Y", "N": "N", "EQU": "Y", "NEQ": "N"}
+
+    def column(name):
+        if name is None or name not in df.columns:
+            return [None] * len(df)
+        return [None if pd.isna(v) else str(v) for v in df[name]]
+
+    rows = list(zip(keys['schema_hash'], keys['q1_fp'], keys['q2_fp'],
+                    [labels.get(v) for v in column(label_column)], column(states_column),
+                    column(counterexample_column), [source] * len(df)))
+    index.put_many(rows)
+    return len(rows)
+
+
+def lookup_frame(index: FingerprintIndex, keys: pd.DataFrame) -> pd.Series:
+    """Settled label per row (None for pairs still to do)."""
+    return pd.Series([
+        (entry or {}).get("label")
+        for entry in (index.settled(*key) for key in keys[['schema_hash', 'q1_fp', 'q2_fp']].itertuples(index=False))
+    ], index=keys.index, dtype=object)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Fingerprint index of settled query pairs")
+    parser.add_argument("command", choices=["record", "pending"])
+    parser.add_argument("csv_path")
+    parser.add_argument("--index", default="pair_fingerprints.sqlite")
+    parser.add_argument("--schemas", help="schema_info.json; schema text is looked up by dbid instead of the schema column")
+    parser.add_argument("--dialect", default=None, help="sqlglot dialect the queries are written in")
+    parser.add_argument("--label-column", default="ground_truth")
+    parser.add_argument("--states-column", default="states")
+    parser.add_argument("--counterexample-column", default="counterexample")
+    parser.add_argument("--output", help="pending: where to write the unsettled rows")
+    args = parser.parse_args(argv)
+
+    df = pd.read_csv(args.csv_path)
+    schemas = df['dbid'].astype(str).map(load_schema_ddl(args.schemas)) if args.schemas else None
+    keys = frame_keys(df, schemas, args.dialect)
+    unique_pairs = len(keys.drop_duplicates())
+    print(f"{len(df)} rows, {unique_pairs} distinct pairs after canonicalization")
+    with FingerprintIndex(args.index) as index:
+        if args.command == "record":
+            record_frame(index, df, keys, args.label_column, args.states_column, args.counterexample_column,
+                         source=Path(args.csv_path).name)
+            print(f"Index {args.index} now holds {len(index)} pairs")
+        else:
+            settled = lookup_frame(index, keys)
+            pending = df[settled.isna()]
+            print(f"{len(df) - len(pending)} rows already settled, {len(pending)} pending")
+            if args.output:
+                pending.to_csv(args.output, index=False)
+                print(f"Pending rows saved to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
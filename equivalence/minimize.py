@@ -0,0 +1,284 @@
+"""Shrink a counterexample database to a few rows that still separate q1 from q2.
+
+A counterexample is the INSERT-statement text found in the
+``counterexample`` / ``diff_counterexample`` columns. It is loaded once;
+delta debugging (ddmin) then probes candidate row subsets by deleting the
+other rows inside a SAVEPOINT, running both queries and rolling back, so
+the database is never rebuilt. Deleting a parent row also deletes the
+child rows that referenced it, which keeps every candidate consistent
+with the schema's foreign keys. The probes of one ddmin round can run in
+worker processes, each holding its own loaded copy.
+
+    python equivalence/minimize.py beers_diff.csv --column diff_counterexample --workers 4
+
+The minimized text has the same INSERT format, so it can be written back
+into the same column.
+"""
+import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from equivalence.differential import (SchemaSession, _is_ddl, is_ordered, load_schema_ddl, quote_identifier,
+                                      results_differ)
+
+# (table position in session.tables, rowid)
+RowId = Tuple[int, int]
+
+# Given the candidates of a ddmin round, the position and surviving rows of the first that still separates
+FirstHit = Callable[[List[List[RowId]]], Optional[Tuple[int, List[RowId]]]]
+
+_DELETE_BATCH = 500
+
+# Below this many rows, starting worker processes costs more than the probes
+_PARALLEL_MIN_ROWS = 64
+
+
+class Prober:
+    """A loaded counterexample on which row subsets can be tried and undone."""
+
+    def __init__(self, ddl: str, q1: str, q2: str, inserts: str):
+        self.session = SchemaSession(ddl)
+        self.session.load(inserts)
+        self.sql1, err1 = self.session.prepare(q1)
+        self.sql2, err2 = self.session.prepare(q2)
+        if err1 or err2:
+            raise ValueError(err1 or err2)
+        self.ordered = is_ordered(self.sql1) and is_ordered(self.sql2)
+        self.rows: List[RowId] = []
+        self.session.reset_steps()
+        for position, spec in enumerate(self.session.tables):
+            try:
+                rowids = self.session.conn.execute(f"SELECT rowid FROM {quote_identifier(spec.name)}").fetchall()
+            except Exception:
+                continue  # WITHOUT ROWID table: its rows are always kept
+            self.rows.extend((position, rowid) for (rowid,) in rowids)
+
+    def distinguishes(self) -> bool:
+        rows1, err1 = self.session.run(self.sql1)
+        rows2, err2 = self.session.run(self.sql2)
+        return not (err1 or err2) and results_differ(rows1, rows2, self.ordered)
+
+    def _delete(self, rows: Sequence[RowId]) -> None:
+        by_table: Dict[int, List[int]] = {}
+        for position, rowid in rows:
+            by_table.setdefault(position, []).append(rowid)
+        for position, rowids in by_table.items():
+            table = quote_identifier(self.session.tables[position].name)
+            for i in range(0, len(rowids), _DELETE_BATCH):
+                batch = rowids[i:i + _DELETE_BATCH]
+                self.session.conn.execute(
+                    f"DELETE FROM {table} WHERE rowid IN ({', '.join('?' for _ in batch)})", batch)
+
+    def _delete_orphans(self) -> None:
+        """Delete child rows whose foreign key no longer matches a parent, until none are left."""
+        conn = self.session.conn
+        while True:
+            before = conn.total_changes
+            for spec in self.session.tables:
+                for columns, parent, parent_columns in spec.foreign_keys:
+                    child = quote_identifier(spec.name)
+                    matches = " AND ".join(f"p.{quote_identifier(pc)} = {child}.{quote_identifier(c)}"
+                                           for c, pc in zip(columns, parent_columns))
+                    not_null = " AND ".join(f"{child}.{quote_identifier(c)} IS NOT NULL" for c in columns)
+                    conn.execute(f"DELETE FROM {child} WHERE {not_null} AND NOT EXISTS "
+                                 f"(SELECT 1 FROM {quote_identifier(parent)} p WHERE {matches})")
+            if conn.total_changes == before:
+                return
+
+    def _surviving(self, candidates: Sequence[RowId]) -> List[RowId]:
+        by_table: Dict[int, set] = {}
+        self.session.reset_steps()
+        for position, spec in enumerate(self.session.tables):
+            try:
+                by_table[position] = {r for (r,) in self.session.conn.execute(
+                    f"SELECT rowid FROM {quote_identifier(spec.name)}")}
+            except Exception:
+                by_table[position] = set()
+        return [row for row in candidates if row[1] in by_table.get(row[0], ())]
+
+    def probe(self, keep: Sequence[RowId]) -> Optional[List[RowId]]:
+        """Keep only ``keep`` (plus WITHOUT ROWID rows); return the surviving rows if q1 and q2 still differ.
+
+        All changes are rolled back before returning.
+        """
+        keep_set = set(keep)
+        conn = self.session.conn
+        self.session.reset_steps()
+        conn.execute("SAVEPOINT probe")
+        try:
+            self._delete([row for row in self.rows if row not in keep_set])
+            self._delete_orphans()
+            return self._surviving(keep) if self.distinguishes() else None
+        finally:
+            self.session.reset_steps()
+            conn.execute("ROLLBACK TO probe")
+            conn.execute("RELEASE probe")
+
+    def dump(self, keep: Sequence[RowId]) -> str:
+        conn = self.session.conn
+        keep_set = set(keep)
+        self.session.reset_steps()
+        conn.execute("SAVEPOINT dump")
+        try:
+            self._delete([row for row in self.rows if row not in keep_set])
+            return self.session.dump()
+        finally:
+            self.session.reset_steps()
+            conn.execute("ROLLBACK TO dump")
+            conn.execute("RELEASE dump")
+
+    def close(self) -> None:
+        self.session.close()
+
+
+# Per-process prober for parallel probes, set up by the pool initializer
+_worker_prober: Optional[Prober] = None
+
+
+def _init_worker(ddl: str, q1: str, q2: str, inserts: str) -> None:
+    global _worker_prober
+    _worker_prober = Prober(ddl, q1, q2, inserts)
+
+
+def _worker_probe(keep: List[RowId]) -> Optional[List[RowId]]:
+    return _worker_prober.probe(keep)
+
+
+def _first_hit_serial(prober: Prober, candidates: List[List[RowId]]) -> Optional[Tuple[int, List[RowId]]]:
+    for i, keep in enumerate(candidates):
+        survivors = prober.probe(keep)
+        if survivors is not None:
+            return i, survivors
+    return None
+
+
+def _first_hit_parallel(executor: ProcessPoolExecutor,
+                        candidates: List[List[RowId]]) -> Optional[Tuple[int, List[RowId]]]:
+    """Probe all candidates on the pool; probes not started yet are cancelled after the first hit."""
+    futures = [executor.submit(_worker_probe, keep) for keep in candidates]
+    try:
+        for i, future in enumerate(futures):
+            survivors = future.result()
+            if survivors is not None:
+                return i, survivors
+        return None
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def _split(rows: List[RowId], n: int) -> List[List[RowId]]:
+    size, extra = divmod(len(rows), n)
+    chunks, start = [], 0
+    for i in range(n):
+        end = start + size + (1 if i < extra else 0)
+        chunks.append(rows[start:end])
+        start = end
+    return chunks
+
+
+def ddmin(rows: List[RowId], first_hit: FirstHit) -> List[RowId]:
+    """Zeller's ddmin over ``rows``.
+
+    ``first_hit(candidates)`` returns the position of the first candidate
+    row list that still distinguishes the queries together with its
+    surviving rows, or None if none does. Each round tries the n chunks
+    first, then their complements.
+    """
+    n = 2
+    while len(rows) >= 2:
+        chunks = _split(rows, n)
+        candidates = chunks + ([[r for j, c in enumerate(chunks) if j != i for r in c] for i in range(n)]
+                               if n > 2 else [])
+        hit = first_hit(candidates)
+        if hit is not None:
+            i, rows = hit
+            n = 2 if i < n else max(n - 1, 2)
+        else:
+            if n >= len(rows):
+                break
+            n = min(2 * n, len(rows))
+    return rows
+
+
+def minimize_counterexample(ddl: str, q1: str, q2: str, inserts: str, workers: int = 1) -> str:
+    """Return a smaller INSERT text on which q1 and q2 still differ.
+
+    If the given database does not separate the queries it is returned as is.
+    """
+    prober = Prober(ddl, q1, q2, inserts)
+    try:
+        if not prober.distinguishes():
+            return inserts
+        rows = prober.rows
+        if rows and prober.probe([]) is not None:
+            rows = []  # even the empty database separates them
+        if workers > 1 and len(rows) >= _PARALLEL_MIN_ROWS:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(ddl, q1, q2, inserts)) as executor:
+                rows = ddmin(rows, partial(_first_hit_parallel, executor))
+        else:
+            rows = ddmin(rows, partial(_first_hit_serial, prober))
+        return prober.dump(rows)
+    finally:
+        prober.close()
+
+
+def minimize_frame(df: pd.DataFrame, column: str = 'counterexample',
+                   ddl_by_dbid: Optional[Dict[str, str]] = None, workers: int = 1) -> int:
+    """Minimize every INSERT-text counterexample in ``df[column]`` in place; returns how many changed.
+
+    DDL is taken from the row's ``schema`` column when it holds CREATE TABLE
+    statements, otherwise from ``ddl_by_dbid[str(dbid)]``. Cells that are
+    not INSERT text (solver output, empty) are left alone.
+    """
+    ddl_by_dbid = ddl_by_dbid or {}
+    changed = 0
+    for label in df.index:
+        inserts = df.at[label, column]
+        if not isinstance(inserts, str) or not inserts.lstrip().upper().startswith("INSERT"):
+            continue
+        ddl = df.at[label, 'schema'] if 'schema' in df.columns and _is_ddl(df.at[label, 'schema']) else None
+        if ddl is None and 'dbid' in df.columns:
+            ddl = ddl_by_dbid.get(str(df.at[label, 'dbid']))
+        if ddl is None:
+            continue
+        try:
+            minimized = minimize_counterexample(ddl, df.at[label, 'q1'], df.at[label, 'q2'], inserts, workers)
+        except Exception as e:
+            print(f"Could not minimize row {label}: {e}")
+            continue
+        if minimized != inserts:
+            df.at[label, column] = minimized
+            changed += 1
+    return changed
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Minimize counterexample databases in a CSV")
+    parser.add_argument("csv_path")
+    parser.add_argument("--column", default="counterexample")
+    parser.add_argument("--schemas", help="schema_info.json with original_schema per dbid")
+    parser.add_argument("--output", help="default: overwrite csv_path")
+    parser.add_argument("--workers", type=int, default=1, help="processes probing candidates of one counterexample")
+    args = parser.parse_args(argv)
+
+    df = pd.read_csv(args.csv_path)
+    before = df[args.column].fillna('').str.count('\n').sum() + df[args.column].notna().sum()
+    changed = minimize_frame(df, args.column, load_schema_ddl(args.schemas) if args.schemas else None,
+                             workers=args.workers)
+    after = df[args.column].fillna('').str.count('\n').sum() + df[args.column].notna().sum()
+    output = args.output or args.csv_path
+    df.to_csv(output, index=False)
+    print(f"Minimized {changed} counterexamples ({before} -> {after} rows), saved to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""One command line for schema mapping, query mapping and CSV mapping.
+
+    python mapping/cli.py serve &                       # start the daemon
+    python mapping/cli.py map-schema schema.sql
+    python mapping/cli.py map-query --dataset bird --schemas schemas.json --dbid db "SELECT ..."
+    python mapping/cli.py map-csv --dataset leetcode leetcode_full.csv schemas.json --incremental
+    python mapping/cli.py stop
+
+map-schema and map-query send their batch to the daemon when one is
+listening (``--socket``, default ``$CE_BENCH_SOCKET`` or a per-user path in
+the temp dir) and otherwise do the work in-process. Heavy modules are only
+imported by the command that runs, so talking to the daemon needs nothing
+beyond the standard library.
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from mapping.service import DATASETS, Client, MappingService, default_socket_path, load_mapper_module, serve
+
+
+def _read_inputs(values: List[str], lines: bool) -> List[str]:
+    """Arguments as given, or stdin when there are none (one item per line, or all of it)."""
+    if values:
+        return values
+    text = sys.stdin.read()
+    return [line for line in text.splitlines() if line.strip()] if lines else [text]
+
+
+def _dispatch(args, payload: Dict[str, Any]) -> Dict[str, Any]:
+    if not args.no_daemon:
+        client = Client(args.socket)
+        try:
+            return client.request(payload)
+        except OSError:
+            pass  # no daemon running; do the work here
+        finally:
+            client.close()
+    return MappingService().handle(payload)
+
+
+def _map_schema(args) -> int:
+    schemas = []
+    for path in args.files or ['-']:
+        schemas.append(sys.stdin.read() if path == '-' else Path(path).read_text())
+    response = _dispatch(args, {"op": "map_schema", "schemas": schemas})
+    if not response["ok"]:
+        print(response["error"], file=sys.stderr)
+        return 1
+    for result in response["results"]:
+        print(json.dumps(result))
+    return 0
+
+
+def _map_query(args) -> int:
+    queries = _read_inputs(args.queries, lines=True)
+    # The daemon has its own working directory
+    schemas = os.path.abspath(args.schemas)
+    response = _dispatch(args, {"op": "map_query", "dataset": args.dataset, "schemas": schemas,
+                                "dbid": args.dbid, "queries": queries, "pretty": args.pretty})
+    if not response["ok"]:
+        print(response["error"], file=sys.stderr)
+        return 1
+    errors = dict(response["errors"])
+    for i, mapped in enumerate(response["results"]):
+        print(json.dumps({"mapped": mapped, "error": errors.get(i)}))
+    return 1 if errors else 0
+
+
+def _map_csv(args) -> int:
+    module = load_mapper_module(args.dataset)
+    if args.stream:
+        module.stream_bird_csv(args.csv_path, args.schemas, args.output or args.csv_path,
+                               workers=args.workers, metrics_path=args.metrics)
+    else:
+        module.process_bird_csv(args.csv_path, args.schemas, args.output or args.csv_path,
+                                workers=args.workers, metrics_path=args.metrics, incremental=args.incremental)
+    return 0
+
+
+def _control(args) -> int:
+    client = Client(args.socket)
+    try:
+        response = client.request({"op": args.command if args.command != "stop" else "shutdown"})
+    except OSError:
+        print(f"No mapping daemon on {client.socket_path}", file=sys.stderr)
+        return 1
+    finally:
+        client.close()
+    print(json.dumps(response, indent=2) if args.command == "stats" else f"ok (pid {response.get('pid')})")
+    return 0
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Schema and query mapping")
+    parser.add_argument("--socket", default=default_socket_path(), help="daemon socket path")
+    parser.add_argument("--no-daemon", action="store_true", help="always work in-process")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("serve", help="run the mapping daemon in the foreground")
+    for name in ("stop", "ping", "stats"):
+        commands.add_parser(name, help=f"{name} the running daemon")
+
+    schema = commands.add_parser("map-schema", help="map DDL files ('-' or nothing for stdin) to dummy names")
+    schema.add_argument("files", nargs="*")
+
+    query = commands.add_parser("map-query", help="map queries (arguments, or one per stdin line)")
+    query.add_argument("--dataset", choices=DATASETS, required=True)
+    query.add_argument("--schemas", required=True, help="schemas.json with per-dbid mappings")
+    query.add_argument("--dbid", required=True)
+    query.add_argument("--pretty", action="store_true")
+    query.add_argument("queries", nargs="*")
+
+    csv = commands.add_parser("map-csv", help="add q1_mapped/q2_mapped to a dataset CSV")
+    csv.add_argument("--dataset", choices=DATASETS, required=True)
+    csv.add_argument("csv_path")
+    csv.add_argument("schemas")
+    csv.add_argument("--output", help="default: overwrite csv_path")
+    csv.add_argument("--workers", type=int, default=1)
+    csv.add_argument("--metrics", help="write pipeline metrics JSON here")
+    csv.add_argument("--incremental", action="store_true", help="only remap rows that changed")
+    csv.add_argument("--stream", action="store_true", help="map in checkpointed chunks")
+
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        serve(args.socket)
+        return 0
+    if args.command in ("stop", "ping", "stats"):
+        return _control(args)
+    return {"map-schema": _map_schema, "map-query": _map_query, "map-csv": _map_csv}[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+import cProfile
+import heapq
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Stages recorded by the mapping pipeline
+STAGES = ("parse", "rewrite", "emit", "io")
+
+
+class PipelineMetrics:
+    """Counters and timings for one mapping run.
+
+    Records per-stage time (parse, rewrite, emit, io), failures by exception
+    type and by dbid, row throughput and the slowest queries. Worker
+    processes fill their own instance and send ``to_dict()`` back to be
+    ``merge``d. ``write_json`` exports everything as a metrics file.
+    """
+
+    def __init__(self, slowest: int = 20, progress_every: int = 1000):
+        self.stage_seconds: Dict[str, float] = defaultdict(float)
+        self.stage_calls: Dict[str, int] = defaultdict(int)
+        self.failures_by_type: Counter = Counter()
+        self.failures_by_dbid: Counter = Counter()
+        self.failure_examples: Dict[str, str] = {}
+        self.queries = 0
+        self.rows = 0
+        self.slowest_limit = slowest
+        self._slowest: List[Tuple[float, str, str]] = []
+        self.progress_every = progress_every
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds[name] += time.perf_counter() - start
+            self.stage_calls[name] += 1
+
+    def record_query(self, dbid, sql_query: str, seconds: float) -> None:
+        self.queries += 1
+        item = (seconds, str(dbid), sql_query)
+        if len(self._slowest) < self.slowest_limit:
+            heapq.heappush(self._slowest, item)
+        elif seconds > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, item)
+
+    def record_failure(self, dbid, error: Optional[BaseException]) -> None:
+        error_type = type(error).__name__ if error is not None else "Unknown"
+        self.failures_by_type[error_type] += 1
+        self.failures_by_dbid[str(dbid)] += 1
+        if error is not None and error_type not in self.failure_examples:
+            self.failure_examples[error_type] = str(error)[:500]
+
+    def add_rows(self, n: int) -> None:
+        """Count finished rows and print progress every ``progress_every`` rows."""
+        before = self.rows
+        self.rows += n
+        if self.progress_every and self.rows // self.progress_every > before // self.progress_every:
+            print(f"Processed {self.rows} rows ({self.rows_per_sec():.0f} rows/s)...")
+
+    def finish(self) -> None:
+        self.finished = time.perf_counter()
+
+    def elapsed(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    def rows_per_sec(self) -> float:
+        elapsed = self.elapsed()
+        return self.rows / elapsed if elapsed else 0.0
+
+    def slowest_queries(self) -> List[Dict[str, Any]]:
+        return [
+            {"seconds": seconds, "dbid": dbid, "query": query}
+            for seconds, dbid, query in sorted(self._slowest, reverse=True)
+        ]
+
+    def merge(self, other: Dict[str, Any]) -> None:
+        """Fold in the ``to_dict()`` of another run (e.g. a worker's shard)."""
+        for name, stats in other["stages"].items():
+            self.stage_seconds[name] += stats["seconds"]
+            self.stage_calls[name] += stats["calls"]
+        self.failures_by_type.update(other["failures"]["by_type"])
+        self.failures_by_dbid.update(other["failures"]["by_dbid"])
+        for error_type, message in other["failures"]["examples"].items():
+            self.failure_examples.setdefault(error_type, message)
+        self.queries += other["queries"]
+        for item in other["slowest_queries"]:
+            self.record_query(item["dbid"], item["query"], item["seconds"])
+            self.queries -= 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rows": self.rows,
+            "queries": self.queries,
+            "elapsed_seconds": self.elapsed(),
+            "rows_per_sec": self.rows_per_sec(),
+            "stages": {
+                name: {"seconds": self.stage_seconds[name], "calls": self.stage_calls[name]}
+                for name in sorted(self.stage_seconds)
+            },
+            "failures": {
+                "total": sum(self.failures_by_type.values()),
+                "by_type": dict(self.failures_by_type.most_common()),
+                "by_dbid": dict(self.failures_by_dbid.most_common()),
+                "examples": self.failure_examples,
+            },
+            "slowest_queries": self.slowest_queries(),
+        }
+
+    def write_json(self, path: str) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def summary(self) -> str:
+        lines = [f"{self.rows} rows, {self.queries} queries in {self.elapsed():.1f}s "
+                 f"({self.rows_per_sec():.0f} rows/s)"]
+        for name in sorted(self.stage_seconds):
+            lines.append(f"  {name}: {self.stage_seconds[name]:.2f}s over {self.stage_calls[name]} calls")
+        if self.failures_by_type:
+            by_type = ", ".join(f"{k}={v}" for k, v in self.failures_by_type.most_common())
+            lines.append(f"  failures: {by_type}")
+        return "\n".join(lines)
+
+
+def timed(metrics: Optional[PipelineMetrics], name: str):
+    """``metrics.stage(name)``, or a no-op when no metrics are being kept."""
+    return metrics.stage(name) if metrics is not None else nullcontext()
+
+
+class _Sampler(threading.Thread):
+    """Sample the stack of one thread at a fixed interval."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+@contextmanager
+def profiled(kind: Optional[str], output_path: str, interval: float = 0.005) -> Iterator[None]:
+    """Opt-in profiling of the enclosed block.
+
+    ``kind="cprofile"`` writes pstats data to ``output_path``; ``kind="sample"``
+    samples the current thread every ``interval`` seconds and writes collapsed
+    stacks (``frame;frame;... count``, the flamegraph input format). ``None``
+    profiles nothing.
+    """
+    if kind is None:
+        yield
+        return
+    if kind == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(output_path)
+            print(f"cProfile stats saved to {output_path}")
+    elif kind == "sample":
+        sampler = _Sampler(threading.get_ident(), interval)
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            with open(output_path, 'w') as f:
+                for stack, count in sampler.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            print(f"Stack samples saved to {output_path}")
+    else:
+        raise ValueError(f"Unknown profiler '{kind}', expected 'cprofile' or 'sample'")
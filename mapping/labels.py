@@ -0,0 +1,24 @@
+from typing import Optional, Sequence
+
+# Solver states that prove the pair is not equivalent
+NON_EQUIVALENT_STATES = ["NEQ", "SYN", "NSE", "NIE"]
+
+# Reference label values (verieql_label, ground_truth) as Y/N
+REFERENCE_VALUES = {"EQU": "Y", "NEQ": "N", "Y": "Y", "N": "N"}
+
+_NON_EQUIVALENT = frozenset(NON_EQUIVALENT_STATES)
+
+
+def label_from_states(states: Optional[Sequence[str]]) -> Optional[str]:
+    """Y/N/None label of one pair from its solver states.
+
+    Rules, in order: last state TMO -> Y; any NEQ/SYN/NSE/NIE -> N;
+    all EQU -> Y; anything else (including no states) -> None.
+    """
+    if not states:
+        return None
+    if states[-1] == "TMO":
+        return "Y"
+    if any(s in _NON_EQUIVALENT for s in states):
+        return "N"
+    return "Y" if all(s == "EQU" for s in states) else None
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+MANIFEST_VERSION = 1
+
+# Columns tried, in order, as the stable row key; row position otherwise
+KEY_COLUMNS = ("index", "id", "question_id")
+
+
+def _digest(text: str) -> str:
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=10).hexdigest()
+
+
+def row_keys(df: pd.DataFrame, key_column: Optional[str] = None) -> List[str]:
+    """Stable key per row: ``key_column`` (or the first unique KEY_COLUMNS column), else position."""
+    candidates = [key_column] if key_column else [c for c in KEY_COLUMNS if c in df.columns]
+    for column in candidates:
+        if column in df.columns and df[column].notna().all() and df[column].is_unique:
+            return [f"{column}={value}" for value in df[column].astype(str)]
+    return [f"#{pos}" for pos in range(len(df))]
+
+
+def query_hashes(df: pd.DataFrame) -> List[str]:
+    """Hash of each row's dbid, q1 and q2 (missing values included)."""
+    return [
+        _digest(f"{dbid}\x00{q1}\x00{q2}")
+        for dbid, q1, q2 in zip(df['dbid'].astype(str), df['q1'].fillna('\x01'), df['q2'].fillna('\x01'))
+    ]
+
+
+def mapping_version(schema_entry: Optional[Dict[str, Any]]) -> str:
+    """Hash of one database's table/column mapping; unchanged DDL keeps the same version."""
+    mapping = (schema_entry or {}).get("mapping")
+    return _digest(json.dumps(mapping, sort_keys=True))
+
+
+class RemapManifest:
+    """What every output row was mapped from: row key -> (query hash, mapping version).
+
+    Stored as JSON next to the mapped CSV. ``stale`` tells which rows must be
+    remapped: rows new to the manifest, rows whose dbid/q1/q2 changed and rows
+    whose database mapping changed since the last run.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows: Dict[str, List[str]] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+                if data.get("version") == MANIFEST_VERSION:
+                    self.rows = data["rows"]
+            except (OSError, ValueError, KeyError):
+                self.rows = {}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def stale(self, keys: List[str], hashes: List[str], versions: List[str]) -> np.ndarray:
+        empty = [None, None]
+        return np.fromiter(
+            (self.rows.get(key, empty) != [h, v] for key, h, v in zip(keys, hashes, versions)),
+            dtype=bool, count=len(keys),
+        )
+
+    def replace(self, keys: List[str], hashes: List[str], versions: List[str]) -> None:
+        """Record the current rows; rows no longer present are dropped."""
+        self.rows = {key: [h, v] for key, h, v in zip(keys, hashes, versions)}
+
+    def save(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"version": MANIFEST_VERSION, "rows": self.rows}, f)
+        os.replace(tmp_path, self.path)
@@ -1,18 +1,101 @@
-import sqlglot
+import hashlib
+import json
+import os
 import re
-from typing import Dict, Tuple
+import sqlglot
+from typing import Dict, List, Optional, Tuple
+
+
+_WORD_NAME = re.compile(r'\w+')
+
 
+def normalize_ddl(schema_sql: str) -> str:
+    """Normalize DDL for cache keys: unify line endings, drop trailing blanks."""
+    lines = schema_sql.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip()
 
-def extract_and_map_schema(schema_sql: str) -> Tuple[str, Dict[str, str]]:
+
+def ddl_hash(schema_sql: str) -> str:
+    return hashlib.sha256(normalize_ddl(schema_sql).encode('utf-8')).hexdigest()
+
+
+def rename_identifiers(text: str, ordered_mapping: List[Tuple[str, str]]) -> str:
+    """Replace whole-word identifiers in one scan of ``text``.
+
+    Equivalent to applying ``re.sub(r'\b' + re.escape(original) + r'\b', dummy)``
+    for each pair in order, including a dummy name that matches a later
+    original. Mappings with non-word names fall back to that sequential loop.
     """
-    Extract table and column names from SQLite schema, create dummy versions with direct mapping.
-    
-    Args:
-        schema_sql: SQLite schema as string
-        
-    Returns:
-        Tuple of (dummy_schema, mapping_dict) where mapping_dict maps original names to dummy names
+    if not ordered_mapping:
+        return text
+    if not all(_WORD_NAME.fullmatch(original) and _WORD_NAME.fullmatch(dummy)
+               for original, dummy in ordered_mapping):
+        for original, dummy in ordered_mapping:
+            text = re.sub(r'\b' + re.escape(original) + r'\b', dummy, text)
+        return text
+    
+    # holders[current text] lists the identifiers that currently read as it
+    holders: Dict[str, List[str]] = {}
+    resolved: Dict[str, str] = {}
+    for original, _ in ordered_mapping:
+        holders.setdefault(original, [original])
+    for original, dummy in ordered_mapping:
+        names = holders.pop(original, [])
+        for name in names:
+            resolved[name] = dummy
+        holders.setdefault(dummy, []).extend(names)
+    
+    return _WORD_NAME.sub(lambda m: resolved.get(m.group(0), m.group(0)), text)
+
+
+class SchemaCache:
+    """Compiled schemas keyed by content hashes of their DDL.
+
+    Entries are kept in memory and, when ``cache_dir`` is given, also as one
+    JSON file per key so later runs skip DDL they have already compiled.
     """
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir
+        self._entries: Dict[str, Dict] = {}
+        self.hits = 0
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None and self.cache_dir and os.path.exists(self._path(key)):
+            try:
+                with open(self._path(key), 'r') as f:
+                    entry = json.load(f)
+                self._entries[key] = entry
+            except (OSError, ValueError):
+                entry = None
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, key: str, entry: Dict) -> None:
+        self._entries[key] = entry
+        if self.cache_dir:
+            tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(key))
+
+
+# Process-wide cache used when extract_and_map_schema is not given one
+_schema_cache = SchemaCache()
+
+
+def _compile_schema(schema_sql: str) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Parse the schema and assign dummy table (t1..) and column (c1..) names."""
     # Parse the SQL schema
     parsed = sqlglot.parse(schema_sql, dialect=sqlglot.dialects.SQLite)
     
@@ -59,25 +142,48 @@ def extract_and_map_schema(schema_sql: str) -> Tuple[str, Dict[str, str]]:
                             column_mapping[column_name] = dummy_column
                             column_counter += 1
     
-    # Create direct mapping dictionary (original -> dummy)
-    mapping_dict = {**table_mapping, **column_mapping}
+    return table_mapping, column_mapping
+
+
+def extract_and_map_schema(schema_sql: str, cache: Optional[SchemaCache] = None) -> Tuple[str, Dict[str, str]]:
+    """
+    Extract table and column names from SQLite schema, create dummy versions with direct mapping.
     
-    # Generate dummy schema by replacing names using word boundaries
-    dummy_schema = schema_sql
+    The table/column mapping is cached under the hash of the normalized DDL,
+    so DDL shared by several databases is parsed once; the dummy schema is
+    cached under the hash of the exact text, since it keeps that text's
+    whitespace.
     
-    # Replace table names first (longer names first to avoid partial replacements)
-    for original, dummy in sorted(table_mapping.items(), key=lambda x: len(x[0]), reverse=True):
-        # Use word boundaries to ensure we replace whole identifiers only
-        pattern = r'\b' + re.escape(original) + r'\b'
-        dummy_schema = re.sub(pattern, dummy, dummy_schema)
+    Args:
+        schema_sql: SQLite schema as string
+        cache: SchemaCache to use; defaults to a process-wide in-memory cache
+        
+    Returns:
+        Tuple of (dummy_schema, mapping_dict) where mapping_dict maps original names to dummy names
+    """
+    if cache is None:
+        cache = _schema_cache
+    key = ddl_hash(schema_sql)
+    text_key = f"{key}-{hashlib.sha256(schema_sql.encode('utf-8')).hexdigest()}"
+    
+    entry = cache.get(text_key)
+    if entry is None:
+        compiled = cache.get(key)
+        if compiled is None:
+            table_mapping, column_mapping = _compile_schema(schema_sql)
+            compiled = {"tables": table_mapping, "columns": column_mapping}
+            cache.put(key, compiled)
+        # Replace table names first (longer names first to avoid partial
+        # replacements), then column names, in a single scan
+        ordered = sorted(compiled["tables"].items(), key=lambda x: len(x[0]), reverse=True)
+        ordered += sorted(compiled["columns"].items(), key=lambda x: len(x[0]), reverse=True)
+        entry = {**compiled, "dummy_schema": rename_identifiers(schema_sql, ordered)}
+        cache.put(text_key, entry)
     
-    # Replace column names
-    for original, dummy in sorted(column_mapping.items(), key=lambda x: len(x[0]), reverse=True):
-        # Use word boundaries to ensure we replace whole identifiers only
-        pattern = r'\b' + re.escape(original) + r'\b'
-        dummy_schema = re.sub(pattern, dummy, dummy_schema)
+    # Create direct mapping dictionary (original -> dummy)
+    mapping_dict = {**entry["tables"], **entry["columns"]}
     
-    return dummy_schema, mapping_dict
+    return entry["dummy_schema"], mapping_dict
 
 
 def demo_schema_mapping():
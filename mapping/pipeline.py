@@ -0,0 +1,502 @@
+"""Dataset-independent part of the query mapping pipeline.
+
+``datasets/<dataset>/sql_mapper.py`` defines how one query is rewritten (its
+``SQLMapper``) and a ``MapperRegistry`` subclass naming it. Everything else
+lives here: the per-dbid mapper and query caches, batching by dbid, the
+process-pool sharding, incremental remapping and checkpointed streaming.
+"""
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from mapping.instrumentation import PipelineMetrics, profiled
+from mapping.manifest import RemapManifest, mapping_version, query_hashes, row_keys
+from mapping.schema_index import open_schema_index
+from mapping.streaming import ChunkedCSVWriter
+
+
+def load_mapping_from_schemas_json(file_path: str, database_name: str) -> Tuple[Dict[str, str], Dict[str, str]]:
+    index = open_schema_index(file_path)
+    try:
+        # Indexed once per file; each call decodes only this database's entry
+        return index.mapping(database_name)
+    except KeyError:
+        # Unknown database (or an entry without a mapping): nothing to rename
+        return {}, {}
+
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Bounded least-recently-used cache with hit/miss/eviction counters."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class MapperRegistry:
+    """Per-database mapper registry with memoized query results.
+
+    Mappers are built once per dbid and kept in an LRU; mapped queries are
+    memoized under (dbid, query, pretty), failures (None) included. dbids
+    are compared as strings. With ``metrics`` set, query latencies and
+    failures are recorded there. Each dataset subclasses this and sets
+    ``mapper_class`` to its SQLMapper.
+    """
+
+    mapper_class: Optional[type] = None
+
+    def __init__(self, schemas_data: Dict[str, Any], max_mappers: int = 256, max_queries: int = 200_000,
+                 metrics: Optional[PipelineMetrics] = None):
+        self.schemas_data = schemas_data
+        self.mappers = LRUCache(max_mappers)
+        self.queries = LRUCache(max_queries)
+        self.metrics = metrics
+
+    @classmethod
+    def from_schemas(cls, schemas_path: str) -> "MapperRegistry":
+        # Entries are read from the schema index as dbids are first seen
+        return cls(open_schema_index(schemas_path))
+
+    def get_mapper(self, dbid):
+        key = str(dbid)
+        mapper = self.mappers.get(key)
+        if mapper is None:
+            if key in self.schemas_data:
+                mapping = self.schemas_data[key]["mapping"]
+                mapper = self.mapper_class(mapping["tables"], mapping["columns"])
+            else:
+                # If no mapping found, create empty mapper
+                mapper = self.mapper_class({}, {})
+            self.mappers.put(key, mapper)
+        mapper.metrics = self.metrics
+        return mapper
+
+    def map_query(self, dbid, sql_query: str, pretty: bool = True) -> Optional[str]:
+        key = (str(dbid), sql_query, pretty)
+        cached = self.queries.get(key, _MISSING)
+        if cached is _MISSING:
+            mapper = self.get_mapper(dbid)
+            start = time.perf_counter()
+            mapped = mapper.map_sql_query(sql_query, pretty=pretty)
+            if self.metrics is not None:
+                self.metrics.record_query(dbid, sql_query, time.perf_counter() - start)
+            cached = (mapped, mapper.last_error)
+            self.queries.put(key, cached)
+        mapped, error = cached
+        if mapped is None and self.metrics is not None:
+            self.metrics.record_failure(dbid, error)
+        return mapped
+
+    def map_many(self, dbid, queries: List[str], pretty: bool = True,
+                 failures: Optional[List[Tuple[int, Exception]]] = None) -> Iterator[Optional[str]]:
+        """Batch ``map_query`` for queries of one dbid, yielding results in order.
+
+        Memoized queries are answered from the cache; the rest go through the
+        mapper's ``map_many`` in one batch. Failures are appended to
+        ``failures`` as ``(index, error)``.
+        """
+        key_dbid = str(dbid)
+        results = [self.queries.get((key_dbid, q, pretty), _MISSING) for q in queries]
+        misses = list(dict.fromkeys(q for q, r in zip(queries, results) if r is _MISSING))
+        if misses:
+            mapper = self.get_mapper(dbid)
+            errors: List[Tuple[int, Exception]] = []
+            mapped_misses = []
+            start = time.perf_counter()
+            for sql_query, mapped in zip(misses, mapper.map_many(misses, pretty=pretty, failures=errors)):
+                if self.metrics is not None:
+                    now = time.perf_counter()
+                    self.metrics.record_query(dbid, sql_query, now - start)
+                    start = now
+                mapped_misses.append(mapped)
+            error_at = dict(errors)
+            fresh = {}
+            for i, (sql_query, mapped) in enumerate(zip(misses, mapped_misses)):
+                fresh[sql_query] = (mapped, error_at.get(i))
+                self.queries.put((key_dbid, sql_query, pretty), fresh[sql_query])
+            results = [fresh[q] if r is _MISSING else r for q, r in zip(queries, results)]
+        for i, (mapped, error) in enumerate(results):
+            if mapped is None:
+                if self.metrics is not None:
+                    self.metrics.record_failure(dbid, error)
+                if failures is not None:
+                    failures.append((i, error))
+            yield mapped
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {"mappers": self.mappers.stats(), "queries": self.queries.stats()}
+
+
+def _map_group(registry: MapperRegistry, dbid, positions: Iterable[int], queries: List[Optional[str]],
+               mapped: List[Optional[str]], column: str, failures: List[Tuple[int, str]],
+               pretty: bool = False) -> None:
+    """Map ``queries`` at ``positions`` (all of one dbid) into ``mapped`` in one batch.
+
+    Empty or missing queries are skipped; failed positions are appended to
+    ``failures`` as ``(position, column)``.
+    """
+    present = [pos for pos in positions if queries[pos]]
+    errors: List[Tuple[int, Exception]] = []
+    batch = registry.map_many(dbid, [queries[pos] for pos in present], pretty=pretty, failures=errors)
+    for pos, result in zip(present, batch):
+        mapped[pos] = result
+    failures.extend((present[i], column) for i, _ in errors)
+
+
+# Per-process registries (one per dataset) used by pool workers; they only
+# ever hold the mappings of the shards that worker was handed.
+_worker_registries: Dict[type, MapperRegistry] = {}
+
+
+def _map_shard(registry_class: type, dbid, schema_entry: Optional[Dict[str, Any]],
+               rows: List[Tuple[int, Optional[str], Optional[str]]], pretty: bool = False):
+    """Map one shard of rows that share a dbid inside a pool worker.
+
+    Returns ``(results, failures, metrics)`` where results holds
+    ``(position, q1_mapped, q2_mapped)``, failures ``(position, column)`` and
+    metrics is the shard's ``PipelineMetrics.to_dict()``.
+    """
+    registry = _worker_registries.get(registry_class)
+    if registry is None:
+        registry = _worker_registries[registry_class] = registry_class({})
+    registry.metrics = PipelineMetrics(progress_every=0)
+    if schema_entry is not None:
+        registry.schemas_data[str(dbid)] = schema_entry
+    
+    positions = [pos for pos, _, _ in rows]
+    columns = {}
+    failures = []
+    for column, queries in (('q1', [q1 for _, q1, _ in rows]), ('q2', [q2 for _, _, q2 in rows])):
+        mapped = [None] * len(rows)
+        shard_failures = []
+        _map_group(registry, dbid, range(len(rows)), queries, mapped, column, shard_failures, pretty)
+        # Shard-local indices back to frame positions
+        failures.extend((positions[i], c) for i, c in shard_failures)
+        columns[column] = mapped
+    results = list(zip(positions, columns['q1'], columns['q2']))
+    failures.sort()
+    return results, failures, registry.metrics.to_dict()
+
+
+def _map_rows_parallel(df: pd.DataFrame, registry: MapperRegistry, executor: ProcessPoolExecutor,
+                       shard_size: int = 2000):
+    """Map q1/q2 of ``df`` on a process pool, sharding rows by dbid.
+
+    Each shard only carries the schema entry of its own dbid. Returns the
+    q1_mapped/q2_mapped columns in row order plus the failed (position, column)
+    pairs, sorted by position. Worker metrics are merged into the registry's.
+    """
+    metrics = registry.metrics
+    q1_values = [q if pd.notna(q) else None for q in df['q1']]
+    q2_values = [q if pd.notna(q) else None for q in df['q2']]
+    q1_mapped = df['q1_mapped'].tolist()
+    q2_mapped = df['q2_mapped'].tolist()
+    
+    shards = []
+    for dbid, positions in df.groupby('dbid', sort=False, dropna=False).indices.items():
+        schema_entry = registry.schemas_data.get(str(dbid))
+        rows = [(int(pos), q1_values[pos], q2_values[pos]) for pos in positions]
+        for start in range(0, len(rows), shard_size):
+            shards.append((dbid, schema_entry, rows[start:start + shard_size]))
+    # Largest shards first so stragglers do not hold up the pool
+    shards.sort(key=lambda shard: len(shard[2]), reverse=True)
+    
+    failures = []
+    done = 0
+    futures = [executor.submit(_map_shard, type(registry), dbid, entry, rows) for dbid, entry, rows in shards]
+    for future in as_completed(futures):
+        results, shard_failures, shard_metrics = future.result()
+        for pos, q1_out, q2_out in results:
+            if q1_values[pos]:
+                q1_mapped[pos] = q1_out
+            if q2_values[pos]:
+                q2_mapped[pos] = q2_out
+        failures.extend(shard_failures)
+        if metrics is not None:
+            metrics.merge(shard_metrics)
+            metrics.add_rows(len(results))
+        else:
+            done += len(results)
+            print(f"Processed {done}/{len(df)} rows...")
+    
+    failures.sort()
+    return q1_mapped, q2_mapped, failures
+
+
+def _map_frame(df: pd.DataFrame, registry: MapperRegistry,
+               executor: Optional[ProcessPoolExecutor] = None) -> List[Tuple[int, str]]:
+    """Fill q1_mapped/q2_mapped of ``df`` in place.
+
+    Runs serially through ``registry`` or, given an ``executor``, sharded over
+    the pool. Returns the (position, column) pairs that failed to map.
+    """
+    # Add new columns for mapped queries if they don't exist
+    if 'q1_mapped' not in df.columns:
+        df['q1_mapped'] = None
+    if 'q2_mapped' not in df.columns:
+        df['q2_mapped'] = None
+    
+    if executor is not None:
+        q1_mapped, q2_mapped, failures = _map_rows_parallel(df, registry, executor)
+        df['q1_mapped'] = q1_mapped
+        df['q2_mapped'] = q2_mapped
+        return failures
+    
+    # Whole columns are filled per dbid group and assigned once at the end
+    queries = {c: [q if pd.notna(q) else None for q in df[c]] for c in ('q1', 'q2')}
+    mapped = {c: df[f'{c}_mapped'].tolist() for c in ('q1', 'q2')}
+    failures = []
+    done = 0
+    for dbid, positions in df.groupby('dbid', sort=False, dropna=False).indices.items():
+        for column in ('q1', 'q2'):
+            _map_group(registry, dbid, positions, queries[column], mapped[column], column, failures)
+        if registry.metrics is not None:
+            registry.metrics.add_rows(len(positions))
+        else:
+            done += len(positions)
+            print(f"Processed {done}/{len(df)} rows...")
+    df['q1_mapped'] = mapped['q1']
+    df['q2_mapped'] = mapped['q2']
+    
+    failures.sort()
+    return failures
+
+
+def _previous_mapped(df: pd.DataFrame, csv_path: str, output_path: str) -> Optional[pd.DataFrame]:
+    """The frame holding the last run's q1_mapped/q2_mapped: ``df`` itself when
+    mapping in place, else the existing output file."""
+    if os.path.abspath(csv_path) == os.path.abspath(output_path):
+        return df if 'q1_mapped' in df.columns else None
+    if os.path.exists(output_path):
+        return pd.read_csv(output_path)
+    return None
+
+
+def _remap_changed(df: pd.DataFrame, registry: MapperRegistry, executor: Optional[ProcessPoolExecutor] = None,
+                   manifest: Optional[RemapManifest] = None,
+                   previous: Optional[pd.DataFrame] = None) -> List[Tuple[int, str]]:
+    """Incremental ``_map_frame``: only remap rows that changed since the last run.
+
+    A row is remapped when the manifest has no entry for its key, when its
+    dbid/q1/q2 hash or its database's mapping version differs from the
+    manifest, or when a present q1/q2 has no mapped value in ``previous``.
+    Every other row keeps its mapped values from ``previous``. The manifest
+    is updated in memory; the caller saves it once the output is written.
+    """
+    keys = row_keys(df)
+    hashes = query_hashes(df)
+    dbids = df['dbid'].astype(str)
+    versions_by_dbid = {dbid: mapping_version(registry.schemas_data.get(dbid)) for dbid in dbids.unique()}
+    versions = [versions_by_dbid[dbid] for dbid in dbids]
+    
+    stale = manifest.stale(keys, hashes, versions)
+    mapped = {}
+    if previous is not None and 'q1_mapped' in previous.columns:
+        by_key = previous.set_index(pd.Index(row_keys(previous)))
+        for column in ('q1', 'q2'):
+            mapped[column] = by_key[f'{column}_mapped'].reindex(keys).to_numpy(dtype=object)
+    else:
+        stale[:] = True
+    for column in ('q1', 'q2'):
+        if column in mapped:
+            # Retry queries that failed (or were never mapped) last time
+            stale |= (df[column].notna() & (df[column] != '')).to_numpy() & pd.isna(mapped[column])
+        else:
+            mapped[column] = np.full(len(df), None, dtype=object)
+    
+    positions = np.flatnonzero(stale)
+    print(f"Incremental run: remapping {len(positions)} of {len(df)} rows")
+    subset = df.iloc[positions].copy()
+    subset['q1_mapped'] = None
+    subset['q2_mapped'] = None
+    failures = _map_frame(subset, registry, executor) if len(positions) else []
+    for column in ('q1', 'q2'):
+        mapped[column][positions] = subset[f'{column}_mapped'].to_numpy(dtype=object)
+        mapped[column][pd.isna(mapped[column])] = None
+        df[f'{column}_mapped'] = pd.Series(mapped[column], index=df.index, dtype=object)
+    
+    manifest.replace(keys, hashes, versions)
+    return [(int(positions[pos]), column) for pos, column in failures]
+
+
+def _report_failures(df: pd.DataFrame, failures: List[Tuple[int, str]], offset: int = 0, limit: int = 20):
+    if not failures:
+        return
+    print(f"Failed to map {len(failures)} queries:")
+    for pos, column in failures[:limit]:
+        print(f"  row {offset + pos} ({column}, dbid={df['dbid'].iat[pos]})")
+    if len(failures) > limit:
+        print(f"  ... and {len(failures) - limit} more")
+
+
+def _finish_metrics(metrics: PipelineMetrics, metrics_path: Optional[str]) -> None:
+    metrics.finish()
+    print(metrics.summary())
+    if metrics_path:
+        metrics.write_json(metrics_path)
+        print(f"Metrics saved to {metrics_path}")
+
+
+def process_csv(csv_path: str, registry: MapperRegistry, output_path: Optional[str] = None, workers: int = 1,
+                metrics: Optional[PipelineMetrics] = None, metrics_path: Optional[str] = None,
+                profile: Optional[str] = None, incremental: bool = False) -> pd.DataFrame:
+    """Add q1_mapped/q2_mapped to every row of a dataset CSV using ``registry``'s mappers.
+
+    Reuse a ``registry`` to keep mappers and memoized queries across runs.
+    With ``workers > 1`` rows are sharded by dbid over a process pool; the
+    output is the same as the serial run. Stage timings, failures and the
+    slowest queries go to ``metrics`` (written to ``metrics_path`` if given);
+    ``profile`` ("cprofile" or "sample") profiles the run into
+    ``<output_path>.<profile>``.
+
+    With ``incremental`` only rows whose queries, dbid mapping or missing
+    mapped values changed since the last run are remapped; the rest keep
+    their values from the existing ``output_path``. What each row was mapped
+    from is kept in ``<output_path>.manifest.json``.
+    """
+    if incremental and not output_path:
+        raise ValueError("incremental mode needs an output_path to keep the manifest beside")
+    metrics = metrics or PipelineMetrics()
+    with profiled(profile, f"{output_path or csv_path}.{profile}"):
+        # Load the CSV file
+        with metrics.stage("io"):
+            df = pd.read_csv(csv_path)
+        registry.metrics = metrics
+        
+        map_frame = _map_frame
+        if incremental:
+            manifest = RemapManifest(f"{output_path}.manifest.json")
+            map_frame = partial(_remap_changed, manifest=manifest,
+                                previous=_previous_mapped(df, csv_path, output_path))
+        
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                failures = map_frame(df, registry, executor)
+        else:
+            failures = map_frame(df, registry)
+            stats = registry.stats()
+            print(f"Mapper cache: {stats['mappers']}")
+            print(f"Query cache: {stats['queries']}")
+        _report_failures(df, failures)
+        
+        # Save to output file if specified
+        if output_path:
+            with metrics.stage("io"):
+                df.to_csv(output_path, index=False)
+                if incremental:
+                    manifest.save()
+            print(f"Results saved to {output_path}")
+    
+    _finish_metrics(metrics, metrics_path)
+    return df
+
+
+def stream_csv(csv_path: str, registry: MapperRegistry, output_path: str, chunksize: int = 5000,
+               workers: int = 1, metrics: Optional[PipelineMetrics] = None, metrics_path: Optional[str] = None,
+               profile: Optional[str] = None) -> Dict[str, int]:
+    """Map a dataset CSV in fixed-size chunks with bounded memory.
+
+    Each mapped chunk is appended to ``<output_path>.partial`` and
+    checkpointed, so an interrupted run resumes after the last finished
+    chunk. The output replaces ``output_path`` atomically at the end, which
+    makes ``output_path == csv_path`` safe. Returns the row count and the
+    mapped/failed counts for the rows mapped in this run. ``metrics``,
+    ``metrics_path`` and ``profile`` work as in ``process_csv``.
+    """
+    metrics = metrics or PipelineMetrics()
+    registry.metrics = metrics
+    counts = {"rows": 0, "q1_mapped": 0, "q1_failed": 0, "q2_mapped": 0, "q2_failed": 0}
+    
+    def open_writer(columns) -> ChunkedCSVWriter:
+        fieldnames = list(columns)
+        fieldnames += [c for c in ('q1_mapped', 'q2_mapped') if c not in fieldnames]
+        return ChunkedCSVWriter(output_path, fieldnames, lineterminator='\n', source_path=csv_path)
+    
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    writer = None
+    try:
+        with profiled(profile, f"{output_path}.{profile}"):
+            reader = pd.read_csv(csv_path, chunksize=chunksize)
+            while True:
+                with metrics.stage("io"):
+                    chunk = next(reader, None)
+                if chunk is None:
+                    break
+                start = counts["rows"]
+                counts["rows"] += len(chunk)
+                if writer is None:
+                    writer = open_writer(chunk.columns)
+                # Skip rows already written before an interruption
+                if counts["rows"] <= writer.rows_done:
+                    continue
+                if start < writer.rows_done:
+                    chunk = chunk.iloc[writer.rows_done - start:]
+                    start = writer.rows_done
+                
+                failures = _map_frame(chunk, registry, executor)
+                _report_failures(chunk, failures, offset=start)
+                for column in ('q1', 'q2'):
+                    counts[f"{column}_mapped"] += int(chunk[f"{column}_mapped"].notna().sum())
+                    counts[f"{column}_failed"] += sum(1 for _, c in failures if c == column)
+                
+                with metrics.stage("io"):
+                    writer.write_frame(chunk)
+                    writer.checkpoint(counts["rows"])
+            
+            with metrics.stage("io"):
+                if writer is None:
+                    # Header-only input: the output is just the header
+                    writer = open_writer(pd.read_csv(csv_path, nrows=0).columns)
+                writer.commit()
+    finally:
+        if writer is not None:
+            writer.close()
+        if executor is not None:
+            executor.shutdown()
+    
+    print(f"Results saved to {output_path}")
+    _finish_metrics(metrics, metrics_path)
+    return counts
@@ -0,0 +1,211 @@
+"""Stream query pairs from any dataset as compact records.
+
+leetcode, bird, beers and literature files name their columns differently
+(``dbid`` vs ``file`` vs none, ``index`` vs ``id``, ``verieql_label`` vs
+``ground_truth`` vs solver ``states``). ``iter_pairs`` reads any of them row
+by row and yields ``PairRecord`` objects with one shape:
+
+    for pair in iter_pairs("datasets/literature/literature.csv"):
+        pair.dbid, pair.index, pair.q1, pair.q2, pair.states, pair.label
+
+Records use ``__slots__``; dbids and schemas are interned so repeated values
+share one string. ``states`` and ``label`` are kept as the raw cell text
+and decoded the first time they are read. Only the current row is
+held in memory, so files of millions of pairs stream in constant memory.
+"""
+import csv
+import json
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from mapping.labels import REFERENCE_VALUES, label_from_states
+
+DATASETS = ("leetcode", "bird", "beers", "literature")
+
+# Candidate columns per field, tried in order; a string starting with '=' is a constant
+COLUMNS: Dict[str, Dict[str, Tuple[str, ...]]] = {
+    "leetcode": {"dbid": ("dbid",), "index": ("index", "id"), "states": ("states",),
+                 "label": ("label", "correct"), "schema": ("schema",)},
+    "bird": {"dbid": ("dbid", "db_id"), "index": ("index", "id", "question_id"), "states": ("states",),
+             "label": ("label", "correct", "ground_truth"), "schema": ("schema",)},
+    "beers": {"dbid": ("dbid", "=beers"), "index": ("index", "id"), "states": ("states",),
+              "label": ("ground_truth",), "schema": ("schema",)},
+    "literature": {"dbid": ("file", "dbid"), "index": ("index", "id"), "states": ("states",),
+                   "label": ("verieql_label", "label"), "schema": ("schema",)},
+}
+
+_MISSING = object()
+
+
+def _decode_states(text: Optional[str]) -> List[str]:
+    if not text or text in ('None', 'nan'):
+        return []
+    try:
+        states = json.loads(text)
+    except ValueError:
+        return []
+    return [sys.intern(s) for s in states] if isinstance(states, list) else []
+
+
+def _index(text: str):
+    return int(text) if text.isdigit() else text
+
+
+class PairRecord:
+    """One query pair. ``states`` and ``label`` are decoded lazily from their raw cells."""
+
+    __slots__ = ("dbid", "index", "q1", "q2", "schema", "_states", "_label")
+
+    def __init__(self, dbid: str, index, q1: Optional[str], q2: Optional[str],
+                 states=None, label=None, schema: Optional[str] = None):
+        self.dbid = dbid
+        self.index = index
+        self.q1 = q1
+        self.q2 = q2
+        self.schema = schema
+        # Raw text until first access; a list (or _MISSING) means decoded
+        self._states = states
+        self._label = label
+
+    @property
+    def states(self) -> List[str]:
+        if not isinstance(self._states, list):
+            self._states = _decode_states(self._states)
+        return self._states
+
+    @property
+    def label(self) -> Optional[str]:
+        """Y/N from the dataset's label column, else derived from ``states``."""
+        if self._label is _MISSING:
+            return label_from_states(self.states)
+        if self._label is None or self._label == '':
+            return None
+        return REFERENCE_VALUES.get(self._label, self._label)
+
+    def __repr__(self) -> str:
+        return f"PairRecord(dbid={self.dbid!r}, index={self.index!r}, label={self.label!r})"
+
+    def to_dict(self) -> Dict:
+        return {"dbid": self.dbid, "index": self.index, "q1": self.q1, "q2": self.q2,
+                "states": self.states, "label": self.label}
+
+
+def detect_dataset(path: str, header: Sequence[str] = ()) -> str:
+    """Dataset from the parent directory name, else from the columns."""
+    for part in reversed(Path(path).resolve().parts[:-1]):
+        if part in DATASETS:
+            return part
+    if "verieql_label" in header or "file" in header:
+        return "literature"
+    if "outputs" in header:
+        return "beers"
+    if "db_id" in header:
+        return "bird"
+    return "leetcode"
+
+
+def _resolve(dataset: str, header: Sequence[str]) -> Dict[str, object]:
+    """Field -> column position, constant value, or None when the file lacks it."""
+    positions = {name: i for i, name in enumerate(header)}
+    resolved: Dict[str, object] = {}
+    for field, candidates in COLUMNS[dataset].items():
+        resolved[field] = None
+        for candidate in candidates:
+            if candidate.startswith('='):
+                resolved[field] = candidate
+                break
+            if candidate in positions:
+                resolved[field] = positions[candidate]
+                break
+    for field in ("q1", "q2"):
+        if field not in positions:
+            raise ValueError(f"{dataset} file has no '{field}' column")
+        resolved[field] = positions[field]
+    return resolved
+
+
+def _iter_csv(path: str, dataset: Optional[str]) -> Iterator[PairRecord]:
+    csv.field_size_limit(sys.maxsize)
+    intern = sys.intern
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        columns = _resolve(dataset or detect_dataset(path, header), header)
+        dbid_at, index_at, states_at, label_at, schema_at = (
+            columns["dbid"], columns["index"], columns["states"], columns["label"], columns["schema"])
+        q1_at, q2_at = columns["q1"], columns["q2"]
+        constant_dbid = intern(dbid_at[1:]) if isinstance(dbid_at, str) else None
+        for position, row in enumerate(reader):
+            if not row:
+                continue
+            yield PairRecord(
+                constant_dbid if constant_dbid is not None else (intern(row[dbid_at]) if dbid_at is not None else None),
+                _index(row[index_at]) if index_at is not None else position,
+                row[q1_at] or None,
+                row[q2_at] or None,
+                row[states_at] if states_at is not None else None,
+                intern(row[label_at]) if label_at is not None else _MISSING,
+                intern(row[schema_at]) if schema_at is not None else None,
+            )
+
+
+def _iter_parquet(path: str, dataset: Optional[str], batch_size: int) -> Iterator[PairRecord]:
+    import pyarrow.parquet as pq
+    parquet = pq.ParquetFile(path)
+    header = parquet.schema_arrow.names
+    columns = _resolve(dataset or detect_dataset(path, header), header)
+    names = {field: header[at] for field, at in columns.items() if isinstance(at, int)}
+    intern = sys.intern
+    constant_dbid = intern(columns["dbid"][1:]) if isinstance(columns["dbid"], str) else None
+    position = 0
+    for batch in parquet.iter_batches(batch_size=batch_size, columns=sorted(set(names.values()))):
+        data = {field: batch.column(name).to_pylist() for field, name in names.items()}
+        missing = [None] * batch.num_rows
+        dbids, indexes = data.get("dbid", missing), data.get("index")
+        states, schemas = data.get("states", missing), data.get("schema", missing)
+        labels = data.get("label", [_MISSING] * batch.num_rows)
+        for i in range(batch.num_rows):
+            row_states = states[i]
+            if isinstance(row_states, list):
+                row_states = [intern(s) for s in row_states]
+            yield PairRecord(
+                constant_dbid or (intern(str(dbids[i])) if dbids[i] is not None else None),
+                indexes[i] if indexes is not None else position,
+                data["q1"][i],
+                data["q2"][i],
+                row_states,
+                intern(labels[i]) if isinstance(labels[i], str) else labels[i],
+                intern(schemas[i]) if schemas[i] is not None else None,
+            )
+            position += 1
+
+
+def iter_pairs(path: str, dataset: Optional[str] = None, batch_size: int = 65536) -> Iterator[PairRecord]:
+    """Yield every pair in a dataset CSV (or Parquet) file, one row in memory at a time."""
+    if dataset is not None and dataset not in COLUMNS:
+        raise ValueError(f"Unknown dataset '{dataset}', expected one of {DATASETS}")
+    if str(path).endswith('.parquet'):
+        return _iter_parquet(path, dataset, batch_size)
+    return _iter_csv(path, dataset)
+
+
+if __name__ == "__main__":
+    import argparse
+    from collections import Counter
+
+    parser = argparse.ArgumentParser(description="Stream a dataset file and summarize its pairs")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--dataset", choices=DATASETS, help="default: detect from path and columns")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        pairs, labels, dbids = 0, Counter(), set()
+        for pair in iter_pairs(path, args.dataset):
+            pairs += 1
+            labels[pair.label] += 1
+            dbids.add(pair.dbid)
+        print(f"{path}: {pairs} pairs, {len(dbids)} dbids, labels {dict(labels)}")
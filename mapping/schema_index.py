@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# Bytes read at a time while scanning schemas.json
+_READ_SIZE = 1 << 20
+
+_DELIMITERS = ",:}] \t\r\n"
+
+
+def iter_json_object(path: str, read_size: int = _READ_SIZE) -> Iterator[Tuple[str, Any]]:
+    """Yield the ``(key, value)`` pairs of a top-level JSON object one at a time.
+
+    Only the current value is decoded, so memory is bounded by the largest
+    single entry rather than by the whole file.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = f.read(read_size)
+        pos = 0
+        eof = False
+
+        def skip(chars: str) -> None:
+            nonlocal buffer, pos, eof
+            while True:
+                while pos < len(buffer) and buffer[pos] in chars:
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    return
+                more = f.read(read_size)
+                eof = not more
+                buffer, pos = buffer[pos:] + more, 0
+
+        def decode() -> Any:
+            nonlocal buffer, pos, eof
+            size = read_size
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                    # A number cut off by the buffer end still decodes, so
+                    # only accept a value once the following delimiter is seen
+                    if eof or (end < len(buffer) and buffer[end] in _DELIMITERS):
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                more = f.read(size)
+                size *= 2
+                eof = not more
+                buffer, pos = buffer[pos:] + more, 0
+
+        skip(" \t\r\n")
+        if buffer[pos:pos + 1] != '{':
+            raise ValueError(f"{path} does not hold a JSON object")
+        pos += 1
+        while True:
+            skip(" \t\r\n,")
+            if buffer[pos:pos + 1] == '}' or (eof and pos >= len(buffer)):
+                return
+            key = decode()
+            skip(" \t\r\n:")
+            yield key, decode()
+
+
+class SchemaIndex:
+    """On-disk index of a schemas.json file with O(1) lookups by dbid.
+
+    The first use scans the JSON file entry by entry into a SQLite table
+    (``<schemas_path>.idx.sqlite`` by default) keyed by dbid; later uses open
+    that table directly and rebuild it only when the JSON file's size or
+    mtime changed. If that path cannot be written (read-only directory), the
+    index goes to the temp directory instead, and failing that to memory.
+    Builds write a private temp file and rename it into place, so concurrent
+    builders never see each other's half-written index. Each lookup decodes just the requested entry, so memory
+    does not grow with the number of databases. Supports the dict methods
+    ``MapperRegistry`` uses (``in``, ``[]``, ``get``, ``__setitem__``); keys
+    are compared as strings.
+    """
+
+    def __init__(self, schemas_path: str, index_path: Optional[str] = None):
+        self.schemas_path = schemas_path
+        self._requested_path = index_path
+        self._overrides: Dict[str, Any] = {}
+        self.source = self._source_stamp()
+        self.conn = self._connect(index_path or f"{schemas_path}.idx.sqlite")
+
+    def _connect(self, index_path: str) -> sqlite3.Connection:
+        digest = hashlib.sha1(os.path.abspath(self.schemas_path).encode()).hexdigest()[:16]
+        fallback = os.path.join(tempfile.gettempdir(), f"schemas-{digest}.idx.sqlite")
+        for path in dict.fromkeys([index_path, fallback]):
+            self.index_path = path
+            conn = self._open_index(self.source)
+            if conn is not None:
+                return conn
+            try:
+                self._build(self.source)
+            except (OSError, sqlite3.Error) as e:
+                print(f"Cannot write schema index {path}: {e}")
+                continue
+            conn = self._open_index(self.source)
+            if conn is not None:
+                return conn
+        print(f"Keeping the schema index of {self.schemas_path} in memory")
+        self.index_path = ":memory:"
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._fill(conn, self.source)
+        return conn
+
+    def _source_stamp(self) -> str:
+        stat = os.stat(self.schemas_path)
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    def is_stale(self) -> bool:
+        """True once schemas.json changed (or vanished) after this index was opened."""
+        try:
+            return self._source_stamp() != self.source
+        except OSError:
+            return True
+
+    def _open_index(self, source: str) -> Optional[sqlite3.Connection]:
+        if not os.path.exists(self.index_path):
+            return None
+        conn = sqlite3.connect(self.index_path, check_same_thread=False)
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+        except sqlite3.Error:
+            row = None
+        if row is None or row[0] != source:
+            conn.close()
+            return None
+        return conn
+
+    def _fill(self, conn: sqlite3.Connection, source: str) -> None:
+        conn.execute("CREATE TABLE schemas (dbid TEXT PRIMARY KEY, entry TEXT NOT NULL)")
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO schemas VALUES (?, ?)",
+                             ((str(dbid), json.dumps(entry)) for dbid, entry in iter_json_object(self.schemas_path)))
+            conn.execute("INSERT INTO meta VALUES ('source', ?)", (source,))
+
+    def _build(self, source: str) -> None:
+        directory, name = os.path.split(os.path.abspath(self.index_path))
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{name}.", suffix=".tmp", dir=directory)
+        os.close(fd)
+        try:
+            conn = sqlite3.connect(tmp_path)
+            try:
+                self._fill(conn, source)
+            finally:
+                conn.close()
+            os.replace(tmp_path, self.index_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def get(self, dbid, default: Any = None) -> Any:
+        key = str(dbid)
+        if key in self._overrides:
+            return self._overrides[key]
+        row = self.conn.execute("SELECT entry FROM schemas WHERE dbid = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row is not None else default
+
+    def __getitem__(self, dbid) -> Any:
+        entry = self.get(dbid)
+        if entry is None:
+            raise KeyError(dbid)
+        return entry
+
+    def __setitem__(self, dbid, entry: Any) -> None:
+        # Kept in memory only; the index mirrors schemas.json
+        self._overrides[str(dbid)] = entry
+
+    def __contains__(self, dbid) -> bool:
+        key = str(dbid)
+        return key in self._overrides or self.conn.execute(
+            "SELECT 1 FROM schemas WHERE dbid = ?", (key,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM schemas").fetchone()[0]
+
+    def keys(self) -> Iterator[str]:
+        for (dbid,) in self.conn.execute("SELECT dbid FROM schemas ORDER BY rowid"):
+            yield dbid
+
+    def mapping(self, dbid) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """``(tables, columns)`` mapping of one database; raises KeyError if unknown."""
+        mapping = self[dbid]["mapping"]
+        return mapping["tables"], mapping["columns"]
+
+    def ddl(self, dbid) -> Optional[str]:
+        """The original DDL of one database, if the file records it."""
+        entry = self.get(dbid)
+        return entry.get("original_schema") if entry is not None else None
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __getstate__(self):
+        # Re-open in the receiving process instead of pickling the connection
+        return {"schemas_path": self.schemas_path, "index_path": self._requested_path, "overrides": self._overrides}
+
+    def __setstate__(self, state) -> None:
+        self.__init__(state["schemas_path"], state["index_path"])
+        self._overrides = state["overrides"]
+
+
+# One index per schemas file, replaced when the file changes
+_indexes: Dict[str, SchemaIndex] = {}
+
+
+def open_schema_index(schemas_path: str) -> SchemaIndex:
+    key = os.path.abspath(schemas_path)
+    index = _indexes.get(key)
+    if index is not None and index.is_stale():
+        index.close()
+        index = None
+    if index is None:
+        index = _indexes[key] = SchemaIndex(schemas_path)
+    return index
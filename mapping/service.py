@@ -0,0 +1,200 @@
+"""Mapping service: warm schemas and mappers behind a Unix socket.
+
+``MappingService`` answers map-schema and map-query requests, keeping
+compiled schemas, schema indexes and per-dataset ``MapperRegistry``
+instances between requests. ``serve`` runs it as a daemon on a Unix
+socket; ``Client`` talks to that daemon. The protocol is one JSON object
+per line in each direction:
+
+    {"op": "map_query", "dataset": "bird", "schemas": "schemas.json",
+     "dbid": "california_schools", "queries": ["SELECT ...", ...]}
+    -> {"ok": true, "results": ["SELECT ...", null, ...], "errors": [[1, "ParseError: ..."]]}
+
+    {"op": "map_schema", "schemas": ["CREATE TABLE ...", ...]}
+    -> {"ok": true, "results": [{"dummy_schema": "...", "mapping": {...}}, ...]}
+
+plus ``ping``, ``stats`` and ``shutdown``. Only the standard library is
+imported at module level; pandas, sqlglot and the mappers are loaded by
+the first request that needs them, so clients start fast.
+"""
+import importlib.util
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+DATASETS = ("bird", "leetcode")
+
+
+def default_socket_path() -> str:
+    return os.environ.get("CE_BENCH_SOCKET") or os.path.join(
+        tempfile.gettempdir(), f"ce_bench_mapping-{os.getuid()}.sock")
+
+
+def load_mapper_module(dataset: str):
+    """Import ``datasets/<dataset>/sql_mapper.py`` under a unique module name."""
+    if dataset not in DATASETS:
+        raise ValueError(f"Unknown dataset '{dataset}', expected one of {DATASETS}")
+    name = f"{dataset}_sql_mapper"
+    module = sys.modules.get(name)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(name, ROOT / "datasets" / dataset / "sql_mapper.py")
+        module = importlib.util.module_from_spec(spec)
+        # Registered before running so pool workers can unpickle its functions
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return module
+
+
+class MappingService:
+    """Request handler state: one MapperRegistry per (dataset, schemas file)."""
+
+    def __init__(self):
+        self._registries: Dict[tuple, tuple] = {}  # (dataset, path) -> (file stamp, registry)
+        self.requests = 0
+        self.started = time.time()
+
+    def registry(self, dataset: str, schemas_path: str):
+        """The warm registry for ``schemas_path``, rebuilt when the file's mtime or size changed."""
+        key = (dataset, os.path.abspath(schemas_path))
+        stat = os.stat(key[1])
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        cached = self._registries.get(key)
+        if cached is None or cached[0] != stamp:
+            # open_schema_index re-indexes the changed file as well
+            cached = self._registries[key] = (stamp, load_mapper_module(dataset).MapperRegistry.from_schemas(key[1]))
+        return cached[1]
+
+    def map_query(self, dataset: str, schemas: str, dbid, queries: List[str], pretty: bool = False) -> Dict[str, Any]:
+        errors = []
+        results = list(self.registry(dataset, schemas).map_many(dbid, queries, pretty=pretty, failures=errors))
+        return {"results": results,
+                "errors": [[i, f"{type(e).__name__}: {e}" if e is not None else None] for i, e in errors]}
+
+    def map_schema(self, schemas: List[str]) -> Dict[str, Any]:
+        from mapping.map import extract_and_map_schema
+        results = []
+        for schema_sql in schemas:
+            dummy_schema, mapping = extract_and_map_schema(schema_sql)
+            results.append({"dummy_schema": dummy_schema, "mapping": mapping})
+        return {"results": results}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "uptime_seconds": time.time() - self.started,
+            "registries": {f"{dataset}:{path}": registry.stats()
+                           for (dataset, path), (_, registry) in self._registries.items()},
+        }
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        self.requests += 1
+        op = request.get("op")
+        try:
+            if op == "map_query":
+                response = self.map_query(request["dataset"], request["schemas"], request["dbid"],
+                                          request["queries"], request.get("pretty", False))
+            elif op == "map_schema":
+                response = self.map_schema(request["schemas"])
+            elif op == "stats":
+                response = self.stats()
+            elif op in ("ping", "shutdown"):
+                response = {"pid": os.getpid()}
+            else:
+                raise ValueError(f"Unknown op '{op}'")
+        except Exception as e:
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        response["ok"] = True
+        return response
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                response = {"ok": False, "error": f"bad request: {e}"}
+                request = {}
+            else:
+                response = self.server.service.handle(request)
+            self.wfile.write(json.dumps(response).encode('utf-8') + b"\n")
+            self.wfile.flush()
+            if request.get("op") == "shutdown":
+                self.server.stopping = True
+                return
+
+
+class _Server(socketserver.UnixStreamServer):
+    # Requests are handled one at a time, so the registries need no locking
+    def __init__(self, socket_path: str, service: MappingService):
+        super().__init__(socket_path, _Handler)
+        self.service = service
+        self.stopping = False
+
+
+def serve(socket_path: Optional[str] = None) -> None:
+    """Run the daemon until a ``shutdown`` request arrives."""
+    socket_path = socket_path or default_socket_path()
+    if os.path.exists(socket_path):
+        if Client(socket_path).alive():
+            raise RuntimeError(f"A mapping daemon is already listening on {socket_path}")
+        os.unlink(socket_path)  # left behind by a daemon that died
+    server = _Server(socket_path, MappingService())
+    print(f"Mapping daemon listening on {socket_path} (pid {os.getpid()})", flush=True)
+    try:
+        while not server.stopping:
+            server.handle_request()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+class Client:
+    """Line-delimited JSON client for the mapping daemon."""
+
+    def __init__(self, socket_path: Optional[str] = None, timeout: float = 600.0):
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._file = None
+
+    def _connect(self) -> None:
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._sock, self._file = sock, sock.makefile('rb')
+
+    def request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        self._connect()
+        self._sock.sendall(json.dumps(payload).encode('utf-8') + b"\n")
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("mapping daemon closed the connection")
+        return json.loads(line)
+
+    def alive(self) -> bool:
+        try:
+            return self.request({"op": "ping"}).get("ok", False)
+        except OSError:
+            return False
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+            self._sock = self._file = None
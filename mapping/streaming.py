@@ -0,0 +1,112 @@
+import csv
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+
+def _source_stamp(path: str) -> Dict[str, Any]:
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+class ChunkedCSVWriter:
+    """Write a CSV chunk by chunk with checkpoints and an atomic final rename.
+
+    Rows go to ``<output>.partial``. After each chunk the caller records how
+    many input rows it has consumed with ``checkpoint``; that count and the
+    flushed size of the partial file are stored in ``<output>.checkpoint``.
+    If the run dies, a new writer for the same output truncates the partial
+    file back to the last checkpoint and reports ``rows_done`` so the caller
+    can skip input it already handled. ``commit`` renames the partial file
+    over ``output_path`` in one step.
+
+    With ``source_path`` the checkpoint also records that input's path, size
+    and mtime; if the input was replaced or edited since, the writer starts
+    over instead of skipping rows of a different file.
+    """
+
+    def __init__(self, output_path: str, fieldnames: List[str], resume: bool = True,
+                 lineterminator: str = '\r\n', source_path: Optional[str] = None):
+        self.output_path = output_path
+        self.source = _source_stamp(source_path) if source_path else None
+        self.fieldnames = list(fieldnames)
+        self.lineterminator = lineterminator
+        self.partial_path = f"{output_path}.partial"
+        self.checkpoint_path = f"{output_path}.checkpoint"
+        self.rows_done = 0
+
+        state = self._load_checkpoint() if resume else None
+        if state is not None:
+            self.rows_done = state["rows_done"]
+            self._file = open(self.partial_path, 'r+', newline='', encoding='utf-8')
+            # Drop anything written after the last checkpoint
+            self._file.truncate(state["bytes_written"])
+            self._file.seek(state["bytes_written"])
+            print(f"Resuming {output_path} after {self.rows_done} rows")
+        else:
+            self._file = open(self.partial_path, 'w', newline='', encoding='utf-8')
+            csv.writer(self._file, lineterminator=lineterminator).writerow(self.fieldnames)
+        self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames,
+                                      lineterminator=lineterminator)
+
+    def _load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        if not (os.path.exists(self.checkpoint_path) and os.path.exists(self.partial_path)):
+            return None
+        try:
+            with open(self.checkpoint_path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get("fieldnames") != self.fieldnames:
+            return None
+        if state.get("source") != self.source:
+            print(f"Input changed since the checkpoint of {self.output_path}; starting over")
+            return None
+        if os.path.getsize(self.partial_path) < state["bytes_written"]:
+            return None
+        return state
+
+    def __enter__(self) -> "ChunkedCSVWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # On error keep the partial file and checkpoint for the next run
+        self.close()
+
+    def write_rows(self, rows: Iterable[Dict[str, Any]]) -> None:
+        self._writer.writerows(rows)
+
+    def write_frame(self, df: pd.DataFrame) -> None:
+        df.to_csv(self._file, header=False, index=False, columns=self.fieldnames,
+                  lineterminator=self.lineterminator)
+
+    def checkpoint(self, rows_done: int) -> None:
+        """Make everything written so far durable and record ``rows_done``."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.rows_done = rows_done
+        state = {
+            "rows_done": rows_done,
+            "bytes_written": self._file.tell(),
+            "fieldnames": self.fieldnames,
+            "source": self.source,
+        }
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def commit(self) -> None:
+        """Atomically move the finished output into place."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.partial_path, self.output_path)
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
@@ -0,0 +1,72 @@
+import sys
+from pathlib import Path
+
+import pytest
+from sqlglot import parse_one
+from sqlglot.expressions import Column, Identifier, Table
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from mapping.service import load_mapper_module
+
+SQLMapper = load_mapper_module("bird").SQLMapper
+
+TABLES = {"Person": "t1", "Address": "t2"}
+COLUMNS = {"PersonId": "c1", "City": "c2"}
+
+
+def _two_pass_mapping(sql_query, pretty):
+    """The original rewrite: two ``transform`` passes over copies of the tree."""
+    tables = {k.upper(): v for k, v in TABLES.items()}
+    columns = {k.upper(): v for k, v in COLUMNS.items()}
+
+    def transform_table(node):
+        if isinstance(node, Table) and node.name.upper() in tables:
+            node.set("this", Identifier(this=tables[node.name.upper()]))
+        return node
+
+    def transform_column(node):
+        if isinstance(node, Column):
+            if node.table and node.table.upper() in tables:
+                node.set("table", Identifier(this=tables[node.table.upper()]))
+            if node.name.upper() in columns:
+                node.set("this", Identifier(this=columns[node.name.upper()]))
+        return node
+
+    try:
+        parsed = parse_one(sql_query, dialect="sqlite")
+        return parsed.transform(transform_table).transform(transform_column).sql(dialect="sqlite", pretty=pretty)
+    except Exception:
+        return None
+
+
+QUERIES = [
+    "SELECT p.PersonId, Address.City FROM Person AS p JOIN Address ON p.personid = Address.PersonId",
+    "SELECT city, COUNT(*) FROM address GROUP BY city HAVING COUNT(*) > 1 ORDER BY 2 DESC",
+    "WITH x AS (SELECT PersonId FROM Person) SELECT * FROM x WHERE PersonId IN (SELECT personid FROM address)",
+    "SELECT 'Person' AS city FROM other",
+    "SELECT FROM WHERE",
+]
+
+
+@pytest.mark.parametrize("pretty", [False, True])
+def test_one_pass_rewrite_matches_two_pass_transform(pretty):
+    mapper = SQLMapper(TABLES, COLUMNS)
+    for query in QUERIES:
+        assert mapper.map_sql_query(query, pretty=pretty) == _two_pass_mapping(query, pretty)
+
+
+def test_map_many_reports_failures_by_position():
+    mapper = SQLMapper(TABLES, COLUMNS)
+    queries = ["SELECT City FROM Person", "SELECT FROM WHERE", "SELECT City FROM Person", "SELECT FROM WHERE"]
+    failures = []
+    mapped = list(mapper.map_many(queries, pretty=False, failures=failures))
+    assert mapped == ["SELECT c2 FROM t1", None, "SELECT c2 FROM t1", None]
+    assert [i for i, _ in failures] == [1, 3]
+    assert all(isinstance(error, Exception) for _, error in failures)
+
+    # The registry answers repeats from its memo and still reports them
+    registry = load_mapper_module("bird").MapperRegistry({"db1": {"mapping": {"tables": TABLES, "columns": COLUMNS}}})
+    for _ in range(2):
+        failures = []
+        assert list(registry.map_many("db1", queries, pretty=False, failures=failures)) == mapped
+        assert [i for i, _ in failures] == [1, 3]
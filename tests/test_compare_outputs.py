@@ -0,0 +1,38 @@
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "datasets" / "beers"))
+from compare_outputs import compare_outputs, derive_ground_truth, first_difference
+
+
+def _cell(student, teacher):
+    return repr({"student_result": student, "teacher_result": teacher})
+
+
+CELLS = pd.Series([
+    _cell([["Bud", 2], ["Ale", 3]], [["Bud", 2], ["Ale", 3]]),
+    _cell([["Bud", 2], ["Ale", 3]], [["Ale", 3], ["Bud", 2]]),
+    _cell([["Bud", 2], ["Bud", 2], ["Ale", 3]], [["Ale", 3], ["Bud", 2]]),
+    _cell([["Bud", 2]], [["Bud", 3]]),
+    "{'student_result': [['x', Decimal('0.750')]], 'teacher_result': [['x', 0.75]]}",
+    _cell([], []),
+    None,
+])
+
+
+def test_set_bag_and_ordered_equality():
+    result = compare_outputs(CELLS)
+    assert result["ordered_equal"].tolist() == [True, False, False, False, True, True, True]
+    assert result["bag_equal"].tolist() == [True, True, False, False, True, True, True]
+    assert result["set_equal"].tolist() == [True, True, True, False, True, True, True]
+    assert result["student_rows"].tolist() == [2, 2, 3, 1, 1, 0, 0]
+    assert derive_ground_truth(CELLS, "set").tolist() == ["Y", "Y", "Y", "N", "Y", "Y", "Y"]
+
+
+def test_first_difference():
+    assert first_difference(CELLS[0], "ordered") is None
+    assert first_difference(CELLS[1], "ordered") == {"side": "student_result", "position": 0, "text": "['Bud', 2]"}
+    assert first_difference(CELLS[2], "bag") == {"side": "student_result", "position": 1, "text": "['Bud', 2]"}
+    assert first_difference(CELLS[2], "set") is None
@@ -0,0 +1,95 @@
+import random
+import sqlite3
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import equivalence.differential as differential
+from equivalence.differential import (ERROR, NOT_EQUIVALENT, UNKNOWN, SchemaSession, find_counterexamples,
+                                      run_differential)
+
+DDL = "CREATE TABLE t (a INT PRIMARY KEY, b INT);"
+RUNAWAY = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT count(*) FROM n"
+
+
+def test_step_limit_does_not_leak_into_next_batch():
+    session = SchemaSession(DDL, step_limit=200_000)
+    rows, err = session.run(RUNAWAY)
+    assert rows is None and "interrupted" in err
+    session.random_database(random.Random(0), 50)
+    session.load(session.dump())
+    assert session.run("SELECT count(*) FROM t")[0] is not None
+
+
+def test_failed_database_build_is_rolled_back():
+    session = SchemaSession(DDL)
+    session.load("INSERT INTO t VALUES (1, 1);")
+    try:
+        session.load("INSERT INTO t VALUES (2, 2);\nINSERT INTO missing VALUES (3);")
+    except sqlite3.Error:
+        pass
+    assert session.run("SELECT a FROM t")[0] == [(1,)]
+
+
+def test_trial_errors_leave_pairs_unknown(monkeypatch):
+    def fail(self, rng, max_rows):
+        raise sqlite3.OperationalError("interrupted")
+
+    monkeypatch.setattr(SchemaSession, "random_database", fail)
+    results = find_counterexamples(DDL, [(0, "SELECT a FROM t", "SELECT b FROM t")], trials=3)
+    assert results[0]["state"] == UNKNOWN
+    assert "interrupted" in results[0]["err"]
+
+
+def test_minimize_errors_keep_the_counterexample(monkeypatch):
+    import equivalence.minimize
+
+    def fail(*args, **kwargs):
+        raise sqlite3.OperationalError("interrupted")
+
+    monkeypatch.setattr(equivalence.minimize, "minimize_counterexample", fail)
+    results = find_counterexamples(DDL, [(0, "SELECT a FROM t", "SELECT a FROM t WHERE b > 0")],
+                                   trials=50, minimize=True)
+    assert results[0]["state"] == NOT_EQUIVALENT
+    assert results[0]["counterexample"] and "minimize" in results[0]["err"]
+
+
+def test_order_by_pairs_are_compared_in_order():
+    pairs = [(0, "SELECT a FROM t ORDER BY a", "SELECT a FROM t ORDER BY a DESC"),
+             (1, "SELECT a FROM t", "SELECT a FROM t ORDER BY a DESC")]
+    results = find_counterexamples(DDL, pairs, trials=50)
+    assert results[0]["state"] == NOT_EQUIVALENT
+    assert results[1]["state"] == UNKNOWN
+
+
+def test_writing_queries_are_rejected():
+    pairs = [(0, "DELETE FROM t", "SELECT a FROM t"), (1, "SELECT a FROM t", "SELECT a FROM t")]
+    results = find_counterexamples(DDL, pairs, trials=5)
+    assert results[0]["state"] == ERROR and "read-only" in results[0]["err"]
+    assert results[1]["state"] == UNKNOWN
+
+
+def test_errors_are_kept_per_pair():
+    pairs = [(0, "SELECT a FROM t", "SELECT a FROM t"),
+             (1, "SELECT a FROM t", "SELECT a FROM t WHERE abs(a * 0 - 9223372036854775807 - 1) > 0")]
+    results = find_counterexamples(DDL, pairs, trials=30)
+    assert results[0]["err"] is None
+    assert results[1]["state"] == UNKNOWN and "q2" in results[1]["err"]
+
+
+def test_one_session_per_schema(monkeypatch):
+    sessions = []
+    init = SchemaSession.__init__
+
+    def counting_init(self, *args, **kwargs):
+        sessions.append(self)
+        init(self, *args, **kwargs)
+
+    monkeypatch.setattr(differential.SchemaSession, "__init__", counting_init)
+    df = pd.DataFrame({"schema": [DDL] * 3, "q1": ["SELECT a FROM t"] * 3,
+                       "q2": ["SELECT a FROM t", "SELECT b FROM t", "SELECT a FROM t WHERE b > 0"]})
+    diff = run_differential(df, trials=20)
+    assert len(sessions) == 1
+    assert diff["diff_state"].tolist() == [UNKNOWN, NOT_EQUIVALENT, NOT_EQUIVALENT]
@@ -0,0 +1,43 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from equivalence.fingerprint import FingerprintIndex, fingerprint
+
+
+@pytest.mark.parametrize("q1, q2", [
+    ("SELECT a AS x FROM t", "select A from T"),
+    ("SELECT p.id FROM person p", "SELECT q.id FROM Person AS q"),
+    ("SELECT a AS x FROM t UNION SELECT b FROM u", "SELECT a FROM t UNION SELECT b AS y FROM u"),
+])
+def test_rewrites_share_fingerprint(q1, q2):
+    assert fingerprint(q1) == fingerprint(q2)
+
+
+@pytest.mark.parametrize("q1, q2", [
+    # Projection aliases seen by USING, NATURAL JOIN and star expansion
+    ("SELECT * FROM (SELECT a AS x FROM t) s JOIN u USING (x)",
+     "SELECT * FROM (SELECT a AS y FROM t) s JOIN u USING (y)"),
+    ("SELECT * FROM (SELECT a AS x FROM t) s NATURAL JOIN u",
+     "SELECT * FROM (SELECT a FROM t) s NATURAL JOIN u"),
+    ("SELECT * FROM (SELECT a AS x FROM t) s",
+     "SELECT * FROM (SELECT a FROM t) s"),
+    ("WITH c AS (SELECT a AS x FROM t) SELECT * FROM c NATURAL JOIN u",
+     "WITH c AS (SELECT a FROM t) SELECT * FROM c NATURAL JOIN u"),
+    # An inner alias shadowing an outer one is a different query from a correlated reference
+    ("SELECT x.a FROM t x WHERE EXISTS (SELECT 1 FROM u y WHERE y.c = x.c)",
+     "SELECT x.a FROM t x WHERE EXISTS (SELECT 1 FROM u x WHERE x.c = x.c)"),
+    ("SELECT t.a FROM t WHERE EXISTS (SELECT 1 FROM u AS t WHERE t.b = 1)",
+     "SELECT t.a FROM t WHERE EXISTS (SELECT 1 FROM u WHERE u.b = 1)"),
+])
+def test_different_queries_do_not_collide(q1, q2):
+    assert fingerprint(q1) != fingerprint(q2)
+
+
+def test_index_lookup_is_symmetric(tmp_path):
+    with FingerprintIndex(str(tmp_path / "pairs.sqlite")) as index:
+        index.put("s", "a", "b", label="N", states='["NEQ"]')
+        assert index.settled("s", "b", "a")["label"] == "N"
+        assert index.settled("s", "a", "c") is None
@@ -0,0 +1,125 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "datasets" / "leetcode"))
+import convert_to_csv
+from convert_to_csv import convert_jsonlines_to_csv, ingest_jsonlines
+
+
+def _write_shard(path, start, count, mode='w'):
+    with open(path, mode) as f:
+        for i in range(start, start + count):
+            f.write(json.dumps({
+                "file": f"benchmark/leetcode/raw_data/{175 + i % 3}.csv", "index": i,
+                "schema": {"PERSON": {"ID": "INT"}}, "constraint": [], "states": ["EQU"],
+                "times": [0.1], "counterexample": None, "err": None,
+                "pair": [f"SELECT id FROM person WHERE id > {i}", "SELECT id FROM person"],
+            }) + "\n")
+
+
+def _rows(path):
+    with open(path) as f:
+        return sum(1 for _ in f) - 1
+
+
+def test_ingest_appends_new_lines_only(tmp_path):
+    shard, output = tmp_path / "a.out", tmp_path / "out.csv"
+    _write_shard(shard, 0, 20)
+    assert ingest_jsonlines([str(shard)], str(output)) == {str(shard): 20}
+    _write_shard(shard, 20, 5, mode='a')
+    assert ingest_jsonlines([str(shard)], str(output)) == {str(shard): 5}
+    assert _rows(output) == 25
+
+
+def test_ingest_refuses_output_it_did_not_write(tmp_path):
+    shard, existing, output = tmp_path / "a.out", tmp_path / "all.out", tmp_path / "out.csv"
+    _write_shard(existing, 0, 30)
+    convert_jsonlines_to_csv(str(existing), str(output))
+    before = output.read_bytes()
+    _write_shard(shard, 30, 10)
+    with pytest.raises(ValueError, match="not written by ingest"):
+        ingest_jsonlines([str(shard)], str(output))
+    assert output.read_bytes() == before
+
+
+def test_ingest_refuses_shrunk_shard(tmp_path):
+    shard, output = tmp_path / "a.out", tmp_path / "out.csv"
+    _write_shard(shard, 0, 20)
+    ingest_jsonlines([str(shard)], str(output))
+    before = output.read_bytes()
+    _write_shard(shard, 0, 5)
+    with pytest.raises(ValueError, match="shrank or was replaced"):
+        ingest_jsonlines([str(shard)], str(output))
+    assert output.read_bytes() == before
+
+
+def test_ingest_refuses_replaced_shard(tmp_path):
+    shard, replacement, output = tmp_path / "a.out", tmp_path / "new.out", tmp_path / "out.csv"
+    _write_shard(shard, 0, 5)
+    ingest_jsonlines([str(shard)], str(output))
+    _write_shard(replacement, 100, 20)
+    os.replace(replacement, shard)
+    with pytest.raises(ValueError, match="shrank or was replaced"):
+        ingest_jsonlines([str(shard)], str(output))
+    assert _rows(output) == 5
+
+
+
+def _interrupted_conversion(monkeypatch, source, output):
+    """Convert ``source`` in chunks of 10 and die on its 26th line."""
+    csv_row = convert_to_csv._csv_row
+
+    def fail_late(data):
+        if data["index"] >= 25:
+            raise KeyboardInterrupt
+        return csv_row(data)
+
+    monkeypatch.setattr(convert_to_csv, "_csv_row", fail_late)
+    with pytest.raises(KeyboardInterrupt):
+        convert_jsonlines_to_csv(str(source), str(output), chunksize=10)
+    monkeypatch.setattr(convert_to_csv, "_csv_row", csv_row)
+    assert not output.exists()
+
+
+def test_conversion_resumes_after_checkpoint(tmp_path, monkeypatch, capsys):
+    source, output, fresh = tmp_path / "a.out", tmp_path / "out.csv", tmp_path / "fresh.csv"
+    _write_shard(source, 0, 30)
+    _interrupted_conversion(monkeypatch, source, output)
+    convert_jsonlines_to_csv(str(source), str(output), chunksize=10)
+    assert "Resuming" in capsys.readouterr().out
+    convert_jsonlines_to_csv(str(source), str(fresh), chunksize=10)
+    assert output.read_bytes() == fresh.read_bytes()
+
+
+def test_conversion_restarts_on_replaced_input(tmp_path, monkeypatch):
+    source, output, fresh = tmp_path / "a.out", tmp_path / "out.csv", tmp_path / "fresh.csv"
+    _write_shard(source, 0, 30)
+    _interrupted_conversion(monkeypatch, source, output)
+    _write_shard(source, 120, 10)
+    convert_jsonlines_to_csv(str(source), str(output), chunksize=10)
+    convert_jsonlines_to_csv(str(source), str(fresh), chunksize=10)
+    assert output.read_bytes() == fresh.read_bytes()
+    assert _rows(output) == 10
+
+
+def test_csv_and_parquet_load_the_same_frame(tmp_path):
+    pytest.importorskip("pyarrow")
+    source = tmp_path / "a.out"
+    _write_shard(source, 0, 6)
+    with open(source, 'a') as f:
+        f.write(json.dumps({
+            "file": "raw/182.csv", "index": 6, "schema": {}, "constraint": [], "states": ["NEQ"],
+            "times": [1, None], "counterexample": "INSERT INTO t VALUES (1);", "err": "",
+            "pair": ["SELECT 'nan'", "SELECT NULL"],
+        }) + "\n")
+    convert_jsonlines_to_csv(str(source), str(tmp_path / "out.csv"))
+    convert_to_csv.convert_jsonlines_to_parquet(str(source), str(tmp_path / "out.parquet"))
+    from_csv = convert_to_csv.load_results(str(tmp_path / "out.csv"))
+    from_parquet = convert_to_csv.load_results(str(tmp_path / "out.parquet"))
+    pd.testing.assert_frame_equal(from_csv, from_parquet)
+    assert from_csv.loc[0, "counterexample"] is None and from_csv.loc[6, "times"] == [1.0, None]
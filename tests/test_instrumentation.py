@@ -0,0 +1,48 @@
+import json
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from mapping.instrumentation import PipelineMetrics
+from mapping.service import load_mapper_module
+
+
+def _run(tmp_path, name, workers):
+    schemas = tmp_path / "schemas.json"
+    schemas.write_text(json.dumps({"db1": {"mapping": {"tables": {"person": "t1"}, "columns": {}}},
+                                   "db2": {"mapping": {"tables": {}, "columns": {}}}}))
+    source = tmp_path / "in.csv"
+    pd.DataFrame({
+        "index": range(6),
+        "dbid": ["db1", "db1", "db2", "db2", "db1", "db2"],
+        "q1": ["SELECT 1 FROM person", "SELECT FROM WHERE", "SELECT 2", "SELECT 2", None, "SELECT 3"],
+        "q2": ["SELECT 1 FROM person"] * 3 + ["SELECT FROM WHERE", "SELECT 4", "SELECT FROM WHERE"],
+    }).to_csv(source, index=False)
+    metrics_path = tmp_path / f"{name}.json"
+    load_mapper_module("bird").process_bird_csv(str(source), str(schemas), str(tmp_path / f"{name}.csv"),
+                                                workers=workers, metrics_path=str(metrics_path))
+    return json.loads(metrics_path.read_text())
+
+
+def test_metrics_totals(tmp_path):
+    serial = _run(tmp_path, "serial", 1)
+    assert serial["rows"] == 6
+    assert serial["failures"]["total"] == 3
+    assert serial["failures"]["by_dbid"] == {"db2": 2, "db1": 1}
+    assert set(serial["stages"]) >= {"parse", "emit", "io"}
+    assert len(serial["slowest_queries"]) == serial["queries"]
+
+    parallel = _run(tmp_path, "parallel", 2)
+    for key in ("rows", "queries"):
+        assert parallel[key] == serial[key]
+    assert parallel["failures"]["by_type"] == serial["failures"]["by_type"]
+    assert parallel["failures"]["by_dbid"] == serial["failures"]["by_dbid"]
+
+
+def test_add_rows_without_progress():
+    metrics = PipelineMetrics(progress_every=0)
+    metrics.add_rows(5)
+    metrics.add_rows(0)
+    assert metrics.to_dict()["rows"] == 5
@@ -0,0 +1,15 @@
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "datasets" / "leetcode"))
+from get_labeled import label_frame
+
+
+def test_label_frame_matches_the_row_rules():
+    df = pd.DataFrame({"states": [
+        '["EQU", "EQU"]', '["EQU", "NEQ"]', '["NEQ", "TMO"]', '["EQU", "UNK"]',
+        '[]', None, '7', '"EQU"', "['EQU']",
+    ]})
+    assert label_frame(df)["correct"].tolist() == ["Y", "N", "Y", None, None, None, None, None, "Y"]
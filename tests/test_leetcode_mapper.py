@@ -0,0 +1,43 @@
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from mapping.service import load_mapper_module
+
+SQLMapper = load_mapper_module("leetcode").SQLMapper
+
+
+def _sequential_mapping(table_mapping, column_mapping, sql_query):
+    """The original per-name ``re.sub`` loop the renamer replaces."""
+    mapped = sql_query
+    for mapping in (table_mapping, column_mapping):
+        items = sorted(((k.upper(), v) for k, v in mapping.items()), key=lambda x: len(x[0]), reverse=True)
+        for original, dummy in items:
+            for pattern in (rf'\b{re.escape(original)}\b', rf'`{re.escape(original)}`', rf'"{re.escape(original)}"'):
+                mapped = re.sub(pattern, dummy, mapped, flags=re.IGNORECASE)
+    return mapped
+
+
+MAPPINGS = [
+    ({"Person": "t1", "Address": "t2"}, {"PersonId": "c1", "City": "c2", "Id": "c3"}),
+    # Dummy names that are also originals, and a name shared by a table and a column
+    ({"t2": "t1", "Orders": "t2"}, {"c1": "c2", "orders": "c1", "amount": "c3"}),
+    ({}, {}),
+]
+QUERIES = [
+    "SELECT p.PersonId, a.city FROM Person p LEFT JOIN `Address` a ON p.personid = a.PersonId",
+    'SELECT "Id", id, ID_x, x_Id FROM person WHERE City = \'Person City\'',
+    "SELECT t2.c1, orders.amount FROM Orders JOIN t2 ON Orders.c1 = t2.orders",
+    "SELECT `t2`, \"ORDERS\" FROM orders_archive, orders",
+    "",
+]
+
+
+@pytest.mark.parametrize("tables, columns", MAPPINGS)
+def test_renamer_matches_sequential_replacement(tables, columns):
+    mapper = SQLMapper(tables, columns)
+    for query in QUERIES:
+        assert mapper.map_sql_query(query) == _sequential_mapping(tables, columns, query)
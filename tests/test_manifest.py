@@ -0,0 +1,77 @@
+import json
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from mapping.manifest import RemapManifest, mapping_version, query_hashes, row_keys
+from mapping.service import load_mapper_module
+
+
+def _frame():
+    return pd.DataFrame({
+        "index": [0, 1, 2],
+        "dbid": ["db1", "db1", "db2"],
+        "q1": ["SELECT personid FROM person", "SELECT city FROM address", None],
+        "q2": ["SELECT 1", "SELECT 2", "SELECT personid FROM person"],
+    })
+
+
+def _versions(df, mappings):
+    return [mapping_version({"mapping": mappings[dbid]}) for dbid in df["dbid"]]
+
+
+MAPPINGS = {"db1": {"tables": {"person": "t1"}, "columns": {"personid": "c1"}},
+            "db2": {"tables": {"person": "t1"}, "columns": {}}}
+
+
+def test_manifest_round_trip_and_stale_rows(tmp_path):
+    path = str(tmp_path / "out.csv.manifest.json")
+    df = _frame()
+    manifest = RemapManifest(path)
+    assert manifest.stale(row_keys(df), query_hashes(df), _versions(df, MAPPINGS)).all()
+    manifest.replace(row_keys(df), query_hashes(df), _versions(df, MAPPINGS))
+    manifest.save()
+
+    reloaded = RemapManifest(path)
+    assert len(reloaded) == 3
+    assert not reloaded.stale(row_keys(df), query_hashes(df), _versions(df, MAPPINGS)).any()
+
+    # Edited query, new row, changed mapping of db2
+    changed = pd.concat([df, pd.DataFrame({"index": [3], "dbid": ["db1"], "q1": ["SELECT 3"], "q2": ["SELECT 4"]})],
+                        ignore_index=True)
+    changed.loc[0, "q2"] = "SELECT 9"
+    mappings = {**MAPPINGS, "db2": {"tables": {"person": "t7"}, "columns": {}}}
+    stale = reloaded.stale(row_keys(changed), query_hashes(changed), _versions(changed, mappings))
+    assert stale.tolist() == [True, False, True, True]
+
+
+def test_row_keys_fall_back_to_position():
+    df = _frame()
+    assert row_keys(df)[0] == "index=0"
+    assert row_keys(df.assign(index=[0, 0, 1]))[0] == "#0"
+
+
+def test_unreadable_manifest_is_empty(tmp_path):
+    path = tmp_path / "m.json"
+    path.write_text("{not json")
+    assert len(RemapManifest(str(path))) == 0
+    path.write_text(json.dumps({"version": -1, "rows": {"index=0": ["a", "b"]}}))
+    assert len(RemapManifest(str(path))) == 0
+
+
+def test_incremental_remap_matches_full_run(tmp_path):
+    mapper = load_mapper_module("bird")
+    schemas = tmp_path / "schemas.json"
+    schemas.write_text(json.dumps({dbid: {"mapping": mapping} for dbid, mapping in MAPPINGS.items()}))
+    source, output, full = tmp_path / "in.csv", tmp_path / "out.csv", tmp_path / "full.csv"
+    _frame().to_csv(source, index=False)
+    mapper.process_bird_csv(str(source), str(schemas), str(output), incremental=True)
+
+    changed = _frame()
+    changed.loc[1, "q1"] = "SELECT personid FROM person WHERE personid > 1"
+    changed.to_csv(source, index=False)
+    mapper.process_bird_csv(str(source), str(schemas), str(output), incremental=True)
+    mapper.process_bird_csv(str(source), str(schemas), str(full))
+    assert output.read_bytes() == full.read_bytes()
@@ -0,0 +1,49 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from equivalence.differential import SchemaSession
+from equivalence.minimize import Prober, ddmin, minimize_counterexample
+
+DDL = ("CREATE TABLE p (id INT PRIMARY KEY, name TEXT);\n"
+       "CREATE TABLE c (id INT PRIMARY KEY, pid INT REFERENCES p(id), v INT);")
+Q1 = "SELECT p.name FROM p JOIN c ON c.pid = p.id WHERE c.v > 1"
+Q2 = "SELECT p.name FROM p JOIN c ON c.pid = p.id WHERE c.v > 2"
+
+
+def _big_counterexample():
+    """Twenty parents and forty children; only child 17 (v = 2) tells Q1 from Q2."""
+    lines = [f"INSERT INTO \"p\" VALUES ({i}, 'n{i}');" for i in range(20)]
+    lines += [f"INSERT INTO \"c\" VALUES ({i}, {i % 20}, {2 if i == 17 else i % 2 * 3});" for i in range(40)]
+    return "\n".join(lines)
+
+
+def test_ddmin_finds_the_single_needed_row():
+    rows = [(0, i) for i in range(16)]
+    def first_hit(candidates):
+        for i, keep in enumerate(candidates):
+            if (0, 11) in keep:
+                return i, keep
+        return None
+
+    assert ddmin(rows, first_hit) == [(0, 11)]
+
+
+def test_minimized_counterexample_is_one_minimal():
+    inserts = _big_counterexample()
+    assert Prober(DDL, Q1, Q2, inserts).distinguishes()
+    minimized = minimize_counterexample(DDL, Q1, Q2, inserts)
+    assert minimized.count("\n") < inserts.count("\n")
+
+    prober = Prober(DDL, Q1, Q2, minimized)
+    assert prober.distinguishes()
+    for row in prober.rows:
+        assert prober.probe([r for r in prober.rows if r != row]) is None
+    prober.close()
+
+
+def test_load_keeps_string_values_with_statement_separators():
+    session = SchemaSession(DDL)
+    session.load("INSERT INTO \"p\" VALUES (1, 'a;\nb');\nINSERT INTO \"p\" VALUES (2, 'c');")
+    assert session.run("SELECT name FROM p ORDER BY id")[0] == [("a;\nb",), ("c",)]
+    session.close()
@@ -0,0 +1,53 @@
+import json
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from mapping import pipeline
+from mapping.service import load_mapper_module
+
+MAPPINGS = {"db1": {"mapping": {"tables": {"person": "t1"}, "columns": {"personid": "c1"}}}}
+
+
+def _schemas(tmp_path):
+    path = tmp_path / "schemas.json"
+    path.write_text(json.dumps(MAPPINGS))
+    return str(path)
+
+
+def test_stream_header_only_input(tmp_path, monkeypatch):
+    source, output = tmp_path / "in.csv", tmp_path / "out.csv"
+    source.write_text("index,dbid,q1,q2\n")
+    read_csv = pd.read_csv
+
+    def no_chunks(path, chunksize=None, **kwargs):
+        # Some pandas versions yield no chunk at all for a header-only file
+        return iter(()) if chunksize else read_csv(path, **kwargs)
+
+    monkeypatch.setattr(pipeline.pd, "read_csv", no_chunks)
+    counts = load_mapper_module("bird").stream_bird_csv(str(source), _schemas(tmp_path), str(output))
+    assert counts["rows"] == 0
+    assert output.read_text() == "index,dbid,q1,q2,q1_mapped,q2_mapped\n"
+
+
+def test_parallel_output_matches_serial(tmp_path):
+    schemas = tmp_path / "schemas.json"
+    schemas.write_text(json.dumps({
+        f"db{d}": {"mapping": {"tables": {"person": f"t{d}"}, "columns": {"personid": "c1", "city": f"c{d}"}}}
+        for d in range(4)
+    }))
+    source = tmp_path / "in.csv"
+    pd.DataFrame({
+        "index": range(40),
+        "dbid": [f"db{i % 5}" for i in range(40)],  # db4 has no mapping
+        "q1": [f"SELECT personid, city FROM person WHERE personid > {i}" for i in range(40)],
+        "q2": ["SELECT FROM WHERE" if i % 7 == 0 else None if i % 9 == 0 else "SELECT city FROM person"
+               for i in range(40)],
+    }).to_csv(source, index=False)
+    mapper = load_mapper_module("bird")
+    serial, parallel = tmp_path / "serial.csv", tmp_path / "parallel.csv"
+    mapper.process_bird_csv(str(source), str(schemas), str(serial))
+    mapper.process_bird_csv(str(source), str(schemas), str(parallel), workers=3)
+    assert parallel.read_bytes() == serial.read_bytes()
@@ -0,0 +1,47 @@
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from mapping.records import iter_pairs
+
+FRAMES = {
+    "leetcode": pd.DataFrame({"dbid": ["175", "182"], "index": [0, 1], "q1": ["SELECT 1", "SELECT 2"],
+                              "q2": ["SELECT 1", ""], "states": ['["EQU"]', '["EQU", "NEQ"]']}),
+    "bird": pd.DataFrame({"db_id": ["movies", "movies"], "question_id": [7, 8], "q1": ["SELECT a", "SELECT b"],
+                          "q2": ["SELECT a", "SELECT c"], "ground_truth": ["EQU", "NEQ"]}),
+    "beers": pd.DataFrame({"id": [3, 4], "q1": ["SELECT x", "SELECT y"], "q2": ["SELECT x", "SELECT z"],
+                           "ground_truth": ["Y", "N"], "outputs": ["{}", "{}"]}),
+    "literature": pd.DataFrame({"file": ["calcite", "spider"], "index": [10, 11], "q1": ["SELECT 1", "SELECT 2"],
+                                "q2": ["SELECT 1", "SELECT 3"], "verieql_label": ["EQU", ""]}),
+}
+EXPECTED = {
+    "leetcode": [("175", 0, "SELECT 1", "Y"), ("182", 1, None, "N")],
+    "bird": [("movies", 7, "SELECT a", "Y"), ("movies", 8, "SELECT c", "N")],
+    "beers": [("beers", 3, "SELECT x", "Y"), ("beers", 4, "SELECT z", "N")],
+    "literature": [("calcite", 10, "SELECT 1", "Y"), ("spider", 11, "SELECT 3", None)],
+}
+
+
+@pytest.mark.parametrize("dataset", sorted(FRAMES))
+def test_iter_pairs_reads_every_dataset(tmp_path, dataset):
+    path = tmp_path / dataset / "pairs.csv"
+    path.parent.mkdir()
+    FRAMES[dataset].to_csv(path, index=False)
+    pairs = list(iter_pairs(str(path)))
+    assert [(p.dbid, p.index, p.q2, p.label) for p in pairs] == EXPECTED[dataset]
+    # Detection from the columns alone gives the same records
+    flat = tmp_path / f"{dataset}.csv"
+    FRAMES[dataset].to_csv(flat, index=False)
+    assert [p.to_dict() for p in iter_pairs(str(flat))] == [p.to_dict() for p in pairs]
+
+
+def test_iter_pairs_reads_parquet(tmp_path):
+    pytest.importorskip("pyarrow")
+    df = FRAMES["leetcode"].assign(states=[["EQU"], ["EQU", "NEQ"]])
+    df.to_parquet(tmp_path / "pairs.parquet")
+    records = [p.to_dict() for p in iter_pairs(str(tmp_path / "pairs.parquet"), "leetcode")]
+    assert [(r["dbid"], r["states"], r["label"]) for r in records] == [("175", ["EQU"], "Y"),
+                                                                       ("182", ["EQU", "NEQ"], "N")]
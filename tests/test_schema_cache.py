@@ -0,0 +1,30 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from mapping.map import SchemaCache, extract_and_map_schema
+
+DDL = "CREATE TABLE person (personid INT, city TEXT);\nCREATE TABLE address (personid INT);"
+
+
+def test_whitespace_variants_share_the_compiled_mapping(tmp_path, monkeypatch):
+    import mapping.map as schema_map
+    compiled = []
+    compile_schema = schema_map._compile_schema
+    monkeypatch.setattr(schema_map, "_compile_schema", lambda sql: compiled.append(sql) or compile_schema(sql))
+    cache = SchemaCache(str(tmp_path))
+    variant = DDL.replace("\n", "   \r\n") + "\n"
+
+    first = extract_and_map_schema(DDL, cache)
+    second = extract_and_map_schema(variant, cache)
+    assert len(compiled) == 1
+    assert first[1] == second[1] and first[0] != second[0]
+    assert second[0] == "CREATE TABLE t1 (c1 INT, c2 TEXT);   \r\nCREATE TABLE t2 (c1 INT);\n"
+
+    # Alternating between the two texts no longer rewrites their cache files
+    files = {p: p.stat().st_mtime_ns for p in tmp_path.iterdir()}
+    assert len(files) == 3
+    for sql in (DDL, variant, DDL):
+        extract_and_map_schema(sql, cache)
+    assert {p: p.stat().st_mtime_ns for p in tmp_path.iterdir()} == files
+    assert extract_and_map_schema(variant, SchemaCache(str(tmp_path))) == second
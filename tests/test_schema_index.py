@@ -0,0 +1,64 @@
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from mapping.pipeline import load_mapping_from_schemas_json
+from mapping.schema_index import SchemaIndex, iter_json_object
+
+SCHEMAS = {"db1": {"mapping": {"tables": {"person": "t1"}, "columns": {"personid": "c1"}}},
+           "db2": {"mapping": {"tables": {}, "columns": {}}}}
+
+
+def _schemas(tmp_path):
+    path = tmp_path / "schemas.json"
+    path.write_text(json.dumps(SCHEMAS))
+    return str(path)
+
+
+def test_unwritable_index_path_falls_back_to_temp_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path / "tmp"))
+    os.mkdir(tmp_path / "tmp")
+    index = SchemaIndex(_schemas(tmp_path), index_path=str(tmp_path / "missing" / "x.idx.sqlite"))
+    assert index.index_path.startswith(str(tmp_path / "tmp"))
+    assert index.mapping("db1") == ({"person": "t1"}, {"personid": "c1"})
+
+
+def test_nothing_writable_keeps_index_in_memory(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path / "missing"))
+    index = SchemaIndex(_schemas(tmp_path), index_path=str(tmp_path / "missing" / "x.idx.sqlite"))
+    assert index.index_path == ":memory:"
+    assert len(index) == 2 and "db2" in index
+
+
+def test_build_leaves_no_temp_files(tmp_path):
+    SchemaIndex(_schemas(tmp_path))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["schemas.json", "schemas.json.idx.sqlite"]
+
+
+def test_load_mapping_only_hides_unknown_databases(tmp_path):
+    schemas = _schemas(tmp_path)
+    assert load_mapping_from_schemas_json(schemas, "nope") == ({}, {})
+    with pytest.raises(OSError):
+        load_mapping_from_schemas_json(str(tmp_path / "absent.json"), "db1")
+
+
+def test_iter_json_object_matches_json_load(tmp_path):
+    data = {"1": {"mapping": {"tables": {"a}b": "t1"}, "columns": {"\"q\"": "c1"}}, "n": 12345678901234567890},
+            "22": [1.5, -2e-3, None, True, "x, y: [z]"], "333": 42, "": {}, "last": 7}
+    path = tmp_path / "data.json"
+    for text in (json.dumps(data), json.dumps(data, indent=3), "{}", " { } "):
+        path.write_text(text)
+        for read_size in (1, 3, 7, 1 << 20):
+            assert dict(iter_json_object(str(path), read_size)) == json.loads(text)
+
+
+def test_iter_json_object_rejects_non_objects(tmp_path):
+    path = tmp_path / "list.json"
+    path.write_text("[1, 2]")
+    with pytest.raises(ValueError):
+        list(iter_json_object(str(path)))
@@ -0,0 +1,26 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from mapping.service import MappingService
+
+
+def _write_schemas(path, table):
+    path.write_text(json.dumps({"db1": {"mapping": {"tables": {"person": table}, "columns": {"personid": "c1"}}}}))
+
+
+def test_map_query_sees_edited_schemas(tmp_path):
+    schemas = tmp_path / "schemas.json"
+    _write_schemas(schemas, "t1")
+    service = MappingService()
+    request = {"op": "map_query", "dataset": "bird", "schemas": str(schemas), "dbid": "db1",
+               "queries": ["SELECT personid FROM person"]}
+    assert service.handle(request)["results"] == ["SELECT c1 FROM t1"]
+
+    _write_schemas(schemas, "t22")
+    stat = os.stat(schemas)
+    os.utime(schemas, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert service.handle(request)["results"] == ["SELECT c1 FROM t22"]
+    assert len(service.stats()["registries"]) == 1
@@ -0,0 +1,37 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+SCRIPT = Path(__file__).resolve().parents[1] / "datasets" / "leetcode" / "solver_report.py"
+sys.path.insert(0, str(SCRIPT.parent))
+from solver_report import load_solver_results, solver_report
+
+
+def _write(path, rows):
+    pd.DataFrame(rows, columns=["dbid", "states", "times"]).to_csv(path, index=False)
+
+
+def test_report_rates_and_missing_dbids(tmp_path):
+    path = tmp_path / "lc.csv"
+    _write(path, [
+        ["175", json.dumps(["EQU", "NEQ"]), json.dumps([1.0, 2.0])],
+        ["175", json.dumps(["EQU", "TMO"]), json.dumps([1.0, 5.0])],
+        [None, json.dumps(["EQU"]), json.dumps([0.5])],
+    ])
+    report = solver_report(load_solver_results([str(path)]))
+    assert report["overall"] == {"pairs": 3, "tmo_rate": 1 / 3, "neq_rate": 1 / 3}
+    per_dbid = report["per_dbid"].set_index("dbid")
+    assert per_dbid.loc["175", "pairs"] == 2
+    assert per_dbid["pairs"].sum() == 3 and None in per_dbid.index
+    assert np.isclose(per_dbid.loc["175", "time_to_first_neq_p50"], 3.0)
+
+
+def test_cli_reports_empty_input(tmp_path):
+    path = tmp_path / "empty.csv"
+    _write(path, [])
+    out = subprocess.run([sys.executable, str(SCRIPT), str(path)], capture_output=True, text=True, check=True)
+    assert out.stdout.startswith("0 pairs")
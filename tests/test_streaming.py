@@ -0,0 +1,65 @@
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from mapping.streaming import ChunkedCSVWriter
+
+FIELDNAMES = ["id", "value"]
+
+
+def _chunk(start, stop):
+    return pd.DataFrame({"id": range(start, stop), "value": [f"v{i}" for i in range(start, stop)]})
+
+
+def _interrupted_run(output, source):
+    """Write two checkpointed chunks plus an unrecorded tail, then die."""
+    writer = ChunkedCSVWriter(str(output), FIELDNAMES, source_path=str(source))
+    writer.write_frame(_chunk(0, 10))
+    writer.checkpoint(10)
+    writer.write_frame(_chunk(10, 20))
+    writer.checkpoint(20)
+    writer.write_frame(_chunk(20, 25))  # lost: no checkpoint
+    writer.close()
+
+
+def test_resume_continues_after_last_checkpoint(tmp_path):
+    source, output = tmp_path / "in.csv", tmp_path / "out.csv"
+    _chunk(0, 30).to_csv(source, index=False)
+    _interrupted_run(output, source)
+    assert not output.exists()
+
+    writer = ChunkedCSVWriter(str(output), FIELDNAMES, source_path=str(source))
+    assert writer.rows_done == 20
+    writer.write_frame(_chunk(20, 30))
+    writer.checkpoint(30)
+    writer.commit()
+
+    assert pd.read_csv(output).equals(_chunk(0, 30))
+    assert not os.path.exists(f"{output}.checkpoint")
+    assert not os.path.exists(f"{output}.partial")
+
+
+def test_replaced_input_starts_over(tmp_path):
+    source, output = tmp_path / "in.csv", tmp_path / "out.csv"
+    _chunk(0, 30).to_csv(source, index=False)
+    _interrupted_run(output, source)
+
+    _chunk(100, 140).to_csv(source, index=False)
+    writer = ChunkedCSVWriter(str(output), FIELDNAMES, source_path=str(source))
+    assert writer.rows_done == 0
+    writer.write_frame(_chunk(100, 140))
+    writer.checkpoint(40)
+    writer.commit()
+    assert pd.read_csv(output).equals(_chunk(100, 140))
+
+
+def test_changed_fieldnames_start_over(tmp_path):
+    source, output = tmp_path / "in.csv", tmp_path / "out.csv"
+    _chunk(0, 30).to_csv(source, index=False)
+    _interrupted_run(output, source)
+    writer = ChunkedCSVWriter(str(output), FIELDNAMES + ["extra"], source_path=str(source))
+    assert writer.rows_done == 0
+    writer.close()